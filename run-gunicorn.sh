@@ -1,2 +1,2 @@
 pip install gunicorn
-gunicorn --bind '0.0.0.0:80' 'minder.web.app:create_app()'
+gunicorn -c python:minder.gunicorn_conf
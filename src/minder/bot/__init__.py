@@ -1,6 +1,7 @@
 import discord
 import logging
 import os.path
+import time
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from cogwatch import Watcher
@@ -14,7 +15,11 @@ from minder.config import Config
 from minder.cogs.base import BaseCog
 from minder.cogs.errors import ErrorHandlerCog
 from minder.bot.config import BotConfig
+from minder.bot.state import GuildSnapshot
+from minder.bot.watchdog import LoopWatchdog
 from minder.errors import MinderBotError
+from minder.metrics import DELIVERY_QUEUE_DEPTH, DISCORD_API_LATENCY
+from minder.timing import CommandStats, CommandTiming, InstrumentedRedisentHelper, begin_command, current_timing, finish_command, record_phase
 from minder.common import MemberType, ChannelType, ContextOrGuildType
 
 logger = logging.getLogger(__name__)
@@ -35,6 +40,9 @@ class MinderBot(commands.Bot):
     scheduler: AsyncIOScheduler
     slash_cmd: SlashCommand
     bot_config: BotConfig
+    guild_snapshot: GuildSnapshot
+    command_stats: CommandStats
+    loop_watchdog: LoopWatchdog
 
     init_done: bool = False
 
@@ -45,7 +53,11 @@ class MinderBot(commands.Bot):
 
         super().__init__(command_prefix=Config.BOT_PREFIX, intents=discord.Intents.all(), **kwargs)
 
-        self.redis_helper = RedisentHelper(RedisentHelper.build_pool(Config.REDIS_URL))
+        self.redis_helper = InstrumentedRedisentHelper(RedisentHelper.build_pool(Config.REDIS_URL))
+
+        # Guilds and members served by the bot JSON API, kept current from gateway events
+        self.guild_snapshot = GuildSnapshot()
+        self.guild_snapshot.register(self)
 
         do_echo = True if Config.SQLALCHEMY_ECHO else False
         self.sa_engine = create_engine(Config.SQLALCHEMY_URI, echo=do_echo)
@@ -53,6 +65,18 @@ class MinderBot(commands.Bot):
         self.scheduler = AsyncIOScheduler({'apscheduler.timezone': Config.USE_TIMEZONE})
         self.scheduler.start()
 
+        # Reminders waiting to be delivered are the scheduled "date" jobs
+        DELIVERY_QUEUE_DEPTH.set_function(lambda: len(self.scheduler.get_jobs()))
+
+        # Per-command latency with the time spent in Redis, Discord API requests and rendering (see "minder.timing")
+        self.command_stats = CommandStats()
+        self.before_invoke(self._start_command_timer)
+        self.after_invoke(self._record_command_metrics)
+        self._instrument_http()
+
+        # Started along with the bot since it needs the running event loop
+        self.loop_watchdog = LoopWatchdog(threshold=float(Config.LOOP_LAG_THRESHOLD))
+
         if Config.BOT_CONFIG_YAML:
             bot_yaml_path = Config.BOT_CONFIG_YAML
             if not os.path.exists(bot_yaml_path):
@@ -67,6 +91,17 @@ class MinderBot(commands.Bot):
                     self.bot_config = BotConfig()
 
         self.slash_cmd = SlashCommand(self, override_type=True, sync_commands=Config.SYNC_SLASH_COMMANDS)
+        self._instrument_slash_commands()
+
+    async def start(self, *args, **kwargs) -> None:
+        if Config.LOOP_WATCHDOG_ENABLE:
+            self.loop_watchdog.start()
+
+        await super().start(*args, **kwargs)
+
+    async def close(self) -> None:
+        self.loop_watchdog.stop()
+        await super().close()
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
@@ -79,6 +114,74 @@ class MinderBot(commands.Bot):
         await self._sync_init()
         self.init_done = True
 
+    def _instrument_http(self) -> None:
+        """
+        Wrap the Discord HTTP client so that every API request is timed, both overall and as the "discord" phase of the
+        command (if any) making the request
+        """
+
+        request = self.http.request
+
+        async def timed_request(route, **kwargs):
+            started = time.perf_counter()
+
+            try:
+                return await request(route, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                DISCORD_API_LATENCY.observe(elapsed, method=route.method, route=route.path)
+                record_phase('discord', elapsed)
+
+        self.http.request = timed_request
+
+    def _instrument_slash_commands(self) -> None:
+        """
+        Wrap slash command invocation with the same timing as the ``before_invoke`` / ``after_invoke`` hooks of prefix commands
+
+        Slash commands have no invoke hooks so the :py:cls:`SlashCommand` methods are wrapped instead. A slash command is
+        counted as failed if its error reaches ``on_slash_command_error``.
+        """
+
+        invoke_command = self.slash_cmd.invoke_command
+        on_slash_command_error = self.slash_cmd.on_slash_command_error
+
+        async def timed_invoke_command(func, ctx, args):
+            cmd_name = ' '.join(name for name in (ctx.name, ctx.subcommand_group, ctx.subcommand_name) if name)
+            timing = begin_command(cmd_name, 'slash', user=str(ctx.author))
+
+            try:
+                await invoke_command(func, ctx, args)
+            finally:
+                self._finish_command(timing)
+
+        async def timed_on_slash_command_error(ctx, ex):
+            timing = current_timing()
+
+            if timing is not None:
+                timing.failed = True
+
+            await on_slash_command_error(ctx, ex)
+
+        self.slash_cmd.invoke_command = timed_invoke_command
+        self.slash_cmd.on_slash_command_error = timed_on_slash_command_error
+
+    async def _start_command_timer(self, ctx: commands.Context) -> None:
+        ctx.command_timing = begin_command(ctx.command.qualified_name, 'prefix', user=str(ctx.author))
+
+    async def _record_command_metrics(self, ctx: commands.Context) -> None:
+        timing = getattr(ctx, 'command_timing', None)
+
+        if timing is not None:
+            self._finish_command(timing, failed=ctx.command_failed)
+
+    def _finish_command(self, timing: CommandTiming, failed: bool = None) -> None:
+        finish_command(timing, failed=failed)
+        self.command_stats.record(timing)
+
+        if timing.duration >= float(Config.SLOW_COMMAND_THRESHOLD):
+            phases = ', '.join(f'{phase}: {seconds:.3f}s' for phase, seconds in timing.as_dict()['phases'].items())
+            logger.warning(f'Slow {timing.kind} command "{timing.command}" for "{timing.user}" took {timing.duration:.3f}s ({phases})')
+
     async def _sync_init(self) -> None:
         for cog in self.cogs.values():
             await cog._sync_init()
@@ -217,39 +320,52 @@ class MinderBot(commands.Bot):
     async def lookup_member(self, by_id: int = None, by_name: str = None, context_or_guild: ContextOrGuildType = None,
                             throw_error: bool = False) -> Optional[MemberType]:
         """
-        Attempt to lookup a ``discord.Member`` by "id" ir "name"
+        Attempt to lookup a ``discord.Member`` by "id" or "name"
 
         This method will attempt to lookup a member using the provided selector and, if not found will raise
         a :py:exc:`MinderBotError` or return ``None`` based on the provided ``throw_error`` value
 
+        Members are looked up in the member index of the guild snapshot (see :py:class:`minder.bot.state.MemberIndex`)
+        rather than by scanning each guild. Members looked up by ID which are not in the index are fetched from Discord
+        when a guild is provided.
+
         :param by_id: lookup based by ID using provided integer
-        :param by_name: lookup based on the provided username
-        :param guild: if provided, lookup member using the provided :py:class:`GuildType` which can
-                      be a integer (interpreted as a Guild ID) or a ``discord.Guild`` instance
+        :param by_name: lookup based on the provided username (ignoring case)
         :param context_or_guild: either the provided ``commands.Context`` or ``discord.Guild`` instance will be used
-                                 to lookup the channel. if using a discord Context, the ``context.guild`` value will
-                                 be used.
+                                 to lookup the member. if using a discord Context, the ``context.guild`` value will
+                                 be used. If not provided, the member is looked up across all guilds.
         :param throw_error: if ``True``, a :py:exc:`MinderBotError` exception will be raised if no member
                             can be found. Otherwise, ``None`` will be returned.
         """
 
         if not by_id and not by_name:
-            raise MinderBotError('Neither "by_id" nor "by_name" provided to lookup channel')
+            raise MinderBotError('Neither "by_id" nor "by_name" provided to lookup member')
 
-        if not context_or_guild:
-            # TODO: Add lookup by bot here
-            return None
+        guild = context_or_guild.guild if isinstance(context_or_guild, commands.Context) else context_or_guild
+        guild_id = guild.id if guild else None
 
-        # TODO: Also fix this case
-        if not by_id:
-            return None
+        if by_id:
+            member = self.guild_snapshot.members.get(by_id, guild_id=guild_id)
 
-        guild = context_or_guild.guild if isinstance(context_or_guild, commands.Context) else context_or_guild
+            if not member and guild:
+                try:
+                    member = await guild.fetch_member(by_id)
+                except discord.errors.NotFound:
+                    member = None
+        else:
+            member = self.guild_snapshot.members.find_name(by_name, guild_id=guild_id)
 
-        if not guild:
-            return None
+        if member:
+            return member
+
+        err_message = f'Unable to find member "{by_id or by_name}"' + (f' in guild "{guild.name}"' if guild else ' in any guild')
+
+        if throw_error:
+            ctx = context_or_guild if isinstance(context_or_guild, commands.Context) else None
+            raise MinderBotError(err_message, context=ctx)
 
-        return await guild.fetch_member(by_id)
+        logger.warning(err_message)
+        return None
 
     def get_all_cogs(self, use_dotted_path: bool = True) -> Mapping[str, commands.Cog]:
         if not use_dotted_path:
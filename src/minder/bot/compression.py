@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import logging
+
+from aiohttp import hdrs, web
+
+from minder.compression import NO_BODY_STATUS, compress_body, is_compressible, negotiate_encoding, weak_etag
+from minder.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+async def compress_response(request: web.Request, response: web.StreamResponse) -> None:
+    """
+    Compress bot backend responses with the best encoding accepted by the client (registered for ``on_response_prepare``)
+
+    Complete responses of at least ``Config.COMPRESS_MIN_SIZE`` bytes are compressed as zstd, brotli or gzip using
+    ``Config.COMPRESS_LEVEL``. Streamed responses are left alone since their headers may already be final by the time this
+    runs. Handlers streaming large compressible responses should call ``enable_compression()`` before ``prepare()`` so that
+    aiohttp compresses each chunk as it is written.
+    """
+
+    if response.status in NO_BODY_STATUS or request.method == 'HEAD' or hdrs.CONTENT_ENCODING in response.headers:
+        return
+
+    if not isinstance(response, web.Response) or not isinstance(response.body, bytes) or not is_compressible(response.content_type):
+        return
+
+    if 'accept-encoding' not in response.headers.get(hdrs.VARY, '').lower():
+        response.headers.add(hdrs.VARY, 'Accept-Encoding')
+
+    encoding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, None))
+
+    if not encoding or len(response.body) < int(Config.COMPRESS_MIN_SIZE):
+        return
+
+    response.body = compress_body(response.body, encoding, level=int(Config.COMPRESS_LEVEL))
+    response.headers[hdrs.CONTENT_ENCODING] = encoding
+
+    # Depending on the aiohttp version, the length of the uncompressed body may have already been set
+    response.headers[hdrs.CONTENT_LENGTH] = str(len(response.body))
+
+    if hdrs.ETAG in response.headers:
+        response.headers[hdrs.ETAG] = weak_etag(response.headers[hdrs.ETAG])
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from redisent.helpers import RedisentHelper
+from typing import Iterable, List, Optional, Set, Tuple
+
+from minder.models.events import EVENTS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Queued (kind, raw JSON) events per subscriber. Slow subscribers lose their oldest events rather than holding up the rest
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Seconds to wait before resubscribing after an error reading the events channel. Doubled after each consecutive error
+RESUBSCRIBE_DELAY = 0.5
+MAX_RESUBSCRIBE_DELAY = 30.0
+
+EventMessage = Tuple[str, str]
+
+
+class EventSubscription:
+    """
+    A single subscriber (i.e. one connected dashboard) to the :py:class:`EventFeed`
+    """
+
+    kinds: Optional[Set[str]]
+    queue: asyncio.Queue
+    dropped: int
+
+    def __init__(self, kinds: Iterable[str] = None, max_size: int = SUBSCRIBER_QUEUE_SIZE) -> None:
+        self.kinds = set(kinds) if kinds else None
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def wants(self, kind: str) -> bool:
+        return self.kinds is None or kind in self.kinds
+
+    def put(self, message: EventMessage) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float = None) -> Optional[EventMessage]:
+        """
+        Wait for the next event, returning ``None`` if none arrives within ``timeout`` seconds
+        """
+
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventFeed:
+    """
+    Fans events published on the Redis events channel out to connected subscribers
+
+    A single Redis subscription is shared by every subscriber rather than each connection holding its own. The subscription
+    is read in a background thread (only running while there are subscribers) and each message is decoded once and then
+    handed to the subscriber queues on the event loop. If reading the subscription fails (i.e. Redis is restarted), the
+    thread resubscribes with an increasing delay so connected subscribers keep receiving events.
+    """
+
+    helper: RedisentHelper
+    loop: Optional[asyncio.AbstractEventLoop]
+
+    _subscribers: List[EventSubscription]
+    _thread: Optional[threading.Thread]
+    _stop: threading.Event
+    _lock: threading.Lock
+
+    def __init__(self, helper: RedisentHelper) -> None:
+        self.helper = helper
+        self.loop = None
+
+        self._subscribers = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, kinds: Iterable[str] = None) -> EventSubscription:
+        """
+        Add a subscriber for events of ``kinds`` (or all events), starting the Redis subscription if needed
+
+        Must be called from the event loop the subscriber will be read from.
+        """
+
+        sub = EventSubscription(kinds=kinds)
+
+        with self._lock:
+            self._subscribers.append(sub)
+            self.loop = asyncio.get_event_loop()
+
+            if not self._thread or not self._thread.is_alive() or self._stop.is_set():
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._listen, args=(self._stop, ), name='minder-event-feed', daemon=True)
+                self._thread.start()
+
+        logger.debug(f'Added event feed subscriber (kinds: {kinds or "all"}). Now #{self.subscriber_count} subscribers')
+        return sub
+
+    def unsubscribe(self, sub: EventSubscription) -> None:
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+            if not self._subscribers:
+                self._stop.set()
+
+        if sub.dropped:
+            logger.info(f'Event feed subscriber dropped #{sub.dropped} events while it was connected')
+
+        logger.debug(f'Removed event feed subscriber. Now #{self.subscriber_count} subscribers')
+
+    def stop(self) -> None:
+        with self._lock:
+            self._subscribers.clear()
+            self._stop.set()
+
+    def _dispatch(self, message: EventMessage) -> None:
+        kind = message[0]
+
+        for sub in list(self._subscribers):
+            if sub.wants(kind):
+                sub.put(message)
+
+    def _listen(self, stop: threading.Event) -> None:
+        delay = RESUBSCRIBE_DELAY
+
+        while not stop.is_set():
+            started = time.monotonic()
+
+            try:
+                self._read_events(stop)
+            except Exception as ex:
+                # Start over from the shortest delay if the subscription had been working for a while
+                if time.monotonic() - started > MAX_RESUBSCRIBE_DELAY:
+                    delay = RESUBSCRIBE_DELAY
+
+                logger.exception(f'Error reading from Redis events channel "{EVENTS_CHANNEL}". Resubscribing in {delay}s: {ex}')
+                stop.wait(delay)
+                delay = min(delay * 2, MAX_RESUBSCRIBE_DELAY)
+
+        logger.info(f'Unsubscribed from Redis events channel "{EVENTS_CHANNEL}"')
+
+    def _read_events(self, stop: threading.Event) -> None:
+        logger.info(f'Subscribing to Redis events channel "{EVENTS_CHANNEL}"')
+
+        with self.helper.wrapped_redis(f'subscribe("{EVENTS_CHANNEL}")') as r_conn:
+            pubsub = r_conn.pubsub(ignore_subscribe_messages=True)
+
+        try:
+            pubsub.subscribe(EVENTS_CHANNEL)
+
+            while not stop.is_set():
+                message = pubsub.get_message(timeout=1.0)
+
+                if not message or message.get('type') != 'message':
+                    continue
+
+                raw = message['data'].decode() if isinstance(message['data'], bytes) else str(message['data'])
+
+                try:
+                    kind = json.loads(raw)['kind']
+                except (ValueError, KeyError, TypeError) as ex:
+                    logger.warning(f'Ignoring invalid message on events channel "{EVENTS_CHANNEL}": {ex}')
+                    continue
+
+                self.loop.call_soon_threadsafe(self._dispatch, (kind, raw))
+        finally:
+            pubsub.close()
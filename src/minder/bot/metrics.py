@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from aiohttp import web
+from typing import Awaitable, Callable
+
+from minder.metrics import HTTP_REQUEST_LATENCY
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def _route_label(request: web.Request) -> str:
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else 'unmatched'
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
+    """
+    Record the latency of each bot backend request in :py:data:`minder.metrics.HTTP_REQUEST_LATENCY`
+
+    Requests are labelled by the canonical path of the matched route (i.e. "/reminders/{id}") so that label
+    cardinality does not grow with the IDs in request paths.
+    """
+
+    started = time.perf_counter()
+    status = 500
+
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as ex:
+        status = ex.status
+        raise
+    finally:
+        HTTP_REQUEST_LATENCY.observe(time.perf_counter() - started, server='bot', method=request.method, route=_route_label(request), status=status)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import logging
+import marshal
+import os.path
+import pstats
+import sys
+import threading
+import time
+
+from collections import Counter
+from dataclasses import dataclass
+from types import FrameType
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "sample" periodically captures the stack of the event loop thread from another thread, adding little overhead. "cprofile"
+# traces every call made on the loop thread which gives exact call counts but can slow a busy bot down noticeably
+PROFILE_MODES = ['sample', 'cprofile']
+
+# Seconds between stack samples in "sample" mode
+SAMPLE_INTERVAL = 0.005
+
+# Number of functions included in the profile summary
+PROFILE_TOP = 25
+
+
+def frame_label(frame: FrameType) -> str:
+    """
+    Returns a short label for the function of ``frame`` (i.e. ``'store (models/reminders.py:95)'``)
+    """
+
+    code = frame.f_code
+    path = os.path.join(os.path.basename(os.path.dirname(code.co_filename)), os.path.basename(code.co_filename))
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'
+
+
+def frame_stack(frame: Optional[FrameType]) -> List[str]:
+    """
+    Returns the labels of ``frame`` and its callers, outermost first
+    """
+
+    stack = []
+
+    while frame is not None:
+        stack.append(frame_label(frame))
+        frame = frame.f_back
+
+    stack.reverse()
+    return stack
+
+
+@dataclass
+class ProfileResult:
+    """
+    Result of profiling the event loop
+
+    ``summary`` holds the top functions as text while ``data`` holds the full profile, saved as ``filename``. For "cprofile"
+    this is a pstats file (load with ``pstats.Stats(filename)``) and for "sample" it is a collapsed stack file (one
+    ``frame;frame;frame count`` line per stack) as used by flamegraph tools.
+    """
+
+    mode: str
+    seconds: float
+    summary: str
+    filename: str
+    data: bytes
+
+
+class StackSampler:
+    """
+    Samples the current stack of the thread ``thread_id`` every ``interval`` seconds from a background thread
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+
+        self.stacks: Counter = Counter()
+        self.num_samples = 0
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='minder-stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is None:
+                continue
+
+            self.stacks[tuple(frame_stack(frame))] += 1
+            self.num_samples += 1
+
+    def top_functions(self, limit: int = PROFILE_TOP) -> List[Tuple[str, int, int]]:
+        """
+        Returns ``(function, total samples, self samples)`` for the functions with the most samples of their own code (then
+        the most samples including their callees)
+        """
+
+        total: Counter = Counter()
+        own: Counter = Counter()
+
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+
+            for label in set(stack):
+                total[label] += count
+
+        labels = sorted(total, key=lambda label: (own[label], total[label]), reverse=True)[:limit]
+        return [(label, total[label], own[label]) for label in labels]
+
+    def collapsed(self) -> str:
+        return ''.join(f'{";".join(stack)} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _sample_result(sampler: StackSampler, seconds: float) -> ProfileResult:
+    num_samples = max(sampler.num_samples, 1)
+    lines = [f'{sampler.num_samples} samples every {sampler.interval * 1000:.0f}ms over {seconds:.1f}s', f'{"total %":>8} {"self %":>8}  function']
+    lines.extend(f'{total * 100 / num_samples:>8.1f} {own * 100 / num_samples:>8.1f}  {label}' for label, total, own in sampler.top_functions())
+
+    return ProfileResult(mode='sample', seconds=seconds, summary='\n'.join(lines), filename=f'minder-{int(time.time())}.folded',
+                         data=sampler.collapsed().encode())
+
+
+def _cprofile_result(profiler: cProfile.Profile, seconds: float) -> ProfileResult:
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    lines = [f'{stats.total_calls} calls over {seconds:.1f}s', f'{"tottime":>8} {"cumtime":>8} {"ncalls":>8}  function']
+
+    # Functions with the most time spent in their own code first, matching the "sample" summary
+    for func in sorted(stats.stats, key=lambda func: stats.stats[func][2:4], reverse=True)[:PROFILE_TOP]:
+        _, num_calls, tot_time, cum_time, _ = stats.stats[func]
+        lines.append(f'{tot_time:>8.3f} {cum_time:>8.3f} {num_calls:>8}  {pstats.func_std_string(func)}')
+
+    # Same format as "pstats.Stats.dump_stats"
+    return ProfileResult(mode='cprofile', seconds=seconds, summary='\n'.join(lines), filename=f'minder-{int(time.time())}.pstats',
+                         data=marshal.dumps(stats.stats))
+
+
+async def profile_loop(seconds: float, mode: str = 'sample') -> ProfileResult:
+    """
+    Profile the running event loop for ``seconds`` seconds
+
+    Must be awaited from the event loop thread. The collected profile is summarized in an executor so that building the
+    report does not block the loop.
+    """
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+
+        return await loop.run_in_executor(None, _cprofile_result, profiler, time.perf_counter() - started)
+
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await loop.run_in_executor(None, sampler.stop)
+
+    return await loop.run_in_executor(None, _sample_result, sampler, time.perf_counter() - started)
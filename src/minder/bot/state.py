@@ -0,0 +1,545 @@
+from __future__ import annotations
+
+import bisect
+import discord
+import itertools
+import logging
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Mapping, MutableMapping, Optional, Set, Tuple
+
+from minder.encoding import dumps_bytes
+from minder.utils import Timezone
+
+logger = logging.getLogger(__name__)
+
+# Number of changes kept for "since" requests. Older versions get the full snapshot instead
+CHANGELOG_SIZE = 10000
+
+
+@dataclass
+class MemberEntry:
+    """
+    Snapshot of the details of a guild member served by the bot JSON API
+    """
+
+    id: int
+    guild_id: int
+    name: str
+    discriminator: str
+    avatar: str
+    joined_at: Optional[datetime] = None
+    role_ids: Tuple[int, ...] = field(default_factory=tuple)
+
+    @classmethod
+    def from_member(cls, member: discord.Member) -> MemberEntry:
+        return cls(id=member.id, guild_id=member.guild.id, name=member.name, discriminator=member.discriminator, avatar=str(member.avatar_url),
+                   joined_at=member.joined_at, role_ids=tuple(role.id for role in getattr(member, 'roles', [])))
+
+    @property
+    def joined_ts(self) -> Optional[float]:
+        return self.joined_at.timestamp() if self.joined_at else None
+
+    def as_dict(self, use_tz: Timezone = None) -> Mapping[str, Any]:
+        if use_tz and self.joined_at:
+            joined_ts: Any = self.joined_at.astimezone(use_tz.timezone).ctime()
+        else:
+            joined_ts = self.joined_ts
+
+        return {'id': self.id, 'name': self.name, 'discriminator': self.discriminator, 'joined_ts': joined_ts, 'avatar': self.avatar}
+
+
+@dataclass
+class GuildEntry:
+    """
+    Snapshot of a guild and its members served by the bot JSON API
+    """
+
+    id: int
+    name: str
+    description: Optional[str]
+    owner_id: int
+    members: Dict[int, MemberEntry] = field(default_factory=dict)
+
+    @classmethod
+    def from_guild(cls, guild: discord.Guild) -> GuildEntry:
+        members = {member.id: MemberEntry.from_member(member) for member in guild.members}
+        return cls(id=guild.id, name=guild.name, description=guild.description, owner_id=guild.owner_id, members=members)
+
+    def as_dict(self, use_tz: Timezone = None, include_members: bool = True) -> Mapping[str, Any]:
+        gld: MutableMapping[str, Any] = {'id': self.id, 'name': self.name, 'description': self.description, 'owner_id': self.owner_id}
+
+        if include_members:
+            gld['members'] = {mem_id: mem.as_dict(use_tz=use_tz) for mem_id, mem in self.members.items()}
+
+        return gld
+
+
+class MemberIndex:
+    """
+    Index of the ``discord.Member`` objects of every guild by member ID and by (case-insensitive) name prefix
+
+    Members are indexed per guild since a user in several guilds has a separate member for each. Names are kept in a sorted
+    list so that prefix lookups are a binary search rather than a scan of every member of every guild.
+    """
+
+    _by_id: Dict[int, Dict[int, discord.Member]]
+    _names: List[Tuple[str, int, int]]
+    _name_keys: Dict[Tuple[int, int], str]
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._name_keys)
+
+    def clear(self) -> None:
+        self._by_id = {}
+        self._names = []
+        self._name_keys = {}
+
+    def _remove_name(self, guild_id: int, member_id: int) -> None:
+        name_key = self._name_keys.pop((guild_id, member_id), None)
+
+        if name_key is None:
+            return
+
+        entry = (name_key, member_id, guild_id)
+        pos = bisect.bisect_left(self._names, entry)
+
+        if pos < len(self._names) and self._names[pos] == entry:
+            del self._names[pos]
+
+    def add(self, member: discord.Member) -> None:
+        guild_id = member.guild.id
+        name_key = member.name.lower()
+
+        self._by_id.setdefault(member.id, {})[guild_id] = member
+
+        if self._name_keys.get((guild_id, member.id), None) == name_key:
+            return
+
+        self._remove_name(guild_id, member.id)
+        self._name_keys[(guild_id, member.id)] = name_key
+        bisect.insort(self._names, (name_key, member.id, guild_id))
+
+    def rebuild(self, guilds: Iterable[discord.Guild]) -> None:
+        """
+        Replace the index with the members of ``guilds`` (sorting the names once rather than inserting each)
+        """
+
+        self.clear()
+
+        for gld in guilds:
+            for member in gld.members:
+                self._by_id.setdefault(member.id, {})[gld.id] = member
+                self._name_keys[(gld.id, member.id)] = member.name.lower()
+
+        self._names = sorted((name_key, member_id, guild_id) for (guild_id, member_id), name_key in self._name_keys.items())
+
+    def remove(self, guild_id: int, member_id: int) -> None:
+        members = self._by_id.get(member_id, {})
+        members.pop(guild_id, None)
+
+        if not members:
+            self._by_id.pop(member_id, None)
+
+        self._remove_name(guild_id, member_id)
+
+    def remove_guild(self, guild_id: int) -> None:
+        for (gld_id, member_id) in [key for key in self._name_keys if key[0] == guild_id]:
+            self.remove(gld_id, member_id)
+
+    def get(self, member_id: int, guild_id: int = None) -> Optional[discord.Member]:
+        """
+        Returns the member for ``member_id`` in ``guild_id`` (or in any guild if not provided)
+        """
+
+        members = self._by_id.get(member_id, None)
+
+        if not members:
+            return None
+
+        if guild_id is not None:
+            return members.get(guild_id, None)
+
+        return next(iter(members.values()))
+
+    def find_prefix(self, prefix: str, guild_id: int = None, limit: int = None) -> List[discord.Member]:
+        """
+        Returns members with names starting with ``prefix`` (ignoring case), ordered by name
+
+        :param prefix: the name prefix to match
+        :param guild_id: optionally only include members of this guild
+        :param limit: optional maximum number of members to return
+        """
+
+        prefix = prefix.lower()
+        found: List[discord.Member] = []
+
+        for pos in range(bisect.bisect_left(self._names, (prefix, )), len(self._names)):
+            name_key, member_id, gld_id = self._names[pos]
+
+            if not name_key.startswith(prefix):
+                break
+
+            if guild_id is not None and gld_id != guild_id:
+                continue
+
+            found.append(self._by_id[member_id][gld_id])
+
+            if limit and len(found) >= limit:
+                break
+
+        return found
+
+    def find_name(self, name: str, guild_id: int = None) -> Optional[discord.Member]:
+        """
+        Returns the first member named ``name`` (ignoring case), optionally only from ``guild_id``
+        """
+
+        name_key = name.lower()
+
+        for pos in range(bisect.bisect_left(self._names, (name_key, )), len(self._names)):
+            entry_name, member_id, gld_id = self._names[pos]
+
+            if entry_name != name_key:
+                break
+
+            if guild_id is None or gld_id == guild_id:
+                return self._by_id[member_id][gld_id]
+
+        return None
+
+
+MemberKey = Tuple[int, int]
+
+
+@dataclass
+class MemberQuery:
+    """
+    Filters for listing members from the :py:class:`GuildSnapshot`
+    """
+
+    guild_ids: Optional[Set[int]] = None
+    prefix: Optional[str] = None
+    role_id: Optional[int] = None
+    joined_after: Optional[float] = None
+
+    def matches(self, entry: MemberEntry) -> bool:
+        if self.guild_ids is not None and entry.guild_id not in self.guild_ids:
+            return False
+
+        if self.prefix and not entry.name.lower().startswith(self.prefix.lower()):
+            return False
+
+        if self.role_id is not None and self.role_id not in entry.role_ids:
+            return False
+
+        if self.joined_after is not None and (entry.joined_ts is None or entry.joined_ts <= self.joined_after):
+            return False
+
+        return True
+
+
+@dataclass
+class SnapshotChange:
+    version: int
+    kind: str
+    action: str
+    guild_id: int
+    id: int
+
+    def as_dict(self, snapshot: GuildSnapshot) -> Mapping[str, Any]:
+        res: MutableMapping[str, Any] = {'version': self.version, 'kind': self.kind, 'action': self.action, 'guild_id': self.guild_id, 'id': self.id}
+
+        if self.action != 'remove':
+            # Changes always carry the current details rather than those at the time of the change
+            gld = snapshot.guilds.get(self.guild_id, None)
+
+            if self.kind == 'guild' and gld:
+                res['data'] = gld.as_dict()
+            elif self.kind == 'member' and gld and self.id in gld.members:
+                res['data'] = gld.members[self.id].as_dict()
+
+        return res
+
+
+class GuildSnapshot:
+    """
+    In-memory snapshot of the guilds and members known to the bot, kept current from gateway events
+
+    The bot JSON API serves this snapshot rather than walking every guild and member of the bot on each request. Every change
+    bumps ``version`` and is recorded in a bounded changelog so that clients can ask for only the changes since the version
+    they last saw (see :py:meth:`changes_since`). Encoded responses for the full snapshot are cached until the next change.
+    The ``discord.Member`` objects are also indexed in ``members`` for lookups by ID or name (see :py:class:`MemberIndex`).
+
+    ``epoch`` identifies this snapshot. Versions from a different epoch (i.e. from before the bot restarted) are not comparable.
+    """
+
+    guilds: Dict[int, GuildEntry]
+    members: MemberIndex
+    version: int
+    epoch: int
+
+    bot: Optional[discord.Client]
+
+    _changelog: Deque[SnapshotChange]
+    _encoded: Dict[str, Tuple[int, bytes]]
+    _member_keys: Tuple[int, List[MemberKey]]
+
+    def __init__(self, changelog_size: int = CHANGELOG_SIZE) -> None:
+        self.guilds = {}
+        self.members = MemberIndex()
+        self.version = 0
+        self.epoch = int(time.time() * 1000)
+        self.bot = None
+
+        self._changelog = deque(maxlen=changelog_size)
+        self._encoded = {}
+        self._member_keys = (-1, [])
+
+    @property
+    def etag(self) -> str:
+        return f'{self.epoch}-{self.version}'
+
+    @property
+    def oldest_version(self) -> int:
+        """
+        Oldest version that changes can be provided since
+        """
+
+        return self._changelog[0].version - 1 if self._changelog else self.version
+
+    def register(self, bot: discord.Client) -> None:
+        """
+        Add listeners to ``bot`` for the gateway events which keep this snapshot current
+        """
+
+        self.bot = bot
+
+        bot.add_listener(self._on_ready, 'on_ready')
+        bot.add_listener(self._on_guild_available, 'on_guild_available')
+        bot.add_listener(self._on_guild_available, 'on_guild_join')
+        bot.add_listener(self._on_guild_remove, 'on_guild_remove')
+        bot.add_listener(self._on_guild_update, 'on_guild_update')
+        bot.add_listener(self._on_member_update, 'on_member_join')
+        bot.add_listener(self._on_member_remove, 'on_member_remove')
+        bot.add_listener(self._on_member_changed, 'on_member_update')
+        bot.add_listener(self._on_user_update, 'on_user_update')
+
+    def _record(self, kind: str, action: str, guild_id: int, entry_id: int) -> None:
+        self.version += 1
+        self._changelog.append(SnapshotChange(version=self.version, kind=kind, action=action, guild_id=guild_id, id=entry_id))
+        self._encoded.clear()
+
+    def rebuild(self, guilds: Iterable[discord.Guild]) -> None:
+        """
+        Replace the snapshot with the current state of ``guilds``
+
+        The changelog is cleared so clients asking for changes since an earlier version get the full snapshot.
+        """
+
+        guilds = list(guilds)
+
+        self.guilds = {gld.id: GuildEntry.from_guild(gld) for gld in guilds}
+        self.members.rebuild(guilds)
+        self.version += 1
+        self._changelog.clear()
+        self._encoded.clear()
+
+        num_members = sum(len(gld.members) for gld in self.guilds.values())
+        logger.info(f'Built guild snapshot v{self.version} of #{len(self.guilds)} guilds and #{num_members} members')
+
+    def set_guild(self, guild: discord.Guild) -> None:
+        action = 'update' if guild.id in self.guilds else 'add'
+        self.guilds[guild.id] = GuildEntry.from_guild(guild)
+
+        self.members.remove_guild(guild.id)
+
+        for member in guild.members:
+            self.members.add(member)
+
+        self._record('guild', action, guild.id, guild.id)
+
+    def remove_guild(self, guild_id: int) -> None:
+        self.members.remove_guild(guild_id)
+
+        if self.guilds.pop(guild_id, None):
+            self._record('guild', 'remove', guild_id, guild_id)
+
+    def set_member(self, member: discord.Member) -> None:
+        gld = self.guilds.get(member.guild.id, None)
+
+        if not gld:
+            self.set_guild(member.guild)
+            return
+
+        self.members.add(member)
+
+        entry = MemberEntry.from_member(member)
+        existing = gld.members.get(member.id, None)
+
+        if existing == entry:
+            return
+
+        gld.members[member.id] = entry
+        self._record('member', 'update' if existing else 'add', gld.id, member.id)
+
+    def remove_member(self, guild_id: int, member_id: int) -> None:
+        self.members.remove(guild_id, member_id)
+        gld = self.guilds.get(guild_id, None)
+
+        if gld and gld.members.pop(member_id, None):
+            self._record('member', 'remove', guild_id, member_id)
+
+    def changes_since(self, version: int, epoch: int = None) -> Optional[List[Mapping[str, Any]]]:
+        """
+        Returns the changes after ``version``, with only the latest change for each guild or member
+
+        Returns ``None`` if the changes are no longer available (``version`` is older than the changelog or from another
+        epoch), in which case the full snapshot must be used.
+        """
+
+        if (epoch is not None and epoch != self.epoch) or version < self.oldest_version or version > self.version:
+            return None
+
+        latest: Dict[Tuple[str, int, int], SnapshotChange] = {}
+
+        for change in reversed(self._changelog):
+            if change.version <= version:
+                break
+
+            latest.setdefault((change.kind, change.guild_id, change.id), change)
+
+        return [change.as_dict(self) for change in sorted(latest.values(), key=lambda change: change.version)]
+
+    def member_keys(self) -> List[MemberKey]:
+        """
+        Returns the sorted (guild ID, member ID) keys of every member, cached until the next change
+        """
+
+        if self._member_keys[0] != self.version:
+            keys = sorted((gld_id, mem_id) for gld_id, gld in self.guilds.items() for mem_id in gld.members)
+            self._member_keys = (self.version, keys)
+
+        return self._member_keys[1]
+
+    def query_members(self, query: MemberQuery, after: MemberKey = None, limit: int = 100) -> Tuple[List[MemberEntry], Optional[MemberKey]]:
+        """
+        Returns a page of the members matching ``query`` ordered by guild and member ID along with the key to request the
+        next page with (or ``None`` if this is the last page)
+
+        Name prefix queries start from the matches in the member index and guild queries start from the first member of
+        the guild rather than walking every member.
+
+        :param query: the filters to apply
+        :param after: the key of the last member of the previous page
+        :param limit: maximum number of members to return
+        """
+
+        if query.prefix:
+            guild_id = next(iter(query.guild_ids)) if query.guild_ids and len(query.guild_ids) == 1 else None
+            keys = sorted((member.guild.id, member.id) for member in self.members.find_prefix(query.prefix, guild_id=guild_id))
+        else:
+            keys = self.member_keys()
+
+        if after:
+            start = bisect.bisect_right(keys, after)
+        elif query.guild_ids:
+            start = bisect.bisect_left(keys, (min(query.guild_ids), ))
+        else:
+            start = 0
+
+        max_guild_id = max(query.guild_ids) if query.guild_ids else None
+        found: List[MemberEntry] = []
+
+        for gld_id, mem_id in itertools.islice(keys, start, None):
+            if max_guild_id is not None and gld_id > max_guild_id:
+                break
+
+            entry = self.guilds[gld_id].members.get(mem_id, None)
+
+            if not entry or not query.matches(entry):
+                continue
+
+            if len(found) == limit:
+                return found, (found[-1].guild_id, found[-1].id)
+
+            found.append(entry)
+
+        return found, None
+
+    def members_dict(self) -> Mapping[int, Mapping[str, Any]]:
+        mems = {}
+
+        for gld in self.guilds.values():
+            for mem in gld.members.values():
+                mems[mem.id] = {'name': mem.name, 'guild': {gld.id: gld.name}, 'id': mem.id}
+
+        return mems
+
+    def guilds_dict(self, use_tz: Timezone = None) -> Mapping[int, Mapping[str, Any]]:
+        return {gld.id: gld.as_dict(use_tz=use_tz) for gld in self.guilds.values()}
+
+    def encoded(self, name: str) -> bytes:
+        """
+        Returns the encoded JSON of the full "members" or "guilds" snapshot, cached until the next change
+        """
+
+        cached = self._encoded.get(name, None)
+
+        if cached and cached[0] == self.version:
+            return cached[1]
+
+        data = dumps_bytes(self.members_dict() if name == 'members' else self.guilds_dict())
+        self._encoded[name] = (self.version, data)
+        return data
+
+    async def _on_ready(self) -> None:
+        self.rebuild(self.bot.guilds)
+
+    async def _on_guild_available(self, guild: discord.Guild) -> None:
+        self.set_guild(guild)
+
+    async def _on_guild_remove(self, guild: discord.Guild) -> None:
+        self.remove_guild(guild.id)
+
+    async def _on_guild_update(self, before: discord.Guild, after: discord.Guild) -> None:
+        gld = self.guilds.get(after.id, None)
+
+        if not gld:
+            self.set_guild(after)
+            return
+
+        gld.name, gld.description, gld.owner_id = after.name, after.description, after.owner_id
+        self._record('guild', 'update', after.id, after.id)
+
+    async def _on_member_update(self, member: discord.Member) -> None:
+        self.set_member(member)
+
+    async def _on_member_changed(self, before: discord.Member, after: discord.Member) -> None:
+        self.set_member(after)
+
+    async def _on_member_remove(self, member: discord.Member) -> None:
+        self.remove_member(member.guild.id, member.id)
+
+    async def _on_user_update(self, before: discord.User, after: discord.User) -> None:
+        # Name, discriminator and avatar changes apply to the member entries for the user in every guild
+        for gld in self.guilds.values():
+            entry = gld.members.get(after.id, None)
+            member = self.members.get(after.id, guild_id=gld.id)
+
+            if member:
+                self.members.add(member)
+
+            if entry:
+                changed = MemberEntry(id=entry.id, guild_id=entry.guild_id, name=after.name, discriminator=after.discriminator,
+                                      avatar=str(after.avatar_url), joined_at=entry.joined_at, role_ids=entry.role_ids)
+
+                if changed != entry:
+                    gld.members[after.id] = changed
+                    self._record('member', 'update', gld.id, after.id)
@@ -1,12 +1,23 @@
+import bisect
 import discord
 import logging
 
 from aiohttp import web
+from datetime import datetime
 from pprint import pformat
-from typing import Mapping, Any, Optional, List
+from typing import Awaitable, Callable, Mapping, MutableMapping, Any, Optional, List, Set
 
+from minder.bot.state import MemberQuery
 from minder.cogs.backend import routes
-from minder.models.reminders import Reminder
+from minder.config import Config
+from minder.encoding import dumps_bytes
+from minder.errors import IdempotencyError, MinderError
+from minder.metrics import CONTENT_TYPE, REGISTRY
+from minder.models.batch import ReminderBatch
+from minder.models.coercion import to_bool
+from minder.models.events import EVENT_KINDS
+from minder.models.idempotency import IdempotencyStore, IdempotentResponse, IDEMPOTENCY_HEADER, IDEMPOTENCY_REPLAY_HEADER
+from minder.models.reminders import Reminder, REMINDER_PATCH_PLAN
 from minder.utils import Timezone, FuzzyTime
 
 logger = logging.getLogger(__name__)
@@ -30,9 +41,75 @@ async def _validate_post_data(request: web.Request, required_attrs: List[str]) -
     return json_data
 
 
-def _member_to_dict(member: discord.Member, use_tz: Optional[Timezone] = None) -> Mapping[str, Any]:
-    joined_ts = member.joined_at.timestamp() if not use_tz else member.joined_at.astimezone(use_tz.timezone).ctime()
-    return {'id': member.id, 'name': member.name, 'discriminator': member.discriminator, 'joined_ts': joined_ts, 'avatar': str(member.avatar_url)}
+def _json_response(data: Any, status: int = 200, headers: Mapping[str, str] = None) -> web.Response:
+    """
+    Build a JSON response, encoded straight to bytes with :py:func:`minder.encoding.dumps_bytes`
+    """
+
+    return web.Response(body=dumps_bytes(data), status=status, headers=headers, content_type='application/json', charset='utf-8')
+
+
+def _etag_matches(request: web.Request, etag: str) -> bool:
+    """
+    Returns ``True`` if the request "If-None-Match" header includes ``etag`` (or is "*")
+    """
+
+    if_none_match = request.headers.get('If-None-Match', None)
+
+    if not if_none_match:
+        return False
+
+    for req_etag in if_none_match.split(','):
+        req_etag = req_etag.strip()
+
+        if req_etag.startswith('W/'):
+            req_etag = req_etag[2:]
+
+        if req_etag == '*' or req_etag.strip('"') == etag:
+            return True
+
+    return False
+
+
+async def _idempotent(request: web.Request, scope: str, handler: Callable[[], Awaitable[web.Response]]) -> web.Response:
+    """
+    Handle ``request`` with ``handler`` unless it is a retry of a request with the same "Idempotency-Key" header
+
+    Responses for requests with the header are recorded in Redis and replayed for retries without calling ``handler`` again.
+    If ``handler`` raises or returns a server error, the key is released so the request can be retried.
+    """
+
+    idem_key = request.headers.get(IDEMPOTENCY_HEADER, None)
+
+    if not idem_key:
+        return await handler()
+
+    bot = _get_bot(request)
+    fingerprint = IdempotencyStore.fingerprint(await request.read())
+
+    try:
+        recorded = IdempotencyStore.begin(bot.redis_helper, scope, idem_key, fingerprint)
+    except IdempotencyError as ex:
+        http_errors = {400: web.HTTPBadRequest, 422: web.HTTPUnprocessableEntity}
+        raise http_errors.get(ex.status_code, web.HTTPConflict)(text=str(ex)) from ex
+
+    if recorded:
+        return web.Response(text=recorded.body, status=recorded.status, content_type=recorded.content_type,
+                            headers={IDEMPOTENCY_REPLAY_HEADER: 'true'})
+
+    try:
+        resp = await handler()
+    except Exception:
+        IdempotencyStore.release(bot.redis_helper, scope, idem_key)
+        raise
+
+    if resp.status >= 500:
+        IdempotencyStore.release(bot.redis_helper, scope, idem_key)
+    else:
+        IdempotencyStore.complete(bot.redis_helper, scope, idem_key, fingerprint,
+                                  IdempotentResponse(status=resp.status, body=resp.text, content_type=resp.content_type))
+
+    return resp
 
 
 def _get_bot(request: web.Request, check_ready: bool = True):
@@ -50,61 +127,232 @@ def _get_bot(request: web.Request, check_ready: bool = True):
 
 @routes.get('/')
 async def index(request: web.Request) -> web.Response:
-    return web.json_response({'running': True})
+    return _json_response({'running': True})
+
+
+@routes.get('/metrics')
+async def get_metrics(request: web.Request) -> web.Response:
+    if not Config.METRICS_ENABLE:
+        raise web.HTTPNotFound()
+
+    return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+def _snapshot_response(request: web.Request, name: str) -> Optional[web.Response]:
+    """
+    Returns the response for a "since" (delta) or conditional request for the "members" or "guilds" snapshot (otherwise ``None``)
+
+    With "since", only the changes after that snapshot version are returned. If those changes are no longer available (or
+    "epoch" does not match the current snapshot), the full snapshot is returned in "data" instead with "full" set.
+    """
+
+    snapshot = _get_bot(request).guild_snapshot
+    headers = {'ETag': f'"{snapshot.etag}"'}
+
+    if 'since' not in request.query:
+        if _etag_matches(request, snapshot.etag):
+            raise web.HTTPNotModified(headers=headers)
+
+        return None
+
+    try:
+        since = int(request.query['since'])
+        epoch = int(request.query['epoch']) if request.query.get('epoch') else None
+    except ValueError:
+        raise web.HTTPBadRequest(text=f'Invalid "since" or "epoch" value provided: "{request.query["since"]}"')
+
+    json_resp: MutableMapping[str, Any] = {'version': snapshot.version, 'epoch': snapshot.epoch, 'since': since}
+    changes = snapshot.changes_since(since, epoch=epoch)
+
+    if changes is None:
+        json_resp.update(full=True, data=snapshot.members_dict() if name == 'members' else snapshot.guilds_dict())
+    else:
+        json_resp.update(full=False, changes=changes)
+
+    return _json_response(json_resp, headers=headers)
+
+
+MEMBER_FILTER_ARGS = ['guild_id', 'name', 'role_id', 'joined_after']
+PAGE_ARGS = ['after', 'limit']
+MAX_PAGE_SIZE = 1000
+
+
+def _parse_ids(value: str) -> Set[int]:
+    return set(int(val) for val in value.split(',') if val.strip())
+
+
+def _parse_joined_after(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _parse_member_query(request: web.Request) -> MemberQuery:
+    try:
+        return MemberQuery(guild_ids=_parse_ids(request.query['guild_id']) if request.query.get('guild_id') else None,
+                           prefix=request.query.get('name', None) or None,
+                           role_id=int(request.query['role_id']) if request.query.get('role_id') else None,
+                           joined_after=_parse_joined_after(request.query['joined_after']) if request.query.get('joined_after') else None)
+    except ValueError as ex:
+        raise web.HTTPBadRequest(text=f'Invalid member filter provided: {ex}')
+
+
+def _parse_limit(request: web.Request) -> int:
+    try:
+        limit = int(request.query.get('limit', 100))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f'Invalid "limit" provided: "{request.query["limit"]}"')
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise web.HTTPBadRequest(text=f'Invalid "limit" provided: "{limit}". Must be between 1 and {MAX_PAGE_SIZE}')
+
+    return limit
+
+
+def _parse_timezone(request: web.Request) -> Optional[Timezone]:
+    use_tz = request.query.get('use_tz', None)
+
+    if not use_tz:
+        return None
+
+    if not Timezone.is_valid_timezone(use_tz):
+        raise web.HTTPBadRequest(text=f'Invalid timezone name provided: "{use_tz}"')
+
+    return Timezone.build(use_tz)
 
 
 @routes.get('/members')
 async def get_members(request: web.Request) -> web.Response:
-    bot = _get_bot(request)
-    mems = {mem.id: {'name': mem.name, 'guild': {mem.guild.id: mem.guild.name}, 'id': mem.id} for mem in bot.get_all_members()}
+    """
+    Returns every member known to the bot keyed by member ID
+
+    If any of the "guild_id" (comma-separated), "name" (prefix), "role_id" or "joined_after" (timestamp or ISO 8601) filters
+    or the "after" / "limit" pagination arguments are provided, a page of matching members ordered by guild and member ID
+    is returned instead. The "next_cursor" of a page is passed as "after" to get the next page.
+    """
+
+    snapshot = _get_bot(request).guild_snapshot
+    delta_resp = _snapshot_response(request, 'members')
+
+    if delta_resp:
+        return delta_resp
+
+    headers = {'ETag': f'"{snapshot.etag}"'}
+
+    if any(arg in request.query for arg in MEMBER_FILTER_ARGS + PAGE_ARGS):
+        query, limit, use_tz = _parse_member_query(request), _parse_limit(request), _parse_timezone(request)
+
+        try:
+            after = tuple(int(val) for val in request.query['after'].split(':', 1)) if request.query.get('after') else None
+        except ValueError:
+            raise web.HTTPBadRequest(text=f'Invalid "after" cursor provided: "{request.query["after"]}"')
+
+        entries, next_key = snapshot.query_members(query, after=after, limit=limit)
+        members = [{**entry.as_dict(use_tz=use_tz), 'guild_id': entry.guild_id} for entry in entries]
+        next_cursor = f'{next_key[0]}:{next_key[1]}' if next_key else None
 
-    if not mems:
+        return _json_response({'members': members, 'count': len(members), 'next_cursor': next_cursor, 'has_more': next_cursor is not None,
+                               'version': snapshot.version, 'epoch': snapshot.epoch}, headers=headers)
+
+    if not snapshot.guilds:
         logger.warning('No members found querying bot, returning empty response')
-        status_code = 204
-    else:
-        logger.debug(f'Found #{len(mems)} entries:\n{pformat(mems, indent=2)}')
-        status_code = 200
+        return _json_response({}, status=204)
 
-    return web.json_response(mems, status=status_code)
+    return web.Response(body=snapshot.encoded('members'), content_type='application/json', charset='utf-8', headers=headers)
 
 
 @routes.get('/guilds')
 async def get_guilds(request: web.Request) -> web.Response:
-    bot = _get_bot(request)
-    use_tz = request.query.get('use_tz', None)
+    """
+    Returns every guild known to the bot, including its members, keyed by guild ID
 
-    if use_tz:
-        if not Timezone.is_valid_timezone(use_tz):
-            raise web.HTTPInternalServerError(text='Invalid timezone name provided: "{use_tz}"')
-
-        use_tz = Timezone.build(use_tz)
+    Guilds can be limited to "guild_id" (comma-separated) and members are omitted with "include_members=false". Nested
+    members can also be filtered with the "name", "role_id" and "joined_after" filters of ``/members``. If "after" or
+    "limit" are provided, a page of guilds ordered by ID is returned with the "next_cursor" to pass as "after".
+    """
 
-    glds = {}
+    snapshot = _get_bot(request).guild_snapshot
+    use_tz = _parse_timezone(request)
+    delta_resp = _snapshot_response(request, 'guilds')
 
-    for gld in bot.guilds:
-        gld_members = {mem.id: _member_to_dict(mem, use_tz=use_tz) for mem in gld.members}
-        glds[gld.id] = {'id': gld.id, 'name': gld.name, 'description': gld.description, 'owner_id': gld.owner_id, 'members': gld_members}
+    if delta_resp:
+        return delta_resp
 
-    if not glds:
+    if not snapshot.guilds:
         logger.warning('No guild details found, returning empty response')
-        status_code = 204
-    else:
-        logger.debug(f'Found #{len(glds)} entries:\n{pformat(glds, indent=2)}')
-        status_code = 200
+        return _json_response({}, status=204)
+
+    headers = {'ETag': f'"{snapshot.etag}"'}
+
+    try:
+        include_members = to_bool(request.query.get('include_members', True))
+    except ValueError as ex:
+        raise web.HTTPBadRequest(text=f'Invalid "include_members" provided: {ex}')
+
+    if include_members and not use_tz and not any(arg in request.query for arg in MEMBER_FILTER_ARGS + PAGE_ARGS):
+        return web.Response(body=snapshot.encoded('guilds'), content_type='application/json', charset='utf-8', headers=headers)
+
+    query = _parse_member_query(request)
+    guild_ids = sorted(query.guild_ids if query.guild_ids is not None else snapshot.guilds)
+    paged = any(arg in request.query for arg in PAGE_ARGS)
+    next_cursor = None
+
+    if paged:
+        limit = _parse_limit(request)
+
+        try:
+            after = int(request.query['after']) if request.query.get('after') else None
+        except ValueError:
+            raise web.HTTPBadRequest(text=f'Invalid "after" cursor provided: "{request.query["after"]}"')
+
+        if after is not None:
+            guild_ids = guild_ids[bisect.bisect_right(guild_ids, after):]
 
-    return web.json_response(glds, status=status_code)
+        if len(guild_ids) > limit:
+            guild_ids = guild_ids[:limit]
+            next_cursor = str(guild_ids[-1])
+
+    member_filtered = any(request.query.get(arg) for arg in ['name', 'role_id', 'joined_after'])
+    glds = []
+
+    for gld_id in guild_ids:
+        gld = snapshot.guilds.get(gld_id, None)
+
+        if not gld:
+            continue
+
+        gld_dict = gld.as_dict(use_tz=use_tz, include_members=include_members and not member_filtered)
+
+        if include_members and member_filtered:
+            gld_dict['members'] = {mem.id: mem.as_dict(use_tz=use_tz) for mem in gld.members.values() if query.matches(mem)}
+
+        glds.append(gld_dict)
+
+    if paged:
+        return _json_response({'guilds': glds, 'count': len(glds), 'next_cursor': next_cursor, 'has_more': next_cursor is not None,
+                               'version': snapshot.version, 'epoch': snapshot.epoch}, headers=headers)
+
+    return _json_response({gld['id']: gld for gld in glds}, headers=headers)
 
 
 @routes.get('/reminders')
 async def get_reminders(request: web.Request) -> web.Response:
     bot = _get_bot(request)
 
+    include_complete = request.query.get('include_complete', 'true').lower() not in ['0', 'false', 'no']
+    member_id = int(request.query['member_id']) if 'member_id' in request.query else None
+
+    # Answer conditional requests from the version counters before touching the reminders hash
+    etag = Reminder.build_etag(bot.redis_helper, member_id=member_id, include_complete=include_complete)
+
+    if _etag_matches(request, etag):
+        raise web.HTTPNotModified(headers={'ETag': f'"{etag}"'})
+
     if not bot.redis_helper.keys(redis_id='reminders'):
-        return web.json_response({'message': 'No reminders found', 'reminders': []})
+        return _json_response({'message': 'No reminders found', 'reminders': []}, headers={'ETag': f'"{etag}"'})
 
-    include_complete = request.query.get('include_complete', True)
     rem_ents = {}
-    member_id = int(request.query['member_id']) if 'member_id' in request.query else None
 
     for r_id, r_ent in Reminder.fetch_all(bot.redis_helper, redis_id='reminders', check_exists=False).items():
         if not include_complete and r_ent.is_complete:
@@ -113,7 +361,7 @@ async def get_reminders(request: web.Request) -> web.Response:
         if member_id and (r_ent.member_id != member_id):
             continue
 
-        rem_ents[r_id] = r_ent.as_dict()
+        rem_ents[r_id] = r_ent
 
     msg = 'No reminders found in Redis' if not rem_ents else f'Found #{len(rem_ents)} reminders in Redis'
     json_resp = {'message': msg, 'reminders': rem_ents, 'include_complete': include_complete}
@@ -121,11 +369,15 @@ async def get_reminders(request: web.Request) -> web.Response:
     if member_id:
         json_resp['member_id'] = member_id
 
-    return web.json_response(json_resp)
+    return _json_response(json_resp, headers={'ETag': f'"{etag}"'})
 
 
 @routes.post('/reminders')
 async def new_reminder(request: web.Request) -> web.Response:
+    return await _idempotent(request, 'reminders', lambda: _create_reminder(request))
+
+
+async def _create_reminder(request: web.Request) -> web.Response:
     bot = _get_bot(request)
 
     await _validate_post_data(request, ['when', 'content', 'member_id'])
@@ -135,7 +387,7 @@ async def new_reminder(request: web.Request) -> web.Response:
     content = post_data['content']
     member_id = int(post_data['member_id'])
 
-    member = discord.utils.get(bot.get_all_members(), id=member_id)
+    member = bot.guild_snapshot.members.get(member_id)
 
     if not member:
         if 'member_name' in post_data:
@@ -166,9 +418,103 @@ async def new_reminder(request: web.Request) -> web.Response:
 
     logger.info(f'Received bot web request to create new reminder:\n{pformat(rem_ent.as_dict(), indent=4)}')
 
-    rem_ent.store(bot.redis_helper)
+    rem_ent.store(bot.redis_helper, event_action='create')
 
     msg = f'Successfully created new reminder for member #{member_id} at "{when}" ({trigger_time.resolved_time}) with content "{content}"'
     json_res = {'new_reminder': rem_ent.as_dict(), 'message': msg}
 
-    return web.json_response(json_res)
+    return _json_response(json_res)
+
+
+@routes.patch('/reminders/{id}')
+async def update_reminder(request: web.Request) -> web.Response:
+    bot = _get_bot(request)
+    rem_id = request.match_info['id']
+
+    try:
+        changes = REMINDER_PATCH_PLAN.coerce(await request.json())
+    except (ValueError, AttributeError, MinderError) as ex:
+        raise web.HTTPBadRequest(text=f'Invalid PATCH of reminder ID "{rem_id}": {ex}')
+
+    res = Reminder.update(bot.redis_helper, rem_id, changes)
+
+    if not res:
+        raise web.HTTPNotFound(text=f'No reminder found with ID "{rem_id}"')
+
+    rem_ent, changed = res
+    msg = f'Successfully updated reminder ID "{rem_id}"' if changed else f'No changes to reminder ID "{rem_id}"'
+    return _json_response({'message': msg, 'reminder': rem_ent.as_dict(), 'changed': changed})
+
+
+@routes.post('/reminders/batch')
+async def reminders_batch(request: web.Request) -> web.Response:
+    return await _idempotent(request, 'reminders_batch', lambda: _apply_reminder_batch(request))
+
+
+async def _apply_reminder_batch(request: web.Request) -> web.Response:
+    bot = _get_bot(request)
+
+    try:
+        batch = ReminderBatch.parse(await request.json())
+    except (ValueError, MinderError) as ex:
+        raise web.HTTPBadRequest(text=f'Invalid reminder batch: {ex}')
+
+    def resolve_member(member_id: int, member_name: Optional[str]) -> Optional[discord.Member]:
+        return bot.guild_snapshot.members.get(member_id)
+
+    try:
+        applied = batch.apply(bot.redis_helper, resolve_member=resolve_member)
+    except Exception as ex:
+        raise web.HTTPInternalServerError(text=f'Error storing reminder batch in Redis: {ex}')
+
+    results = batch.results()
+
+    if not applied:
+        num_errors = len([item for item in batch.items if item.error])
+        msg = f'Rejected reminder batch: #{num_errors} of #{len(batch.items)} operations are invalid. No changes were made'
+        return _json_response({'message': msg, 'results': results}, status=400)
+
+    logger.info(f'Applied batch of #{len(results)} reminder operations received via bot web request')
+    return _json_response({'message': f'Successfully applied #{len(results)} reminder operations', 'results': results})
+
+
+@routes.get('/events')
+async def event_stream(request: web.Request) -> web.StreamResponse:
+    """
+    Stream reminder and status events to dashboards as server-sent events
+
+    The optional "kinds" query argument limits the stream to a comma-separated list of event kinds (i.e. "reminder"). A
+    comment is sent every ``Config.EVENT_KEEPALIVE`` seconds without events so proxies don't close idle connections.
+    """
+
+    feed = request.app['event_feed']
+    kinds = [kind.strip().lower() for kind in request.query.get('kinds', '').split(',') if kind.strip()]
+    invalid = [kind for kind in kinds if kind not in EVENT_KINDS]
+
+    if invalid:
+        raise web.HTTPBadRequest(text=f'Invalid event kinds: {", ".join(invalid)}. Must be one of: {", ".join(EVENT_KINDS)}')
+
+    resp = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    await resp.prepare(request)
+
+    sub = feed.subscribe(kinds=kinds)
+
+    try:
+        await resp.write(b': connected\n\n')
+
+        while True:
+            message = await sub.get(timeout=float(Config.EVENT_KEEPALIVE))
+
+            if message is None:
+                await resp.write(b': keep-alive\n\n')
+                continue
+
+            kind, raw = message
+            await resp.write(f'event: {kind}\ndata: {raw}\n\n'.encode())
+    except ConnectionResetError:
+        logger.debug('Event stream client disconnected')
+    finally:
+        # aiohttp cancels the handler when the client goes away, which is left to propagate after unsubscribing
+        feed.unsubscribe(sub)
+
+    return resp
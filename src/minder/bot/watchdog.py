@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os.path
+import sys
+import threading
+import time
+import traceback
+
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Deque, List, Mapping, Optional, Tuple
+
+from minder.metrics import LOOP_BLOCKS, LOOP_LAG, LOOP_LAG_QUANTILES
+
+logger = logging.getLogger(__name__)
+
+# Call sites inside this package are preferred when attributing a stall to a frame of the blocked stack
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Percentiles reported for the recent lag window
+LAG_QUANTILES = [0.5, 0.9, 0.99]
+
+# Number of stack frames (innermost last) included when logging a stall
+STACK_LIMIT = 15
+
+
+@dataclass
+class BlockedStack:
+    """
+    Stack of the event loop thread captured while it was blocked during tick ``tick``
+    """
+
+    tick: int
+    site: str
+    stack: List[str]
+
+
+def call_site(stack: traceback.StackSummary) -> str:
+    """
+    Returns a label for the innermost frame of ``stack`` in this package (or the innermost frame if there is none)
+    """
+
+    frame = next((frame for frame in reversed(stack) if frame.filename.startswith(PACKAGE_PATH)), stack[-1])
+    path = os.path.join(os.path.basename(os.path.dirname(frame.filename)), os.path.basename(frame.filename))
+    return f'{frame.name} ({path}:{frame.lineno})'
+
+
+class LoopWatchdog:
+    """
+    Measures event loop scheduling lag and captures the stack of whatever is blocking the loop
+
+    A task on the loop sleeps for ``interval`` seconds at a time and records how late it wakes up as the lag. A background
+    thread watches for the task missing its wake up by more than ``threshold`` seconds and, while the loop is still blocked,
+    captures the stack of the loop thread. Once the loop recovers, the stall is logged with the captured stack and counted
+    by call site.
+
+    Lag percentiles over the last ``window`` ticks and the blocking call sites are reported through the metrics in
+    :py:mod:`minder.metrics` and logged every ``report_interval`` seconds.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.25, window: int = 1200, report_interval: float = 300.0) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.report_interval = report_interval
+
+        self.lags: Deque[float] = deque(maxlen=window)
+        self.call_sites: Counter = Counter()
+
+        self._tick = 0
+        self._expected: Optional[Tuple[int, float]] = None
+        self._blocked: Optional[BlockedStack] = None
+        self._loop_thread_id: Optional[int] = None
+
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        Start watching the running event loop (must be called from the loop thread)
+        """
+
+        if self.running:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._task = asyncio.ensure_future(self._tick_loop())
+
+        self._thread = threading.Thread(target=self._watch, args=(self._stop,), name='minder-loop-watchdog', daemon=True)
+        self._thread.start()
+
+        LOOP_LAG_QUANTILES.set_function(lambda: {(str(quantile),): value for quantile, value in self.percentiles().items()})
+        logger.info(f'Started event loop watchdog (threshold: {self.threshold}s, interval: {self.interval}s)')
+
+    def stop(self) -> None:
+        self._stop.set()
+
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def percentiles(self) -> Mapping[float, float]:
+        """
+        Returns the lag percentiles (see :py:data:`LAG_QUANTILES`) and maximum (as ``1.0``) over the recent window
+        """
+
+        lags = sorted(self.lags)
+
+        if not lags:
+            return {}
+
+        values = {quantile: lags[min(len(lags) - 1, int(quantile * len(lags)))] for quantile in LAG_QUANTILES}
+        values[1.0] = lags[-1]
+        return values
+
+    def reset(self) -> None:
+        self.lags.clear()
+        self.call_sites.clear()
+
+    def top_sites(self, limit: int = 10) -> List[Tuple[str, int]]:
+        return self.call_sites.most_common(limit)
+
+    async def _tick_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_report = loop.time() + self.report_interval
+
+        while True:
+            # Set as a single tuple so the watchdog thread never sees the wake up time of one tick with the number of another
+            self._expected = (self._tick, time.monotonic() + self.interval)
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._record(lag)
+
+            if loop.time() >= next_report:
+                next_report = loop.time() + self.report_interval
+                self._report()
+
+    def _record(self, lag: float) -> None:
+        blocked, self._blocked = self._blocked, None
+        tick, self._tick = self._tick, self._tick + 1
+
+        self.lags.append(lag)
+        LOOP_LAG.observe(lag)
+
+        if lag < self.threshold:
+            return
+
+        if blocked is None or blocked.tick != tick:
+            # The loop recovered before the stack could be captured
+            site, stack_out = 'unknown', ''
+        else:
+            site, stack_out = blocked.site, ''.join(blocked.stack[-STACK_LIMIT:])
+
+        self.call_sites[site] += 1
+        LOOP_BLOCKS.inc(site=site)
+        logger.warning(f'Event loop blocked for {lag:.3f}s at {site}' + (f'. Blocking stack:\n{stack_out}' if stack_out else ''))
+
+    def _report(self) -> None:
+        percentiles = self.percentiles()
+
+        if not percentiles:
+            return
+
+        lag_out = ', '.join(f'p{quantile * 100:g}: {value * 1000:.1f}ms' for quantile, value in percentiles.items() if quantile < 1.0)
+        sites_out = ''.join(f'\n -> {count}x {site}' for site, count in self.top_sites(5))
+        logger.info(f'Event loop lag over the last #{len(self.lags)} ticks: {lag_out}, max: {percentiles[1.0] * 1000:.1f}ms'
+                    + (f'. Blocking call sites:{sites_out}' if sites_out else ''))
+
+    def _watch(self, stop: threading.Event) -> None:
+        check_interval = max(0.01, self.threshold / 4)
+
+        while not stop.wait(check_interval):
+            expected = self._expected
+
+            if expected is None or time.monotonic() - expected[1] < self.threshold:
+                continue
+
+            tick = expected[0]
+
+            if self._blocked is not None and self._blocked.tick == tick:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+
+            if frame is None:
+                continue
+
+            stack = traceback.extract_stack(frame)
+            self._blocked = BlockedStack(tick=tick, site=call_site(stack), stack=stack.format())
@@ -42,7 +42,7 @@ def list_users():
 def add_user(username, password_hash, admin, enabled):
     from minder.web.model import db, User  # noqa: F401
 
-    if User.query.filter_by(username=username).count() > 0:
+    if User.get_by('username', username):
         click.secho(f'Error: Username "{username}" already exists in database', fg='red')
         sys.exit(1)
 
@@ -77,7 +77,7 @@ def add_user(username, password_hash, admin, enabled):
 def update_user(username, password_hash, enable_admin, enable_user, update_password):
     from minder.web.model import db, User  # noqa: F401
 
-    usr = User.query.filter_by(username=username).first()
+    usr = User.get_by('username', username)
 
     if not usr:
         click.secho(f'Error: Username "{username}" does not already exist in database', fg='red')
@@ -125,7 +125,7 @@ def update_user(username, password_hash, enable_admin, enable_user, update_passw
 def delete_user(username):
     from minder.web.model import db, User  # noqa: F401
 
-    usr = User.query.filter_by(username=username).first()
+    usr = User.get_by('username', username)
 
     if not usr:
         click.secho(f'Error: Username "{username}" does not exist in database', fg='red')
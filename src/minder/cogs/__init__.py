@@ -1,6 +1,7 @@
 from minder.cogs.base import BaseCog
 from minder.cogs.backend import BackendCog
 from minder.cogs.archive import ArchiveCog
+from minder.cogs.diagnostics import DiagnosticsCog
 from minder.cogs.reminder import ReminderCog
 from minder.cogs.settings import SettingsCog
 from minder.cogs.status import StatusCog
@@ -8,4 +9,4 @@ from minder.cogs.reporting import ReportingCog
 from minder.cogs.slash import SlashCog
 from minder.cogs.errors import ErrorHandlerCog
 
-__all__ = ['BaseCog', 'ArchiveCog', 'BackendCog', 'ReminderCog', 'ReportingCog', 'StatusCog', 'SettingsCog', 'SlashCog', 'ErrorHandlerCog']
+__all__ = ['BaseCog', 'ArchiveCog', 'BackendCog', 'DiagnosticsCog', 'ReminderCog', 'ReportingCog', 'StatusCog', 'SettingsCog', 'SlashCog', 'ErrorHandlerCog']
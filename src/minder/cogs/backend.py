@@ -7,6 +7,9 @@ from aiohttp import web
 from aiohttp_jinja2 import setup as setup_jinja
 from discord.ext import tasks
 
+from minder.bot.compression import compress_response
+from minder.bot.events import EventFeed
+from minder.bot.metrics import metrics_middleware
 from minder.config import Config
 from minder.cogs.base import BaseCog
 
@@ -35,18 +38,22 @@ class BackendCog(BaseCog, name='backend'):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-        self.app = web.Application(logger=logger, debug=Config.ENABLE_DEBUG)
+        self.app = web.Application(logger=logger, debug=Config.ENABLE_DEBUG, middlewares=[metrics_middleware])
         if Config.ENABLE_DEBUG:
             logger.debug('Loading aiohttp debug toolbar')
             aiohttp_debugtoolbar.setup(self.app)
 
         self.app['bot'] = self.bot
+        self.app['event_feed'] = EventFeed(self.bot.redis_helper)
         self.env = setup_jinja(self.app, loader=jinja2.PackageLoader('minder.web'))
 
         # Import views to populate routes table and register
         import minder.bot.views  # noqa: F401
         self.app.add_routes(routes)
 
+        if Config.COMPRESS_ENABLE:
+            self.app.on_response_prepare.append(compress_response)
+
         self.runner = web.AppRunner(self.app, handle_signals=True)
 
     async def _sync_init(self) -> None:
@@ -67,7 +74,9 @@ class BackendCog(BaseCog, name='backend'):
         await self.bot.wait_until_ready()
         logger.info('Bot ready. Starting aiohttp webserver')
 
-    def __unload(self) -> None:
+    def cog_unload(self) -> None:
+        self.app['event_feed'].stop()
+
         if not self._web_running or not self.site:
             logger.debug(f'Found no running aiohttp backend cog server running. (_web_running: {self._web_running}, site: {self.site})')
             return
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import discord
+import io
+import logging
+
+from datetime import datetime
+from discord.ext import commands
+
+from minder.bot.checks import is_admin, in_dm, in_admin_channel
+from minder.bot.profiling import PROFILE_MODES, profile_loop
+from minder.cogs.base import BaseCog
+from minder.common import ChannelType
+from minder.config import Config
+from minder.errors import build_stacktrace_embed
+from minder.timing import PHASES
+
+logger = logging.getLogger(__name__)
+
+
+class DiagnosticsCog(BaseCog, name='diagnostics'):
+    _profiling: bool = False
+
+    async def _admin_channel(self, ctx: commands.Context) -> ChannelType:
+        """
+        Returns the bot admin channel configured for the guild of ``ctx`` (or the channel of ``ctx`` if there is none)
+        """
+
+        if not ctx.guild:
+            return ctx.channel
+
+        guild_cfg = self.bot.bot_config.get_guild(guild_id=ctx.guild.id)
+        bot_chan_id = guild_cfg.get('bot_channel', None) if guild_cfg else None
+        bot_chan = await self.bot.lookup_channel(by_id=bot_chan_id, context_or_guild=ctx) if bot_chan_id else None
+
+        return bot_chan or ctx.channel
+
+    @commands.check_any(commands.is_owner(), is_admin())
+    @commands.check_any(in_dm(), in_admin_channel())
+    @commands.group(name='perf')
+    async def perf(self, ctx: commands.Context) -> None:
+        if not await self.check_ready_or_fail(ctx):
+            return
+
+        if ctx.invoked_subcommand:
+            return
+
+        summary = self.bot.command_stats.summary()
+
+        if not summary:
+            await ctx.send('No commands have been timed yet')
+            return
+
+        lines = [f'{"command":<24} {"calls":>6} {"err %":>6} {"mean":>8} {"max":>8}']
+        lines.extend(f'{stats["command"][:24]:<24} {stats["calls"]:>6} {stats["error_rate"] * 100:>6.1f} {stats["mean"]:>7.3f}s {stats["max"]:>7.3f}s'
+                     for stats in summary[:20])
+
+        await ctx.send(f'Command latency for #{len(summary)} commands (slowest first):```\n' + '\n'.join(lines) + '\n```')
+
+    @perf.command(name='slowest')
+    async def perf_slowest(self, ctx: commands.Context, limit: int = 10) -> None:
+        slowest = self.bot.command_stats.slowest(max(1, min(limit, 25)))
+
+        if not slowest:
+            await ctx.send('No commands have been timed yet')
+            return
+
+        phase_names = PHASES + ['other']
+        lines = [f'{"command":<20} {"total":>8} ' + ' '.join(f'{phase:>8}' for phase in phase_names) + '  when / user']
+
+        for timing in slowest:
+            phases = timing.as_dict()['phases']
+            when = datetime.fromtimestamp(timing.started_at).strftime('%m-%d %H:%M:%S')
+            failed = ' (failed)' if timing.failed else ''
+            lines.append(f'{timing.command[:20]:<20} {timing.duration:>7.3f}s ' + ' '.join(f'{phases[phase]:>7.3f}s' for phase in phase_names)
+                         + f'  {when} {timing.user}{failed}')
+
+        await ctx.send(f'Slowest #{len(slowest)} command invocations:```\n' + '\n'.join(lines) + '\n```')
+
+    @perf.command(name='lag')
+    async def perf_lag(self, ctx: commands.Context) -> None:
+        watchdog = self.bot.loop_watchdog
+
+        if not watchdog.running:
+            await ctx.send('The event loop watchdog is not running (see `LOOP_WATCHDOG_ENABLE`)')
+            return
+
+        percentiles = watchdog.percentiles()
+        lag_out = ', '.join(f'p{quantile * 100:g}: `{value * 1000:.1f}ms`' for quantile, value in percentiles.items() if quantile < 1.0)
+        msg_out = f'Event loop lag over the last #{len(watchdog.lags)} ticks: {lag_out}, max: `{percentiles.get(1.0, 0.0) * 1000:.1f}ms`'
+
+        sites = watchdog.top_sites()
+
+        if sites:
+            msg_out += f'\nTop blocking call sites (over `{watchdog.threshold}s`):```\n' + '\n'.join(f'{count:>6}x {site}' for site, count in sites) + '\n```'
+        else:
+            msg_out += f'\nNo stalls over `{watchdog.threshold}s` seen'
+
+        await ctx.send(msg_out)
+
+    @perf.command(name='reset')
+    async def perf_reset(self, ctx: commands.Context) -> None:
+        self.bot.command_stats.reset()
+        self.bot.loop_watchdog.reset()
+        logger.info(f'Command timing and event loop lag stats reset by "{ctx.author.name}"')
+        await ctx.send('Command timing and event loop lag stats reset')
+
+    @commands.check_any(commands.is_owner(), is_admin())
+    @commands.check_any(in_dm(), in_admin_channel())
+    @commands.command(name='profile')
+    async def profile(self, ctx: commands.Context, seconds: int = 30, mode: str = 'sample') -> None:
+        """
+        Profile the running bot for a number of seconds and send the top functions and full profile to the admin channel
+
+        "sample" mode (the default) samples the event loop stack every few milliseconds and is safe to use on a busy bot.
+        "cprofile" mode traces every call for exact counts, at the cost of slowing the bot down while it runs.
+        """
+
+        if mode not in PROFILE_MODES:
+            await ctx.send(f'Sorry, `{mode}` is not a valid profile mode. Must be one of: `{", ".join(PROFILE_MODES)}`')
+            return
+
+        max_seconds = int(Config.PROFILE_MAX_SECONDS)
+
+        if not 1 <= seconds <= max_seconds:
+            await ctx.send(f'Sorry, profiles must run between 1 and {max_seconds} seconds')
+            return
+
+        if DiagnosticsCog._profiling:
+            await ctx.send('Sorry, a profile is already running.. Try again once it finishes')
+            return
+
+        DiagnosticsCog._profiling = True
+        logger.info(f'Profiling event loop for {seconds} seconds ({mode}) as requested by "{ctx.author.name}"')
+
+        try:
+            await ctx.send(f'Profiling for {seconds} seconds using `{mode}`..')
+            result = await profile_loop(seconds, mode=mode)
+        except Exception as ex:
+            logger.error(f'Error profiling event loop: {ex}')
+            await ctx.send(f'Sorry.. error while profiling: {ex}', embed=build_stacktrace_embed(ex))
+            return
+        finally:
+            DiagnosticsCog._profiling = False
+
+        logger.info(f'Finished profiling event loop. Top functions:\n{result.summary}')
+
+        summary = result.summary if len(result.summary) < 1800 else f'{result.summary[:1800]}\n...'
+        profile_file = discord.File(io.BytesIO(result.data), filename=result.filename)
+
+        target = await self._admin_channel(ctx)
+        await target.send(f'Profile of the last {result.seconds:.0f} seconds (`{result.mode}`) requested by {ctx.author.name}:```\n{summary}\n```',
+                          file=profile_file)
@@ -3,6 +3,7 @@ from __future__ import annotations
 import discord
 import logging
 import humanize
+import time
 
 import discord.ext.menus as menus  # type: ignore
 
@@ -16,7 +17,9 @@ from minder.bot.menus import ConfirmMenu
 from minder.cogs.base import BaseCog
 from minder.common import ChannelType
 from minder.errors import build_stacktrace_embed
+from minder.metrics import REMINDER_FIRE_LATENESS, REMINDERS_FIRED
 from minder.models import Reminder
+from minder.timing import timed_phase
 from minder.utils import FuzzyTimeConverter, Timezone, FuzzyTime, EMOJIS
 
 logger = logging.getLogger(__name__)
@@ -70,6 +73,9 @@ class ReminderCog(BaseCog, name='reminder'):
     async def _sync_init(self) -> None:
         logger.info('Starting scheduler in Reminder cog and processing and pending Reminders')
 
+        num_indexed = Reminder.rebuild_indexes(self.bot.redis_helper)
+        logger.info(f'Indexed #{num_indexed} stored reminders by trigger time')
+
         await self._process_reminders()
 
     async def _process_reminders(self) -> None:
@@ -111,12 +117,15 @@ class ReminderCog(BaseCog, name='reminder'):
         try:
             await msg_target.send(msg_out)
         except Exception as ex:
+            REMINDERS_FIRED.inc(status='error')
             logger.error(f'Error sending reminder to "{msg_target}": {ex}')
             logger.debug(f'Dumped reminder:\n{reminder.dump()}')
             return False
         else:
+            REMINDERS_FIRED.inc(status='ok')
+            REMINDER_FIRE_LATENESS.observe(max(0.0, time.time() - reminder.trigger_ts))
             reminder.user_notified = True
-            reminder.store(self.bot.redis_helper)
+            reminder.store(self.bot.redis_helper, event_action='fire')
             logger.info(f'Successfully marked reminder for "{reminder.member_name}" complete')
 
         logger.info('Finished scheduled reminder check.')
@@ -153,8 +162,9 @@ class ReminderCog(BaseCog, name='reminder'):
         reminders = self._get_reminders(include_complete=include_complete)
         all_rem = '**ALL** reminders' if not include_complete else 'pending reminders'
         msg_out = f'Found #{len(reminders)} {all_rem}:'
-        for rem in reminders:
-            msg_out += f'\n{rem.as_markdown(ctx.author, ctx.channel)}'
+        with timed_phase('render'):
+            for rem in reminders:
+                msg_out += f'\n{rem.as_markdown(ctx.author, ctx.channel)}'
 
         await ctx.send(msg_out)
 
@@ -176,7 +186,7 @@ class ReminderCog(BaseCog, name='reminder'):
         fuzzy_when = FuzzyTime.build(provided_when=when, use_timezone=user_tz)
         reminder = Reminder.build(fuzzy_when, member=ctx.author, channel=ctx.channel, content=content)  # type: ignore[arg-type]
 
-        reminder.store(self.bot.redis_helper)
+        reminder.store(self.bot.redis_helper, event_action='create')
         reminder_md = cast(discord.Embed, reminder.as_markdown(ctx.author, as_embed=True))  # type: ignore[arg-type]
         logger.info(f'Successfully created a new reminder for "{ctx.author.name}" via slash command')
         logger.debug(f'Slash Command Reminder Reminder:\n{reminder.dump()}')
@@ -212,8 +222,9 @@ class ReminderCog(BaseCog, name='reminder'):
         author_name = ctx.author.mention if isinstance(ctx.channel, discord.channel.TextChannel) else ctx.author.name
 
         msg_out = f'Hey {author_name}, found #{len(reminders)} pending reminders:'
-        for rem in reminders:
-            msg_out += f'\n{rem.as_markdown(ctx.author, ctx.channel)}'  # type: ignore[arg-type]
+        with timed_phase('render'):
+            for rem in reminders:
+                msg_out += f'\n{rem.as_markdown(ctx.author, ctx.channel)}'  # type: ignore[arg-type]
 
         await ctx.send(msg_out)
 
@@ -223,8 +234,9 @@ class ReminderCog(BaseCog, name='reminder'):
         reminders = self._get_reminders(include_complete=True)
 
         msg_out = f'Hey {ctx.author.mention}, found #{len(reminders)} reminders (**ALL** reminders):'
-        for rem in reminders:
-            msg_out += f'\n{rem.as_markdown(ctx.author, ctx.channel)}'  # type: ignore[arg-type]
+        with timed_phase('render'):
+            for rem in reminders:
+                msg_out += f'\n{rem.as_markdown(ctx.author, ctx.channel)}'  # type: ignore[arg-type]
 
         await ctx.send(msg_out)
 
@@ -251,7 +263,7 @@ class ReminderCog(BaseCog, name='reminder'):
         dt_now = datetime.now()
         reminder = Reminder.build(fuzzy_when, member=ctx.author, channel=ctx.channel, content=content)  # type: ignore[arg-type]
 
-        reminder.store(self.bot.redis_helper)
+        reminder.store(self.bot.redis_helper, event_action='create')
         reminder_md = cast(discord.Embed, reminder.as_markdown(ctx.author, ctx.channel, as_embed=True))  # type: ignore[arg-type]
         logger.info(f'Successfully created a new reminder for "{ctx.author.name}"')
         logger.debug(f'Reminder:\n{reminder.dump()}')
@@ -291,9 +303,8 @@ class ReminderCog(BaseCog, name='reminder'):
                     logger.info(f'Skipping pending reminder for "{rem.redis_name}" since no member was passed to "reminders clean" command')
                     continue
 
-                logger.debug(f'Running hdel() on "{rem.redis_name}" for "{rem.member_name}"')
-                with self.bot.redis_helper.wrapped_redis(f'hdel("reminders", "{rem.redis_name}")') as r_conn:
-                    r_conn.hdel('reminders', rem.redis_name)
+                logger.debug(f'Deleting "{rem.redis_name}" for "{rem.member_name}"')
+                rem.delete(self.bot.redis_helper)
 
                 sched_job = self.bot.scheduler.get_job(rem.redis_name)
                 if sched_job:
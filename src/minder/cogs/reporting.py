@@ -1,9 +1,60 @@
+from __future__ import annotations
+
+import discord
 import logging
 
+from datetime import datetime
+from discord.ext import commands
+
 from minder.cogs.base import BaseCog
+from minder.models import ActivityCounters, ActivityResolutions, StatusEntryActions
 
 logger = logging.getLogger(__name__)
 
 
 class ReportingCog(BaseCog, name='reporting'):
-    pass
+    async def _send_activity(self, ctx: commands.Context, scope: str, scope_id: int, scope_name: str, resolution: str, num_buckets: int) -> None:
+        if resolution not in ActivityResolutions:
+            await ctx.send(f'Sorry {ctx.author.mention}, `{resolution}` is not a valid resolution. Must be one of: `{", ".join(ActivityResolutions)}`')
+            return
+
+        num_buckets = max(1, min(num_buckets, 48))
+
+        totals = ActivityCounters.totals(self.bot.redis_helper, StatusEntryActions, resolution=resolution, scope=scope, scope_id=scope_id,
+                                         num_buckets=num_buckets)
+        buckets = ActivityCounters.read(self.bot.redis_helper, resolution=resolution, scope=scope, scope_id=scope_id, num_buckets=num_buckets)
+
+        msg_out = f'Activity for {scope_name} over the last #{num_buckets} `{resolution}` buckets:'
+        msg_out += ''.join([f'\n> **{action}**: `{cnt}`' for action, cnt in totals.items() if cnt])
+
+        if not any(totals.values()):
+            msg_out += '\n> No activity recorded'
+
+        bucket_lines = '\n'.join([f'{datetime.fromtimestamp(bucket_ts).ctime()}  {cnt:>6}' for bucket_ts, cnt in buckets])
+        await ctx.send(f'{msg_out}\n```\n{bucket_lines}\n```')
+
+    @commands.guild_only()
+    @commands.group(name='report')
+    async def report(self, ctx: commands.Context) -> None:
+        if not await self.check_ready_or_fail(ctx):
+            return
+
+        if ctx.invoked_subcommand:
+            return
+
+        await self.report_activity(ctx)
+
+    @commands.guild_only()
+    @report.command(name='activity')
+    async def report_activity(self, ctx: commands.Context, resolution: str = 'hour', num_buckets: int = 12) -> None:
+        await self._send_activity(ctx, 'guild', ctx.guild.id, f'"{ctx.guild.name}"', resolution, num_buckets)
+
+    @commands.guild_only()
+    @report.command(name='member')
+    async def report_member(self, ctx: commands.Context, member: discord.Member, resolution: str = 'day', num_buckets: int = 7) -> None:
+        await self._send_activity(ctx, 'member', member.id, f'"{member.display_name}"', resolution, num_buckets)
+
+    @commands.guild_only()
+    @report.command(name='channel')
+    async def report_channel(self, ctx: commands.Context, channel: discord.TextChannel, resolution: str = 'day', num_buckets: int = 7) -> None:
+        await self._send_activity(ctx, 'channel', channel.id, channel.mention, resolution, num_buckets)
@@ -4,10 +4,12 @@ import discord
 import logging
 
 from discord.ext import commands
+from typing import Any, Mapping
 
-from minder.common import DiscordMember, DiscordChannel
+from minder.bot.checks import is_admin
+from minder.common import DiscordMember, DiscordChannel, rehydrate_context
 from minder.cogs.base import BaseCog
-from minder.models.status import StatusEntry
+from minder.models.status import StatusEntry, StatusEntryActions
 
 from minder.bot.menus import ConfirmMenu
 
@@ -20,18 +22,62 @@ class StatusCog(BaseCog, name='status'):
         logger.info(f'User joined: {member.name} on {member.guild.name}')
         mem = DiscordMember.from_model(member)
         guild_id, guild_name = member.guild.id, member.guild.name
-        join_ctx = {'member': mem, 'guild_name': guild_name, 'guild_id': guild_id}
+        join_ctx = {'member': mem.to_wire(), 'guild_name': guild_name, 'guild_id': guild_id}
         ent = StatusEntry.build('JOIN', f'Member "{member.name}" joined "{member.guild.name}"', context=join_ctx)
         ent.store(self.bot.redis_helper)
 
-    @BaseCog.listener()
-    async def on_message_delete(self, message: discord.Message) -> None:
+    def _channel_context(self, channel_id: int, guild_id: int = None) -> Mapping[str, Any]:
+        chan = DiscordChannel.from_model(self.bot.get_channel(channel_id))
+
+        if chan:
+            return chan.to_wire()
+
+        # Channel is not in the bot cache, record what is known from the raw event
+        return DiscordChannel(id=channel_id, name=str(channel_id), guild_id=guild_id).to_wire()
+
+    def _message_context(self, message: discord.Message) -> Mapping[str, Any]:
         mem = DiscordMember.from_model(message.author)
-        chan = DiscordChannel.from_model(message.channel)
+        return {'id': message.id, 'member': mem.to_wire() if mem else None, 'content': message.content}
+
+    @BaseCog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        """
+        Record single message deletions, including messages which are not in the bot message cache
+        """
+
+        chan_ctx = self._channel_context(payload.channel_id, guild_id=payload.guild_id)
+        del_ctx = {'channel': chan_ctx, 'guild_id': payload.guild_id, 'message_id': payload.message_id}
+        msg = payload.cached_message
+
+        if msg:
+            msg_ctx = self._message_context(msg)
+            del_ctx.update({'member': msg_ctx['member'], 'content': msg_ctx['content']})
+            mem_name = msg_ctx['member']['name'] if msg_ctx['member'] else 'Unknown'
+            logger.info(f'Message deleted from "{chan_ctx["name"]}".\n-> Old content: "{msg.content}"')
+            ent_message = f'Message deleted from "{chan_ctx["name"]}" by "{mem_name}"'
+        else:
+            logger.info(f'Uncached message ID {payload.message_id} deleted from "{chan_ctx["name"]}"')
+            ent_message = f'Uncached message deleted from "{chan_ctx["name"]}"'
 
-        logger.info(f'Message deleted from "{chan.name}".\n-> Old content: "{message.content}"')
-        del_ctx = {'member': mem, 'channel': chan, 'content': message.content}
-        ent = StatusEntry.build('DELETE', f'Message deleted from "{chan.name}" by "{mem.name}"', context=del_ctx)
+        ent = StatusEntry.build('DELETE', ent_message, context=del_ctx)
+        ent.store(self.bot.redis_helper)
+
+    @BaseCog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        """
+        Record a bulk deletion (i.e. a moderator purge) as a single status entry
+
+        The entry holds every deleted message ID along with the author and content of those found in the bot message cache
+        so that a purge of hundreds of messages costs one log line and one pipelined Redis write.
+        """
+
+        chan_ctx = self._channel_context(payload.channel_id, guild_id=payload.guild_id)
+        cached_msgs = [self._message_context(msg) for msg in payload.cached_messages]
+        msg_ids = sorted(payload.message_ids)
+
+        logger.info(f'Purge of #{len(msg_ids)} messages from "{chan_ctx["name"]}" (#{len(cached_msgs)} cached)')
+        purge_ctx = {'channel': chan_ctx, 'guild_id': payload.guild_id, 'message_ids': msg_ids, 'messages': cached_msgs, 'count': len(msg_ids)}
+        ent = StatusEntry.build('PURGE', f'Purged #{len(msg_ids)} messages from "{chan_ctx["name"]}"', context=purge_ctx)
         ent.store(self.bot.redis_helper)
 
     @BaseCog.listener()
@@ -40,10 +86,57 @@ class StatusCog(BaseCog, name='status'):
         chan = DiscordChannel.from_model(after.channel)
 
         logger.info(f'Message updated in "{chan.name}" by "{mem.name}".\n-> Old content: "{before.content}"\n-> New content: "{after.content}"')
-        edit_ctx = {'member': mem, 'channel': chan, 'before': before.content, 'after': after.content}
+        edit_ctx = {'member': mem.to_wire(), 'channel': chan.to_wire(), 'before': before.content, 'after': after.content,
+                    'guild_id': after.guild.id if after.guild else None}
         ent = StatusEntry.build('EDIT', f'Message edited in "{chan.name}" by "{mem.name}"', context=edit_ctx)
         ent.store(self.bot.redis_helper)
 
+    @commands.guild_only()
+    @commands.group(name='status')
+    async def status(self, ctx: commands.Context) -> None:
+        if not await self.check_ready_or_fail(ctx):
+            return
+
+        if ctx.invoked_subcommand:
+            return
+
+        await self.status_history(ctx)
+
+    @commands.guild_only()
+    @status.command(name='history')
+    async def status_history(self, ctx: commands.Context, action: str = None, limit: int = 10) -> None:
+        if action and action.upper() not in StatusEntryActions:
+            await ctx.send(f'Sorry {ctx.author.mention}, `{action}` is not a valid action. Must be one of: `{", ".join(StatusEntryActions)}`')
+            return
+
+        limit = max(1, min(limit, 25))
+        entries = StatusEntry.query(self.bot.redis_helper, action=action, guild_id=ctx.guild.id, limit=limit)
+
+        if not entries:
+            await ctx.send(f'Sorry {ctx.author.mention}, no matching status entries found for this server')
+            return
+
+        action_out = f'`{action.upper()}` ' if action else ''
+        msg_out = f'Hey {ctx.author.mention}, found #{len(entries)} recent {action_out}status entries (newest first):'
+
+        for ent in entries:
+            msg_out += f'\n> `{ent.timestamp.ctime()}` **{ent.action}**: {ent.message}'
+
+            # Member references are only resolved against the bot cache here, when actually displayed
+            ent_mem = rehydrate_context(ent.context, bot=self.bot).get('member', None)
+            if isinstance(ent_mem, DiscordMember):
+                msg_out += f' ({ent_mem.mention})'
+
+        # Only the requester is pinged. Members of the listed entries are shown as mentions without notifying them
+        await ctx.send(msg_out, allowed_mentions=discord.AllowedMentions(everyone=False, users=[ctx.author], roles=False))
+
+    @commands.check_any(commands.is_owner(), is_admin())
+    @status.command(name='reindex')
+    async def status_reindex(self, ctx: commands.Context) -> None:
+        cnt = StatusEntry.rebuild_indexes(self.bot.redis_helper)
+        logger.info(f'Rebuilt status indexes for #{cnt} entries as requested by "{ctx.author.name}"')
+        await ctx.send(f'Rebuilt status indexes for #{cnt} entries :thumbsup:')
+
     @commands.command(name='prompt-me')
     async def prompt_me(self, ctx: commands.Context, prompt_with: str) -> None:
         confirm = await ConfirmMenu(f'Are you sure about this {ctx.author.mention}?```\n{prompt_with}\n```').prompt(ctx)
@@ -32,26 +32,83 @@ class DiscordMember:
     id: int = field()
     name: str = field()
 
+    guild_id: Optional[int] = field(default=None)
+
     _guild: InitVar[discord.Guild] = field(default=None)
     _member: InitVar[MemberType] = field(default=None)
 
+    def __post_init__(self, _guild: discord.Guild = None, _member: MemberType = None) -> None:
+        # Live references are kept on the instance (rather than as fields) so they are never serialized
+        self._guild_ref = _guild
+        self._member_ref = _member
+        self._bot = None
+
+        if not self.guild_id:
+            guild = self.guild
+            self.guild_id = guild.id if guild else None
+
+    def __getstate__(self) -> Mapping[str, Any]:
+        return {'id': self.id, 'name': self.name, 'guild_id': self.guild_id}
+
+    def __setstate__(self, state: Mapping[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._guild_ref, self._member_ref, self._bot = None, None, None
+
     @property
     def mention(self):
-        return str(self._member.mention) if self._member else self.name
+        member = self.member
+        return str(member.mention) if member else self.name
 
     @property
     def guild(self) -> Optional[discord.Guild]:
-        if self._guild:
-            return self._guild
+        guild_ref = getattr(self, '_guild_ref', None)
+        if guild_ref:
+            return guild_ref
 
-        if not self._member or not isinstance(self._member, discord.Member):
-            return None
+        member_ref = getattr(self, '_member_ref', None)
+        if member_ref and isinstance(member_ref, discord.Member):
+            return member_ref.guild
+
+        bot = getattr(self, '_bot', None)
+        if bot and self.guild_id:
+            self._guild_ref = bot.get_guild(self.guild_id)
+            return self._guild_ref
 
-        return self._member.guild
+        return None
 
     @property
     def member(self) -> Optional[MemberType]:
-        return self._member
+        member_ref = getattr(self, '_member_ref', None)
+        if member_ref:
+            return member_ref
+
+        bot = getattr(self, '_bot', None)
+        if not bot:
+            return None
+
+        guild = self.guild
+        self._member_ref = guild.get_member(self.id) if guild else bot.get_user(self.id)
+        return self._member_ref
+
+    def to_wire(self) -> Mapping[str, Any]:
+        """
+        Returns the compact, ID-based form of this member for storing in Redis (see :py:func:`from_wire`)
+        """
+
+        return {'kind': 'member', 'id': self.id, 'name': self.name, 'guild_id': self.guild_id}
+
+    @classmethod
+    def from_wire(cls, data: Mapping[str, Any], bot: commands.Bot = None) -> DiscordMember:
+        """
+        Build a member from the compact form returned by :py:func:`to_wire`
+
+        If ``bot`` is provided, the ``discord.Member`` and ``discord.Guild`` references are resolved lazily from the bot
+        cache the first time they are used (i.e. by :py:attr:`mention`).
+        """
+
+        mem = cls(id=int(data['id']), name=data['name'], guild_id=data.get('guild_id', None))
+        mem._bot = bot
+        return mem
 
     @classmethod
     def from_model(cls, member_or_user: discord.abc.Messageable) -> Optional[DiscordMember]:
@@ -59,7 +116,8 @@ class DiscordMember:
             return None
 
         guild = member_or_user.guild if isinstance(member_or_user, discord.Member) else None
-        return DiscordMember(id=member_or_user.id, name=member_or_user.name, _guild=guild, _member=member_or_user)
+        return DiscordMember(id=member_or_user.id, name=member_or_user.name, guild_id=guild.id if guild else None, _guild=guild,
+                             _member=member_or_user)
 
     @classmethod
     def build(cls, id: int, name: str, context_or_guild: ContextOrGuildType = None) -> DiscordMember:
@@ -67,11 +125,9 @@ class DiscordMember:
             return DiscordMember(id=id, name=name)
 
         member = cls.resolve(id, context_or_guild)
+        guild = context_or_guild.guild if isinstance(context_or_guild, commands.Context) else context_or_guild
 
-        if isinstance(context_or_guild, commands.Context):
-            guild = context_or_guild.guild
-
-        return DiscordMember(id=id, name=name, _guild=guild, _member=member)
+        return DiscordMember(id=id, name=name, guild_id=guild.id if guild else None, _guild=guild, _member=member)
 
     @staticmethod
     def resolve(id: int, guild: Optional[ContextOrGuildType]) -> Optional[discord.Member]:
@@ -98,30 +154,86 @@ class DiscordChannel:
     id: int = field()
     name: str = field()
 
-    is_dm: Optional[bool] = field(default=None, init=False)
+    is_dm: Optional[bool] = field(default=None)
+    guild_id: Optional[int] = field(default=None)
+
     _guild: InitVar[discord.Guild] = field(default=None)
     _channel: InitVar[ChannelType] = field(default=None)
 
+    def __post_init__(self, _guild: discord.Guild = None, _channel: ChannelType = None) -> None:
+        # Live references are kept on the instance (rather than as fields) so they are never serialized
+        self._guild_ref = _guild
+        self._channel_ref = _channel
+        self._bot = None
+
+        if not self.guild_id:
+            guild = self.guild
+            self.guild_id = guild.id if guild else None
+
+    def __getstate__(self) -> Mapping[str, Any]:
+        return {'id': self.id, 'name': self.name, 'is_dm': self.is_dm, 'guild_id': self.guild_id}
+
+    def __setstate__(self, state: Mapping[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._guild_ref, self._channel_ref, self._bot = None, None, None
+
     @property
     def mention(self) -> str:
-        if not self._channel or not isinstance(self._channel, discord.TextChannel):
+        channel = self.channel
+        if not channel or not isinstance(channel, discord.TextChannel):
             return self.name
 
-        return self._channel.mention
+        return channel.mention
 
     @property
     def guild(self) -> Optional[discord.Guild]:
-        if self._guild:
-            return self._guild
+        guild_ref = getattr(self, '_guild_ref', None)
+        if guild_ref:
+            return guild_ref
 
-        if self._channel and not isinstance(self._channel, discord.DMChannel):
-            return self._channel.guild
+        channel_ref = getattr(self, '_channel_ref', None)
+        if channel_ref and not isinstance(channel_ref, discord.DMChannel):
+            return channel_ref.guild
+
+        bot = getattr(self, '_bot', None)
+        if bot and self.guild_id:
+            self._guild_ref = bot.get_guild(self.guild_id)
+            return self._guild_ref
 
         return None
 
     @property
     def channel(self) -> Optional[ChannelType]:
-        return self._channel
+        channel_ref = getattr(self, '_channel_ref', None)
+        if channel_ref:
+            return channel_ref
+
+        bot = getattr(self, '_bot', None)
+        if not bot:
+            return None
+
+        self._channel_ref = bot.get_channel(self.id)
+        return self._channel_ref
+
+    def to_wire(self) -> Mapping[str, Any]:
+        """
+        Returns the compact, ID-based form of this channel for storing in Redis (see :py:func:`from_wire`)
+        """
+
+        return {'kind': 'channel', 'id': self.id, 'name': self.name, 'is_dm': self.is_dm, 'guild_id': self.guild_id}
+
+    @classmethod
+    def from_wire(cls, data: Mapping[str, Any], bot: commands.Bot = None) -> DiscordChannel:
+        """
+        Build a channel from the compact form returned by :py:func:`to_wire`
+
+        If ``bot`` is provided, the ``discord.TextChannel`` and ``discord.Guild`` references are resolved lazily from the
+        bot cache the first time they are used (i.e. by :py:attr:`mention`).
+        """
+
+        chan = cls(id=int(data['id']), name=data['name'], is_dm=data.get('is_dm', None), guild_id=data.get('guild_id', None))
+        chan._bot = bot
+        return chan
 
     @classmethod
     def from_model(cls, channel_or_dm: ChannelType) -> Optional[DiscordChannel]:
@@ -130,7 +242,9 @@ class DiscordChannel:
 
         guild = channel_or_dm.guild if isinstance(channel_or_dm, discord.TextChannel) else None
         chan_name = channel_or_dm.recipient.name if isinstance(channel_or_dm, discord.DMChannel) else channel_or_dm.name
-        return DiscordChannel(id=channel_or_dm.id, name=chan_name, _guild=guild, _channel=channel_or_dm)
+        is_dm = isinstance(channel_or_dm, discord.DMChannel)
+        return DiscordChannel(id=channel_or_dm.id, name=chan_name, is_dm=is_dm, guild_id=guild.id if guild else None, _guild=guild,
+                              _channel=channel_or_dm)
 
     @classmethod
     def build(cls, id: int, name: str, is_dm: bool = None, context_or_guild: ContextOrGuildType = None) -> DiscordChannel:
@@ -174,3 +288,24 @@ class DiscordChannel:
             channel = None
 
         return channel
+
+
+def rehydrate_context(context: Mapping[str, Any], bot: commands.Bot = None) -> Mapping[str, Any]:
+    """
+    Convert the compact member and channel entries of a stored event context back into :py:class:`DiscordMember` and
+    :py:class:`DiscordChannel` instances
+
+    The Discord models are not looked up here. Each rehydrated entry resolves them from the ``bot`` cache only when they
+    are first used (i.e. when displaying a mention).
+    """
+
+    wire_types = {'member': DiscordMember, 'channel': DiscordChannel}
+    rehydrated = {}
+
+    for ctx_name, ctx_val in context.items():
+        if isinstance(ctx_val, Mapping) and ctx_val.get('kind', None) in wire_types:
+            ctx_val = wire_types[ctx_val['kind']].from_wire(ctx_val, bot=bot)
+
+        rehydrated[ctx_name] = ctx_val
+
+    return rehydrated
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import logging
+import zlib
+
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content types worth compressing. Anything else (i.e. images or already compressed downloads) is sent as-is
+COMPRESSIBLE_TYPES = ['application/json', 'application/javascript', 'application/xml', 'text/html', 'text/css', 'text/plain', 'text/csv',
+                      'text/javascript', 'text/xml', 'image/svg+xml']
+
+# Responses with these status codes never have a body to compress
+NO_BODY_STATUS = [204, 304]
+
+# Range of levels supported by each encoding. The configured level is clamped to the range of the negotiated encoding
+LEVEL_RANGES = {'zstd': (1, 22), 'br': (0, 11), 'gzip': (1, 9)}
+
+
+def available_encodings() -> List[str]:
+    """
+    Returns the supported content encodings, from most to least preferred
+    """
+
+    encodings = []
+
+    if zstandard:
+        encodings.append('zstd')
+
+    if brotli:
+        encodings.append('br')
+
+    encodings.append('gzip')
+    return encodings
+
+
+SUPPORTED_ENCODINGS = available_encodings()
+
+
+def negotiate_encoding(accept_encoding: Optional[str], encodings: Iterable[str] = None) -> Optional[str]:
+    """
+    Choose the content encoding for a response based on the request "Accept-Encoding" header
+
+    Encodings with the highest quality value are used, with ties going to the most preferred encoding (see
+    :py:func:`available_encodings`). Returns ``None`` if the client does not accept any supported encoding.
+    """
+
+    if not accept_encoding:
+        return None
+
+    encodings = list(encodings or SUPPORTED_ENCODINGS)
+    accepted = {}
+
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+
+        accepted[coding.strip()] = quality
+
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+
+    for coding in encodings:
+        quality = accepted.get(coding, wildcard)
+
+        if quality > best_quality:
+            best, best_quality = coding, quality
+
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+
+    return content_type.split(';', 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def weak_etag(etag: str) -> str:
+    """
+    Returns ``etag`` as a weak entity tag since a compressed representation is not byte-for-byte identical to the original
+    """
+
+    return etag if etag.startswith('W/') else f'W/{etag}'
+
+
+class StreamCompressor:
+    """
+    Incremental compressor for a single response body in the negotiated content encoding
+
+    Chunks passed to :py:meth:`compress` may be buffered by the underlying compressor. :py:meth:`finish` must be called once
+    after the last chunk to get the remaining data.
+    """
+
+    encoding: str
+    level: int
+
+    def __init__(self, encoding: str, level: int = 6) -> None:
+        min_level, max_level = LEVEL_RANGES[encoding]
+
+        self.encoding = encoding
+        self.level = max(min_level, min(max_level, int(level)))
+
+        if encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=self.level)
+        else:
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'zstd':
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+        if self.encoding == 'br':
+            return self._compressor.finish()
+
+        return self._compressor.flush()
+
+
+def compress_body(data: bytes, encoding: str, level: int = 6) -> bytes:
+    compressor = StreamCompressor(encoding, level=level)
+    return compressor.compress(data) + compressor.finish()
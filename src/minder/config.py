@@ -62,6 +62,19 @@ class Config:
     ENABLE_BOT_JSONAPI: bool = _load_from_environ('ENABLE_BOT_JSONAPI', True)
     BOT_WEB_HOST: str = _load_from_environ('BOT_WEB_HOST', _load_from_environ('FLASK_HOST', None))
     BOT_WEB_PORT: int = _load_from_environ('BOT_WEB_PORT', 9091)
+    API_CACHE_SIZE: int = _load_from_environ('API_CACHE_SIZE', 256)
+    IDENTITY_CACHE_SIZE: int = _load_from_environ('IDENTITY_CACHE_SIZE', 128)
+    IDENTITY_CACHE_TTL: int = _load_from_environ('IDENTITY_CACHE_TTL', 300)
+    IDEMPOTENCY_TTL: int = _load_from_environ('IDEMPOTENCY_TTL', 86400)
+    EVENT_KEEPALIVE: int = _load_from_environ('EVENT_KEEPALIVE', 15)
+    COMPRESS_ENABLE: bool = _load_from_environ('COMPRESS_ENABLE', True)
+    COMPRESS_MIN_SIZE: int = _load_from_environ('COMPRESS_MIN_SIZE', 500)
+    COMPRESS_LEVEL: int = _load_from_environ('COMPRESS_LEVEL', 6)
+    METRICS_ENABLE: bool = _load_from_environ('METRICS_ENABLE', True)
+    SLOW_COMMAND_THRESHOLD: float = _load_from_environ('SLOW_COMMAND_THRESHOLD', 2.0)
+    PROFILE_MAX_SECONDS: int = _load_from_environ('PROFILE_MAX_SECONDS', 300)
+    LOOP_WATCHDOG_ENABLE: bool = _load_from_environ('LOOP_WATCHDOG_ENABLE', True)
+    LOOP_LAG_THRESHOLD: float = _load_from_environ('LOOP_LAG_THRESHOLD', 0.25)
     SSL_ENABLE: bool = _load_from_environ('SSL_ENABLE', False)
     SSL_CAFILE: str = _load_from_environ('SSL_CAFILE', None)
     SSL_CERT: str = _load_from_environ('SSL_CERT', None)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import uuid
+
+from datetime import date, datetime, time, tzinfo
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Mapping, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.debug('Cannot find orjson package, using built in json module for encoding')
+
+JSON_BACKEND = 'orjson' if orjson else 'json'
+
+
+@lru_cache(maxsize=None)
+def _dataclass_field_names(cls: type) -> Tuple[str, ...]:
+    return tuple(fld.name for fld in dataclasses.fields(cls))
+
+
+def default(obj: Any) -> Any:
+    """
+    Convert ``obj`` into something which can be encoded as JSON
+
+    Used for any types which are not natively supported by the encoder. Dataclasses (including Redis entries) are encoded
+    directly from their fields so there is no need to build an intermediate dictionary with ``as_dict()`` first. Dates and
+    times are encoded in ISO 8601 format and timezones by name.
+
+    :raises TypeError: if ``obj`` cannot be encoded
+    """
+
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {name: getattr(obj, name) for name in _dataclass_field_names(type(obj))}
+
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+
+    if isinstance(obj, tzinfo):
+        return str(obj)
+
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+
+    if isinstance(obj, Mapping):
+        return dict(obj)
+
+    if isinstance(obj, (Decimal, uuid.UUID)):
+        return str(obj)
+
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+
+    raise TypeError(f'Object of type "{type(obj).__name__}" is not JSON serializable')
+
+
+def dumps_bytes(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Encode ``obj`` as UTF-8 JSON using orjson (if installed) or the built in json module
+
+    :param obj: the value to encode
+    :param indent: pretty-print the result with an indent of two spaces
+    :param sort_keys: sort the keys of objects
+    """
+
+    if orjson:
+        # Allow non-string keys (i.e. member IDs) as the built in json module does
+        option = orjson.OPT_NON_STR_KEYS
+
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        return orjson.dumps(obj, default=default, option=option)
+
+    return dumps(obj, indent=indent, sort_keys=sort_keys).encode('utf-8')
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    """
+    Encode ``obj`` as JSON, returning a string (see :py:func:`dumps_bytes`)
+    """
+
+    if orjson:
+        return dumps_bytes(obj, indent=indent, sort_keys=sort_keys).decode('utf-8')
+
+    separators = None if indent else (',', ':')
+    return json.dumps(obj, default=default, indent=2 if indent else None, sort_keys=sort_keys, separators=separators, ensure_ascii=False)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    if orjson:
+        return orjson.loads(data)
+
+    return json.loads(data)
@@ -107,3 +107,19 @@ class MinderBotError(MinderError):
 
     def __sub_repr__(self) -> str:
         return f'context="{self.context}"'
+
+
+class IdempotencyError(MinderError):
+    """
+    Exception class for requests that reuse an idempotency key while the original request is still running or with a
+    different request body
+    """
+
+    status_code: int
+
+    def __init__(self, message: str, status_code: int = 409, base_exception: Exception = None) -> None:
+        super().__init__(message, base_exception=base_exception)
+        self.status_code = status_code
+
+    def __sub_repr__(self) -> str:
+        return f'status_code={self.status_code}'
@@ -0,0 +1,23 @@
+"""
+gunicorn configuration for running the minder web application in preload mode
+
+Use with: ``gunicorn -c python:minder.gunicorn_conf``
+
+The application is built once in the gunicorn master (running the schema check a single time) and each worker resets its
+database and Redis connection pools after being forked so no sockets are shared between workers.
+"""
+
+import os
+
+from minder.web.app import reset_after_fork
+
+wsgi_app = 'minder.web.app:create_app(preload=True)'
+preload_app = True
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:80')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+
+
+def post_fork(server, worker):
+    reset_after_fork()
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format rendered by :py:meth:`MetricsRegistry.render`
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Default histogram buckets (in seconds), suitable for request and Redis latencies
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets (in seconds) for how late reminders are delivered compared to their trigger time
+LATENESS_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+# Buckets (in seconds) for event loop scheduling lag
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Mapping[str, str], float]
+
+_op_name_re = re.compile(r'^\s*([A-Za-z_][\w.]*)')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+
+    if math.isnan(value):
+        return 'NaN'
+
+    return repr(float(value))
+
+
+def _format_labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + '}'
+
+
+class Metric:
+    """
+    Base class for a named metric with an optional set of labels
+
+    Values are tracked per combination of label values, passed as keyword arguments (i.e. ``metric.inc(route='/')``).
+    Missing labels are recorded as an empty string. All methods are thread-safe.
+    """
+
+    kind: str = 'untyped'
+
+    name: str
+    documentation: str
+    labelnames: Tuple[str, ...]
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional[MetricsRegistry] = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, Any] = {}
+        self._function: Optional[Callable[[], Union[float, Mapping[LabelValues, float]]]] = None
+
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Mapping[str, Any]) -> LabelValues:
+        unknown = set(labels) - set(self.labelnames)
+
+        if unknown:
+            raise ValueError(f'Unknown labels for metric "{self.name}": {", ".join(sorted(unknown))}')
+
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def set_function(self, func: Callable[[], Union[float, Mapping[LabelValues, float]]]) -> None:
+        """
+        Read the value of this metric from ``func`` whenever it is collected rather than tracking it directly
+
+        ``func`` returns either a single value or, for labelled metrics, a mapping of label values (in ``labelnames`` order)
+        to the value for those labels.
+        """
+
+        self._function = func
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def _labelled(self, key: LabelValues, extra: Mapping[str, str] = None) -> Dict[str, str]:
+        labels = dict(zip(self.labelnames, key))
+
+        if extra:
+            labels.update(extra)
+
+        return labels
+
+    def _function_samples(self) -> List[Sample]:
+        try:
+            result = self._function()
+        except Exception as ex:
+            logger.warning(f'Error collecting value for metric "{self.name}": {ex}')
+            return []
+
+        if isinstance(result, Mapping):
+            return [(self.name, self._labelled(tuple(str(val) for val in key)), float(value)) for key, value in result.items()]
+
+        return [(self.name, {}, float(result))]
+
+    def samples(self) -> List[Sample]:
+        if self._function is not None:
+            return self._function_samples()
+
+        with self._lock:
+            return [(self.name, self._labelled(key), float(value)) for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{_format_labels(labels)} {_format_value(value)}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count (i.e. requests handled or errors raised)
+    """
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if amount < 0:
+            raise ValueError(f'Counter "{self.name}" can only be increased')
+
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Metric):
+    """
+    Value which can go up and down (i.e. queue depth or cache size)
+    """
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values (i.e. latencies in seconds) counted in cumulative buckets
+    """
+
+    kind = 'histogram'
+
+    buckets: Tuple[float, ...]
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: Optional[MetricsRegistry] = None) -> None:
+        super().__init__(name, documentation, labelnames=labelnames, registry=registry)
+
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets if not math.isinf(bucket)))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+
+        with self._lock:
+            state = self._values.get(key)
+
+            if state is None:
+                # Per-bucket (non-cumulative) counts, plus the "+Inf" bucket, then the sum of all observed values
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """
+        Context manager observing the number of seconds spent inside the context
+        """
+
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def get_count(self, **labels: Any) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    def get_sum(self, **labels: Any) -> float:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[1] if state else 0.0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in sorted(self._values.items())]
+
+        samples = []
+
+        for key, counts, total in values:
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', self._labelled(key, {'le': _format_value(bound)}), cumulative))
+
+            samples.append((f'{self.name}_sum', self._labelled(key), total))
+            samples.append((f'{self.name}_count', self._labelled(key), cumulative))
+
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together in the Prometheus text exposition format
+
+    Collectors registered with :py:meth:`add_collector` are called before rendering to refresh values that are only
+    available on demand (i.e. cache statistics).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric named "{metric.name}" is already registered')
+
+            self._metrics[metric.name] = metric
+
+        return metric
+
+    def unregister(self, metric: Metric) -> None:
+        with self._lock:
+            self._metrics.pop(metric.name, None)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> List[Metric]:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as ex:
+                logger.warning(f'Error running metrics collector "{getattr(collector, "__name__", collector)}": {ex}')
+
+        return metrics
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.collect()) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_LATENCY = Histogram('minder_http_request_duration_seconds', 'Time spent handling HTTP requests', ['server', 'method', 'route', 'status'])
+REDIS_OP_LATENCY = Histogram('minder_redis_op_duration_seconds', 'Time spent in Redis operations', ['op'])
+REDIS_OP_ERRORS = Counter('minder_redis_op_errors_total', 'Redis operations which raised an error', ['op'])
+REMINDER_FIRE_LATENESS = Histogram('minder_reminder_fire_lateness_seconds', 'Delay between the trigger time of a reminder and its delivery',
+                                   buckets=LATENESS_BUCKETS)
+REMINDERS_FIRED = Counter('minder_reminders_fired_total', 'Reminders delivered (or failed to be delivered)', ['status'])
+DELIVERY_QUEUE_DEPTH = Gauge('minder_reminder_queue_depth', 'Reminders scheduled and waiting for delivery')
+COMMAND_LATENCY = Histogram('minder_command_duration_seconds', 'Time spent running bot commands', ['command', 'kind', 'status'])
+COMMAND_ERRORS = Counter('minder_command_errors_total', 'Bot commands which failed', ['command', 'kind'])
+COMMAND_PHASE_SECONDS = Counter('minder_command_phase_seconds_total', 'Time spent by bot commands in Redis, the Discord API, rendering or other work',
+                                ['command', 'phase'])
+DISCORD_API_LATENCY = Histogram('minder_discord_api_duration_seconds', 'Time spent in Discord API requests', ['method', 'route'])
+LOOP_LAG = Histogram('minder_event_loop_lag_seconds', 'Delay in running scheduled callbacks on the bot event loop', buckets=LOOP_LAG_BUCKETS)
+LOOP_LAG_QUANTILES = Gauge('minder_event_loop_lag_quantile_seconds', 'Recent event loop lag percentiles', ['quantile'])
+LOOP_BLOCKS = Counter('minder_event_loop_blocks_total', 'Event loop stalls above the lag threshold by blocking call site', ['site'])
+CACHE_REQUESTS = Counter('minder_cache_requests_total', 'Cache lookups by result', ['cache', 'result'])
+CACHE_SIZE = Gauge('minder_cache_entries', 'Entries currently held in each cache', ['cache'])
+
+
+def op_label(op_name: Optional[str]) -> str:
+    """
+    Returns the metric label for a Redis operation name (i.e. ``'get_version'`` for ``'get_version("users")'``)
+
+    Only the leading identifier is kept so that label cardinality does not grow with the IDs embedded in operation names.
+    """
+
+    match = _op_name_re.match(op_name or '')
+    return match.group(1) if match else 'other'
@@ -1,6 +1,12 @@
+from minder.models.activity import ActivityCounters, ActivityResolutions
+from minder.models.idempotency import IdempotencyStore, IdempotentResponse
+from minder.models.ids import IdGenerator, generate_id, id_timestamp, is_legacy_id
 from minder.models.status import StatusEntryActions, StatusEntry
 from minder.models.settings import UserSettings
 from minder.models.reminders import Reminder, AnyMemberType, AnyChannelType, ChannelType, MemberType
+from minder.models.batch import ReminderBatch
 
 
-__all__ = ['StatusEntry', 'StatusEntryActions', 'UserSettings', 'Reminder', 'AnyMemberType', 'AnyChannelType', 'ChannelType', 'MemberType']
+__all__ = ['ActivityCounters', 'ActivityResolutions', 'IdempotencyStore', 'IdempotentResponse', 'IdGenerator', 'generate_id', 'id_timestamp',
+           'is_legacy_id', 'StatusEntry', 'StatusEntryActions', 'UserSettings', 'Reminder', 'ReminderBatch', 'AnyMemberType', 'AnyChannelType',
+           'ChannelType', 'MemberType']
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from datetime import datetime
+from redisent.helpers import RedisentHelper
+from typing import Mapping, List, Tuple, Optional, Iterable
+
+from minder.common import DateTimeType
+from minder.errors import MinderError
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_PREFIX = 'activity'
+ACTIVITY_SCOPES = ['all', 'guild', 'channel', 'member']
+
+# Maps each supported resolution to the bucket size and how long buckets are kept (both in seconds)
+ActivityResolutions: Mapping[str, Tuple[int, int]] = {
+    'minute': (60, 2 * 86400),
+    'hour': (3600, 31 * 86400),
+    'day': (86400, 400 * 86400)
+}
+
+
+class ActivityCounters:
+    """
+    Time-bucketed activity counters maintained incrementally as status events are stored
+
+    Each bucket is a Redis hash named ``activity:<resolution>:<bucket_ts>`` holding one counter per scope and action
+    (i.e. ``guild:<id>:EDIT``) along with a ``*`` total for each scope. Reading a time range only touches the buckets
+    in that range rather than re-scanning the stored events.
+    """
+
+    @classmethod
+    def validate(cls, resolution: str, scope: str = 'all', scope_id: int = None) -> None:
+        if resolution not in ActivityResolutions:
+            raise MinderError(f'Invalid activity resolution "{resolution}". Must be one of "{", ".join(ActivityResolutions)}"')
+
+        if scope not in ACTIVITY_SCOPES:
+            raise MinderError(f'Invalid activity scope "{scope}". Must be one of "{", ".join(ACTIVITY_SCOPES)}"')
+
+        if scope != 'all' and not scope_id:
+            raise MinderError(f'No ID provided for "{scope}" activity counters')
+
+    @classmethod
+    def bucket_start(cls, resolution: str, timestamp: DateTimeType) -> int:
+        bucket_size, _ = ActivityResolutions[resolution]
+        ts = timestamp.timestamp() if isinstance(timestamp, datetime) else float(timestamp)
+        return int(ts // bucket_size) * bucket_size
+
+    @classmethod
+    def bucket_key(cls, resolution: str, bucket_ts: int) -> str:
+        return f'{ACTIVITY_PREFIX}:{resolution}:{bucket_ts}'
+
+    @classmethod
+    def counter_name(cls, action: str = None, scope: str = 'all', scope_id: int = None) -> str:
+        scope_name = 'all' if scope == 'all' else f'{scope}:{scope_id}'
+        return f'{scope_name}:{action.upper() if action else "*"}'
+
+    @classmethod
+    def record(cls, r_conn, action: str, timestamp: DateTimeType, guild_id: int = None, channel_id: int = None, member_id: int = None,
+               amount: int = 1) -> None:
+        """
+        Queue the counter increments for a single event on the provided Redis connection or pipeline
+
+        :param r_conn: the Redis connection (generally a pipeline) to issue the increments on
+        :param action: the status action for the event
+        :param timestamp: when the event occurred
+        :param guild_id: optional guild ID the event is related to
+        :param channel_id: optional channel ID the event is related to
+        :param member_id: optional member ID the event is related to
+        :param amount: how much to increment each counter by
+        """
+
+        scopes: List[Tuple[str, Optional[int]]] = [('all', None)]
+        scopes += [(scope, scope_id) for scope, scope_id in [('guild', guild_id), ('channel', channel_id), ('member', member_id)] if scope_id]
+
+        for resolution, (_, retention) in ActivityResolutions.items():
+            bucket_key = cls.bucket_key(resolution, cls.bucket_start(resolution, timestamp))
+
+            for scope, scope_id in scopes:
+                r_conn.hincrby(bucket_key, cls.counter_name(action, scope=scope, scope_id=scope_id), amount)
+                r_conn.hincrby(bucket_key, cls.counter_name(None, scope=scope, scope_id=scope_id), amount)
+
+            r_conn.expire(bucket_key, retention)
+
+    @classmethod
+    def get_buckets(cls, resolution: str, num_buckets: int, end: DateTimeType = None) -> List[int]:
+        """
+        Returns the start timestamps for the ``num_buckets`` most recent buckets ending at ``end`` (oldest first)
+        """
+
+        bucket_size, _ = ActivityResolutions[resolution]
+        last_bucket = cls.bucket_start(resolution, end if end is not None else time.time())
+
+        return [last_bucket - (idx * bucket_size) for idx in reversed(range(num_buckets))]
+
+    @classmethod
+    def read(cls, helper: RedisentHelper, resolution: str = 'hour', scope: str = 'all', scope_id: int = None, action: str = None,
+             num_buckets: int = 24, end: DateTimeType = None) -> List[Tuple[int, int]]:
+        """
+        Read the counter for the provided scope and action across the most recent buckets
+
+        :param helper: the ``RedisentHelper`` to use for Redis
+        :param resolution: bucket resolution to read ("minute", "hour" or "day")
+        :param scope: one of "all", "guild", "channel" or "member"
+        :param scope_id: the guild, channel or member ID (required unless ``scope`` is "all")
+        :param action: optional action to read counters for. If not provided, totals for all actions are returned
+        :param num_buckets: how many buckets to read
+        :param end: optional time of the last bucket to read (default is now)
+        :returns: list of ``(bucket_ts, count)`` tuples, oldest first
+        """
+
+        cls.validate(resolution, scope=scope, scope_id=scope_id)
+
+        buckets = cls.get_buckets(resolution, num_buckets, end=end)
+        counter_name = cls.counter_name(action, scope=scope, scope_id=scope_id)
+
+        with helper.wrapped_redis(f'read_activity("{resolution}", "{counter_name}")') as r_conn:
+            pipe = r_conn.pipeline(transaction=False)
+
+            for bucket_ts in buckets:
+                pipe.hget(cls.bucket_key(resolution, bucket_ts), counter_name)
+
+            counts = pipe.execute()
+
+        return [(bucket_ts, int(cnt or 0)) for bucket_ts, cnt in zip(buckets, counts)]
+
+    @classmethod
+    def totals(cls, helper: RedisentHelper, actions: Iterable[str], resolution: str = 'hour', scope: str = 'all', scope_id: int = None,
+               num_buckets: int = 24, end: DateTimeType = None) -> Mapping[str, int]:
+        """
+        Sum counters per action across the most recent buckets
+
+        Returns a mapping of action name to the total count in the requested window.
+        """
+
+        cls.validate(resolution, scope=scope, scope_id=scope_id)
+
+        actions = [action.upper() for action in actions]
+        buckets = cls.get_buckets(resolution, num_buckets, end=end)
+        counter_names = [cls.counter_name(action, scope=scope, scope_id=scope_id) for action in actions]
+
+        with helper.wrapped_redis(f'activity_totals("{resolution}", "{scope}")') as r_conn:
+            pipe = r_conn.pipeline(transaction=False)
+
+            for bucket_ts in buckets:
+                pipe.hmget(cls.bucket_key(resolution, bucket_ts), counter_names)
+
+            bucket_counts = pipe.execute()
+
+        totals = {action: 0 for action in actions}
+
+        for counts in bucket_counts:
+            for action, cnt in zip(actions, counts):
+                totals[action] += int(cnt or 0)
+
+        return totals
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from dataclasses import dataclass, field
+from redisent.helpers import RedisentHelper
+from typing import Any, Callable, List, Mapping, MutableMapping, Optional, Tuple
+
+from minder.errors import MinderError
+from minder.models.pipeline import transaction
+from minder.models.reminders import Reminder
+from minder.utils import FuzzyTime, Timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_OPERATIONS = ['create', 'update', 'delete']
+BATCH_UPDATE_FIELDS = ['content', 'when', 'timezone', 'user_notified']
+MAX_BATCH_SIZE = 500
+
+# Optional hook for resolving a member ID to a Discord member (i.e. the bot resolving members for the aiohttp API)
+MemberResolver = Callable[[int, Optional[str]], Any]
+
+
+@dataclass
+class BatchItem:
+    """
+    A single operation within a :py:class:`ReminderBatch` along with its result
+    """
+
+    index: int
+    op: str
+    data: Mapping[str, Any]
+
+    reminder: Optional[Reminder] = None
+    error: Optional[str] = None
+
+    @property
+    def reminder_id(self) -> Optional[str]:
+        if self.reminder:
+            return self.reminder.redis_name
+
+        return str(self.data['id']) if self.data.get('id') else None
+
+    def as_dict(self) -> Mapping[str, Any]:
+        res: MutableMapping[str, Any] = {'index': self.index, 'op': self.op, 'id': self.reminder_id, 'is_error': self.error is not None}
+
+        if self.error:
+            res['error'] = self.error
+        elif self.op != 'delete' and self.reminder:
+            res['reminder'] = self.reminder.as_dict()
+
+        return res
+
+
+@dataclass
+class ReminderBatch:
+    """
+    Create, update and delete many reminders at once
+
+    Every item is validated and every "when" is resolved before anything is written. Items sharing the same "when" and
+    timezone are only parsed once. If any item is invalid, nothing is written. Otherwise all writes (including the reminder
+    version counters and indexes) are sent in a single transaction.
+
+    Each item is a mapping with an "op" of "create" (the default), "update" or "delete":
+
+    * ``create``: requires "when", "content", "member_id" and "member_name" (unless the member can be resolved) with optional
+      "channel_id" / "channel_name" and "timezone"
+    * ``update``: requires "id" and any of "content", "when" (optionally with "timezone", otherwise resolved in the timezone of
+      the reminder) or "user_notified"
+    * ``delete``: requires "id"
+    """
+
+    items: List[BatchItem] = field(default_factory=list)
+    created_time: float = field(default_factory=time.time)
+
+    _resolved_times: MutableMapping[Tuple[str, str], Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def has_errors(self) -> bool:
+        return any(item.error for item in self.items)
+
+    @classmethod
+    def parse(cls, entries: Any) -> ReminderBatch:
+        if not isinstance(entries, list):
+            raise MinderError('Reminder batch must be a JSON array of operations')
+
+        if not entries:
+            raise MinderError('Reminder batch is empty')
+
+        if len(entries) > MAX_BATCH_SIZE:
+            raise MinderError(f'Reminder batch of #{len(entries)} operations exceeds the limit of #{MAX_BATCH_SIZE}')
+
+        items = []
+
+        for idx, entry in enumerate(entries):
+            if not isinstance(entry, Mapping):
+                items.append(BatchItem(index=idx, op='unknown', data={}, error='Operation must be a JSON object'))
+                continue
+
+            op = str(entry.get('op', 'create')).lower()
+            item = BatchItem(index=idx, op=op, data=entry)
+
+            if op not in BATCH_OPERATIONS:
+                item.error = f'Invalid operation "{op}". Must be one of: {", ".join(BATCH_OPERATIONS)}'
+
+            items.append(item)
+
+        return cls(items=items)
+
+    def _resolve_time(self, when: Any, tz_name: Optional[str]) -> FuzzyTime:
+        """
+        Resolve a "when" in the timezone ``tz_name``, only parsing each distinct ("when", timezone) pair in the batch once
+        """
+
+        time_key = (str(when), tz_name or '')
+
+        if time_key not in self._resolved_times:
+            try:
+                if tz_name and not Timezone.is_valid_timezone(tz_name):
+                    raise MinderError(f'Invalid timezone provided: "{tz_name}"')
+
+                use_tz = Timezone.build(tz_name) if tz_name else None
+                self._resolved_times[time_key] = FuzzyTime.build(time_key[0], created_time=self.created_time, use_timezone=use_tz)
+            except Exception as ex:
+                self._resolved_times[time_key] = ex
+
+        fuz_time = self._resolved_times[time_key]
+
+        if isinstance(fuz_time, Exception):
+            raise MinderError(f'Error parsing fuzzy timestamp for "{when}": {fuz_time}')
+
+        return fuz_time
+
+    def _validate_create(self, item: BatchItem, resolve_member: MemberResolver = None) -> None:
+        data = item.data
+
+        for attr in ['when', 'content', 'member_id']:
+            if not data.get(attr):
+                raise MinderError(f'No value provided for "{attr}"')
+
+        fuz_time = self._resolve_time(data['when'], data.get('timezone'))
+
+        member_id = int(data['member_id'])
+        member = resolve_member(member_id, data.get('member_name')) if resolve_member else None
+
+        if not member:
+            if not data.get('member_name'):
+                raise MinderError(f'No value provided for "member_name" and member ID #{member_id} cannot be resolved')
+
+            member = {'id': member_id, 'name': data['member_name']}
+
+        channel = None
+
+        if data.get('channel_id'):
+            if not data.get('channel_name'):
+                raise MinderError('No value provided for "channel_name"')
+
+            channel = {'id': int(data['channel_id']), 'name': data['channel_name']}
+
+        item.reminder = Reminder.build(fuz_time, member=member, content=str(data['content']), channel=channel,
+                                       use_timezone=data.get('timezone') or None)
+
+    def _validate_update(self, helper: RedisentHelper, item: BatchItem) -> None:
+        data = item.data
+        invalid = [attr for attr in data if attr not in BATCH_UPDATE_FIELDS + ['op', 'id']]
+
+        if invalid:
+            raise MinderError(f'Invalid attributes for update: {", ".join(invalid)}')
+
+        rem = self._fetch(helper, item)
+
+        if 'content' in data:
+            if not data['content']:
+                raise MinderError('No value provided for "content"')
+
+            rem.content = str(data['content'])
+
+        if 'user_notified' in data:
+            if not isinstance(data['user_notified'], bool):
+                raise MinderError('Value for "user_notified" must be a boolean')
+
+            rem.user_notified = data['user_notified']
+
+        if 'when' in data:
+            # Without an explicit timezone, the new "when" is resolved in the timezone the reminder was created with
+            fuz_time = self._resolve_time(data['when'], data.get('timezone') or rem.timezone_name)
+
+            rem.provided_when = fuz_time.provided_when
+            rem.trigger_ts = fuz_time.resolved_timestamp
+            rem.trigger_time = fuz_time
+
+            if data.get('timezone'):
+                rem.timezone_name = data['timezone']
+
+        item.reminder = rem
+
+    def _fetch(self, helper: RedisentHelper, item: BatchItem) -> Reminder:
+        if not item.data.get('id'):
+            raise MinderError('No value provided for "id"')
+
+        rem = Reminder.fetch(helper, redis_id='reminders', redis_name=str(item.data['id']))
+
+        if not rem:
+            raise MinderError(f'No reminder found with ID "{item.data["id"]}"')
+
+        return rem
+
+    def validate(self, helper: RedisentHelper, resolve_member: MemberResolver = None) -> bool:
+        """
+        Validate every item in the batch, building the reminders to store along the way
+
+        Errors are recorded on the individual items rather than raised. Returns ``True`` if every item is valid.
+
+        :param helper: the ``RedisentHelper`` used to fetch reminders being updated or deleted
+        :param resolve_member: optional callable resolving a member ID (and provided name) to a Discord member
+        """
+
+        seen_ids = set()
+
+        for item in self.items:
+            if item.error:
+                continue
+
+            try:
+                if item.op == 'create':
+                    self._validate_create(item, resolve_member=resolve_member)
+                elif item.op == 'update':
+                    self._validate_update(helper, item)
+                else:
+                    item.reminder = self._fetch(helper, item)
+            except Exception as ex:
+                item.error = str(ex)
+                continue
+
+            if item.op != 'create':
+                if item.reminder_id in seen_ids:
+                    item.error = f'Reminder ID "{item.reminder_id}" is modified more than once in this batch'
+                    continue
+
+                seen_ids.add(item.reminder_id)
+
+        return not self.has_errors
+
+    def apply(self, helper: RedisentHelper, resolve_member: MemberResolver = None) -> bool:
+        """
+        Validate the batch and write every item in a single transaction, returning ``True`` if the batch was applied
+
+        Reminders being updated or deleted are fetched and written in an optimistic transaction watching the reminders hash
+        (like :py:meth:`Reminder.update`) so concurrent writes to them are not lost. If any item is invalid, nothing is
+        written and ``False`` is returned. Per-item results are available from :py:meth:`results` either way.
+
+        :param helper: the ``RedisentHelper`` providing the Redis connection
+        :param resolve_member: optional callable resolving a member ID (and provided name) to a Discord member
+        """
+
+        op_name = f'reminder_batch(#{len(self.items)})'
+
+        def _apply(pipe_helper: RedisentHelper) -> bool:
+            if not self.validate(pipe_helper, resolve_member=resolve_member):
+                return False
+
+            with pipe_helper.wrapped_redis(op_name) as pipe:
+                pipe.multi()
+
+            for item in self.items:
+                if item.op == 'delete':
+                    item.reminder.delete(pipe_helper)
+                else:
+                    item.reminder.store(pipe_helper, event_action=item.op)
+
+            return True
+
+        if not transaction(helper, _apply, 'reminders', op_name=op_name):
+            return False
+
+        logger.info(f'Applied reminder batch of #{len(self.items)} operations')
+        return True
+
+    def results(self) -> List[Mapping[str, Any]]:
+        return [item.as_dict() for item in self.items]
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import typing
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+
+from minder.errors import MinderError
+
+logger = logging.getLogger(__name__)
+
+TRUE_VALUES = ['1', 'true', 'yes', 'on', 'y', 't']
+FALSE_VALUES = ['0', 'false', 'no', 'off', 'n', 'f']
+NULL_VALUES = ['', 'null', 'none']
+
+
+def to_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+
+    if isinstance(value, (int, float)):
+        return bool(value)
+
+    norm_value = str(value).strip().lower()
+
+    if norm_value in TRUE_VALUES:
+        return True
+
+    if norm_value in FALSE_VALUES:
+        return False
+
+    raise ValueError(f'"{value}" is not a valid boolean')
+
+
+def _to_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError(f'"{value}" is not a valid integer')
+
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f'"{value}" is not a valid integer')
+
+        return int(value)
+
+    return int(str(value).strip())
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError(f'"{value}" is not a valid number')
+
+    return float(value)
+
+
+# Converters for the field types that can be provided by clients. Fields of any other type cannot be updated
+Converters: Mapping[type, Callable[[Any], Any]] = {
+    bool: to_bool,
+    int: _to_int,
+    float: _to_float,
+    str: str
+}
+
+
+@dataclass(frozen=True)
+class FieldCoercer:
+    """
+    Pre-resolved coercion and validation for a single model field
+    """
+
+    name: str
+    field_type: type
+    optional: bool
+    convert: Callable[[Any], Any]
+    validate: Optional[Callable[[Any], bool]] = None
+
+    def coerce(self, value: Any) -> Any:
+        if value is None or (self.optional and isinstance(value, str) and value.strip().lower() in NULL_VALUES):
+            if not self.optional:
+                raise ValueError('Value is required')
+
+            return None
+
+        new_value = self.convert(value)
+
+        if self.validate and not self.validate(new_value):
+            raise ValueError(f'"{new_value}" is not a valid value')
+
+        return new_value
+
+
+def _unwrap_type(field_type: Any) -> typing.Tuple[Any, bool]:
+    """
+    Returns the underlying type for ``field_type`` and if it is ``Optional``
+    """
+
+    if typing.get_origin(field_type) is typing.Union:
+        args = [arg for arg in typing.get_args(field_type) if arg is not type(None)]  # noqa: E721
+        optional = len(args) != len(typing.get_args(field_type))
+
+        return (args[0] if len(args) == 1 else field_type), optional
+
+    return field_type, False
+
+
+@dataclass(frozen=True)
+class CoercionPlan:
+    """
+    Table of per-field converters for updating a model from client-provided values (i.e. a HTTP PATCH)
+
+    The plan is built once per model from the resolved type hints so requests only need a dictionary lookup and a
+    conversion per provided value rather than re-inspecting the dataclass fields.
+    """
+
+    model_name: str
+    fields: Mapping[str, FieldCoercer]
+
+    @classmethod
+    def build(cls, model: type, field_names: Iterable[str], validators: Mapping[str, Callable[[Any], bool]] = None) -> CoercionPlan:
+        """
+        Build the plan for ``field_names`` of ``model``
+
+        :param model: the dataclass model to build the plan for
+        :param field_names: names of the fields which can be updated
+        :param validators: optional mapping of field name to a callable returning ``False`` for invalid (coerced) values
+        """
+
+        validators = validators or {}
+        type_hints = typing.get_type_hints(model)
+        fields = {}
+
+        for name in field_names:
+            field_type, optional = _unwrap_type(type_hints[name])
+
+            if field_type not in Converters:
+                logger.debug(f'Field "{name}" of "{model.__name__}" has unsupported type "{field_type}" and cannot be updated')
+                continue
+
+            fields[name] = FieldCoercer(name=name, field_type=field_type, optional=optional, convert=Converters[field_type],
+                                        validate=validators.get(name, None))
+
+        return cls(model_name=model.__name__, fields=fields)
+
+    def coerce(self, values: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Coerce each provided value to the type of its field
+
+        :raises MinderError: if any attributes are unknown or any values are invalid (all problems are reported at once)
+        """
+
+        coerced = {}
+        errors = []
+
+        for name, value in values.items():
+            coercer = self.fields.get(name, None)
+
+            if not coercer:
+                errors.append(f'Invalid attribute "{name}"')
+                continue
+
+            try:
+                coerced[name] = coercer.coerce(value)
+            except (TypeError, ValueError) as ex:
+                errors.append(f'Invalid value for "{name}" (type "{coercer.field_type.__name__}"): {ex}')
+
+        if errors:
+            raise MinderError(f'Invalid update for "{self.model_name}": {"; ".join(errors)}')
+
+        return coerced
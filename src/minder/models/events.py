@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from typing import Any, Mapping
+
+from minder.encoding import dumps
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = 'minder:events'
+EVENT_KINDS = ['reminder', 'status']
+
+
+def publish_event(r_conn, kind: str, action: str, data: Mapping[str, Any]) -> None:
+    """
+    Queue publishing an event on the Redis events channel
+
+    When ``r_conn`` is a transactional pipeline, the event is only published if the write it describes is applied.
+
+    :param r_conn: the Redis connection (generally a pipeline) to publish on
+    :param kind: kind of event (one of :py:data:`EVENT_KINDS`)
+    :param action: what happened (i.e. "create" or "delete" for reminders or the status action)
+    :param data: compact, JSON-serializable details of the event
+    """
+
+    r_conn.publish(EVENTS_CHANNEL, dumps({'kind': kind, 'action': action, 'timestamp': time.time(), 'data': data}))
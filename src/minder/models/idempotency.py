@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+
+from dataclasses import dataclass
+from redisent.helpers import RedisentHelper
+from typing import Optional, Union
+
+from minder.config import Config
+from minder.errors import IdempotencyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_PREFIX = 'idempotency'
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_REPLAY_HEADER = 'Idempotent-Replayed'
+
+# How long an in-flight request holds its key. If the worker dies before completing, retries are accepted again after this
+PENDING_TTL = 60
+
+RE_IDEMPOTENCY_KEY = re.compile(r'^[\x21-\x7e]{1,255}$')
+
+
+@dataclass
+class IdempotentResponse:
+    """
+    Response recorded for a completed request so that it can be replayed for retries using the same idempotency key
+    """
+
+    status: int
+    body: str
+    content_type: str = 'application/json'
+
+
+class IdempotencyStore:
+    """
+    Records responses to requests made with an ``Idempotency-Key`` header in Redis
+
+    Before handling a request, :py:meth:`begin` claims the key with ``SET NX`` using a short-lived pending marker. Once the
+    request completes, :py:meth:`complete` replaces the marker with the response, kept for ``Config.IDEMPOTENCY_TTL``
+    seconds. Retries with the same key get the recorded response back without the request being handled again.
+
+    Keys are scoped (i.e. per endpoint) and each key is bound to a fingerprint of the original request body so a key reused
+    for a different request is rejected rather than replaying an unrelated response.
+    """
+
+    @classmethod
+    def redis_key(cls, scope: str, idem_key: str) -> str:
+        return f'{IDEMPOTENCY_PREFIX}:{scope}:{idem_key}'
+
+    @classmethod
+    def fingerprint(cls, body: Union[str, bytes]) -> str:
+        return hashlib.sha256(body.encode() if isinstance(body, str) else body).hexdigest()
+
+    @classmethod
+    def validate_key(cls, idem_key: str) -> None:
+        if not RE_IDEMPOTENCY_KEY.match(idem_key or ''):
+            raise IdempotencyError(f'Invalid {IDEMPOTENCY_HEADER} header. Must be 1-255 printable, non-whitespace ASCII characters',
+                                   status_code=400)
+
+    @classmethod
+    def begin(cls, helper: RedisentHelper, scope: str, idem_key: str, fingerprint: str) -> Optional[IdempotentResponse]:
+        """
+        Claim ``idem_key`` for a new request or return the response recorded for a previous request with the same key
+
+        :param helper: the ``RedisentHelper`` to use for Redis
+        :param scope: the scope of the key (i.e. the endpoint name)
+        :param idem_key: the idempotency key provided by the client
+        :param fingerprint: fingerprint of the request body (see :py:meth:`fingerprint`)
+        :returns: ``None`` if the key was claimed and the request should be handled, otherwise the recorded response
+        :raises IdempotencyError: if the original request is still in progress or the key was used for a different request
+        """
+
+        cls.validate_key(idem_key)
+        redis_key = cls.redis_key(scope, idem_key)
+        pending = json.dumps({'state': 'pending', 'fingerprint': fingerprint})
+
+        with helper.wrapped_redis(f'idempotency_begin("{scope}")') as r_conn:
+            if r_conn.set(redis_key, pending, nx=True, ex=PENDING_TTL):
+                return None
+
+            existing = r_conn.get(redis_key)
+
+        if not existing:
+            # The previous claim expired between the two commands. Treat this the same as an in-flight request so the client retries
+            raise IdempotencyError(f'A request with {IDEMPOTENCY_HEADER} "{idem_key}" is already in progress')
+
+        record = json.loads(existing)
+
+        if record['fingerprint'] != fingerprint:
+            raise IdempotencyError(f'{IDEMPOTENCY_HEADER} "{idem_key}" was already used for a different request', status_code=422)
+
+        if record['state'] == 'pending':
+            raise IdempotencyError(f'A request with {IDEMPOTENCY_HEADER} "{idem_key}" is already in progress')
+
+        logger.info(f'Replaying recorded HTTP {record["status"]} response for {IDEMPOTENCY_HEADER} "{idem_key}" ("{scope}")')
+        return IdempotentResponse(status=record['status'], body=record['body'], content_type=record.get('content_type', 'application/json'))
+
+    @classmethod
+    def complete(cls, helper: RedisentHelper, scope: str, idem_key: str, fingerprint: str, response: IdempotentResponse) -> None:
+        record = json.dumps({'state': 'complete', 'fingerprint': fingerprint, 'status': response.status, 'body': response.body,
+                             'content_type': response.content_type})
+
+        with helper.wrapped_redis(f'idempotency_complete("{scope}")') as r_conn:
+            r_conn.set(cls.redis_key(scope, idem_key), record, ex=int(Config.IDEMPOTENCY_TTL))
+
+    @classmethod
+    def release(cls, helper: RedisentHelper, scope: str, idem_key: str) -> None:
+        """
+        Release a claimed key without recording a response (i.e. when handling the request failed) so that retries are handled
+        """
+
+        with helper.wrapped_redis(f'idempotency_release("{scope}")') as r_conn:
+            r_conn.delete(cls.redis_key(scope, idem_key))
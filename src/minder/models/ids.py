@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+
+from datetime import datetime
+from typing import Optional
+
+from minder.common import DateTimeType
+from minder.errors import MinderError
+
+logger = logging.getLogger(__name__)
+
+# Crockford's base32 alphabet, as used by ULIDs. The characters are in ASCII order so encoded IDs sort by value
+ID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ID_LENGTH = 26
+
+TIMESTAMP_BITS = 48
+RANDOM_BITS = 80
+
+_MAX_RANDOM = (1 << RANDOM_BITS) - 1
+_MAX_TIMESTAMP = (1 << TIMESTAMP_BITS) - 1
+
+RE_ENTRY_ID = re.compile(f'^[{ID_ALPHABET}]{{{ID_LENGTH}}}$')
+RE_LEGACY_ID = re.compile(r'^(?P<prefix>[^:]+):(?P<timestamp>\d+(\.\d+)?)$')
+
+
+def _encode(value: int) -> str:
+    chars = []
+
+    for _ in range(ID_LENGTH):
+        chars.append(ID_ALPHABET[value & 0x1f])
+        value >>= 5
+
+    return ''.join(reversed(chars))
+
+
+def _decode(entry_id: str) -> int:
+    value = 0
+
+    for char in entry_id:
+        value = (value << 5) | ID_ALPHABET.index(char)
+
+    return value
+
+
+def _as_millis(timestamp: DateTimeType) -> int:
+    ts = timestamp.timestamp() if isinstance(timestamp, datetime) else float(timestamp)
+    return int(ts * 1000)
+
+
+class IdGenerator:
+    """
+    Generator for ULID-style, time-sortable unique IDs
+
+    Each ID is 26 characters of Crockford base32 encoding a 48-bit millisecond timestamp followed by 80 random bits. The
+    random bits make IDs generated by separate processes collision-free while the timestamp prefix means IDs sort by
+    time, both as strings and in Redis lexicographic ranges.
+
+    IDs generated by the same generator within the same millisecond increment the random component rather than drawing
+    new random bits so that they remain strictly increasing.
+    """
+
+    _lock: threading.Lock
+    _last_millis: int
+    _last_random: int
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last_millis = -1
+        self._last_random = 0
+
+    def generate(self, timestamp: DateTimeType = None) -> str:
+        """
+        Generate a new ID
+
+        :param timestamp: optional time to embed in the ID (default is now). Providing the time of the entry the ID is for
+                          keeps the ID order consistent with the entry time
+        """
+
+        millis = _as_millis(timestamp) if timestamp else int(time.time() * 1000)
+
+        if millis < 0 or millis > _MAX_TIMESTAMP:
+            raise MinderError(f'Cannot generate ID for out of range timestamp "{timestamp}"')
+
+        with self._lock:
+            if millis == self._last_millis and self._last_random < _MAX_RANDOM:
+                rand = self._last_random + 1
+            else:
+                rand = int.from_bytes(os.urandom(RANDOM_BITS // 8), 'big')
+
+            self._last_millis = millis
+            self._last_random = rand
+
+        return _encode((millis << RANDOM_BITS) | rand)
+
+
+_generator = IdGenerator()
+
+
+def generate_id(timestamp: DateTimeType = None) -> str:
+    """
+    Generate a new unique, time-sortable ID using the process-wide :py:class:`IdGenerator`
+    """
+
+    return _generator.generate(timestamp)
+
+
+def is_entry_id(value: str) -> bool:
+    return True if value and RE_ENTRY_ID.match(value) else False
+
+
+def is_legacy_id(value: str) -> bool:
+    """
+    Returns ``True`` if ``value`` is an ID from before time-sortable IDs were used (i.e. ``<member_id>:<trigger_ts>`` or
+    ``<action>:<timestamp>``)
+    """
+
+    return True if value and RE_LEGACY_ID.match(value) else False
+
+
+def id_timestamp(entry_id: str) -> Optional[float]:
+    """
+    Returns the timestamp embedded in either a generated or legacy ID (or ``None`` if the ID is not recognized)
+    """
+
+    if is_entry_id(entry_id):
+        return (_decode(entry_id) >> RANDOM_BITS) / 1000.0
+
+    legacy_match = RE_LEGACY_ID.match(entry_id or '')
+
+    if legacy_match:
+        return float(legacy_match.group('timestamp'))
+
+    return None
+
+
+def min_id(timestamp: DateTimeType) -> str:
+    """
+    Returns the smallest possible ID for ``timestamp`` for use as the lower bound when iterating a range of IDs
+    """
+
+    return _encode(_as_millis(timestamp) << RANDOM_BITS)
+
+
+def max_id(timestamp: DateTimeType) -> str:
+    """
+    Returns the largest possible ID for ``timestamp`` for use as the upper bound when iterating a range of IDs
+    """
+
+    return _encode((_as_millis(timestamp) << RANDOM_BITS) | _MAX_RANDOM)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import logging
+
+from contextlib import contextmanager
+from redis.client import Pipeline
+from redis.exceptions import WatchError
+from redisent.helpers import RedisentHelper
+from typing import Callable, Iterator, Optional, TypeVar
+
+from minder.config import Config
+from minder.errors import MinderError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_pipeline_pool = None
+
+
+def _get_pipeline_pool():
+    global _pipeline_pool
+
+    # The pool is never used directly since the helper is bound to the pipeline via "use_redis" but one is required when
+    # building a RedisentHelper. Connection pools are lazy so this does not open any connections.
+    if _pipeline_pool is None:
+        _pipeline_pool = RedisentHelper.build_pool(Config.REDIS_URL)
+
+    return _pipeline_pool
+
+
+@contextmanager
+def pipelined(helper: RedisentHelper, transaction: bool = True, op_name: Optional[str] = None) -> Iterator[RedisentHelper]:
+    """
+    Context manager providing a :py:class:`RedisentHelper` bound to a Redis pipeline
+
+    Any ``RedisEntry.store`` / ``RedisEntry.delete`` calls made with the yielded helper along with any raw commands issued
+    through its ``wrapped_redis`` connection are queued and sent to Redis in a single round trip when the context exits. If
+    an exception is raised inside the context, the queued commands are discarded.
+
+    If ``helper`` is itself bound to a pipeline (i.e. it was yielded by an enclosing ``pipelined()`` context), it is yielded
+    as-is so the commands join the enclosing pipeline and are only sent when that context exits.
+
+    :param helper: the helper providing the underlying Redis connection
+    :param transaction: if set, the queued commands are wrapped in ``MULTI`` / ``EXEC``
+    :param op_name: optional operation name used for the wrapped Redis connection
+    """
+
+    op_name = op_name or 'pipeline()'
+
+    with helper.wrapped_redis(op_name) as r_conn:
+        if isinstance(r_conn, Pipeline):
+            yield helper
+            return
+
+        pipe = r_conn.pipeline(transaction=transaction)
+
+        try:
+            yield RedisentHelper(_get_pipeline_pool(), use_redis=pipe)
+        except Exception:
+            pipe.reset()
+            raise
+
+        pipe.execute()
+
+
+def transaction(helper: RedisentHelper, func: Callable[[RedisentHelper], T], *watch_keys: str, max_attempts: int = 5,
+                op_name: Optional[str] = None) -> T:
+    """
+    Run ``func`` as an optimistic (``WATCH`` / ``MULTI`` / ``EXEC``) transaction, retrying if a watched key changes
+
+    ``func`` is called with a :py:class:`RedisentHelper` bound to a pipeline watching ``watch_keys``. Reads made through the
+    helper run immediately. To write, ``func`` calls ``multi()`` on the helper connection after which any stores, deletes or
+    raw commands are queued and only applied if none of the watched keys were modified in the meantime. If ``func`` returns
+    without calling ``multi()``, nothing is written.
+
+    :param helper: the helper providing the underlying Redis connection
+    :param func: callable doing the reads and writes, returning the result of the transaction
+    :param watch_keys: keys to watch for concurrent modifications
+    :param max_attempts: how many times to run ``func`` before giving up
+    :param op_name: optional operation name used for the wrapped Redis connection
+    """
+
+    op_name = op_name or 'transaction()'
+
+    with helper.wrapped_redis(op_name) as r_conn:
+        for attempt in range(1, max_attempts + 1):
+            pipe = r_conn.pipeline(transaction=True)
+
+            try:
+                pipe.watch(*watch_keys)
+                result = func(RedisentHelper(_get_pipeline_pool(), use_redis=pipe))
+
+                if pipe.explicit_transaction:
+                    pipe.execute()
+
+                return result
+            except WatchError:
+                logger.info(f'Watched keys modified during "{op_name}" (attempt #{attempt} of #{max_attempts}). Retrying')
+            finally:
+                pipe.reset()
+
+    raise MinderError(f'Unable to complete "{op_name}" after #{max_attempts} attempts due to concurrent modifications')
@@ -1,21 +1,32 @@
 from __future__ import annotations
 
 import discord
+import hashlib
 import humanize
 import logging
+import time
 
 from datetime import datetime
+from redisent.helpers import RedisentHelper
 from redisent.models import RedisEntry
-from typing import Mapping, Union, Optional
+from typing import Any, Mapping, Union, Optional, Tuple
 
 from minder.common import MemberType, ChannelType, AnyMemberType, AnyChannelType
 from minder.errors import MinderError
+from minder.models.coercion import CoercionPlan
+from minder.models.events import publish_event
+from minder.models.ids import generate_id
+from minder.models.pipeline import pipelined, transaction
 from minder.utils import FuzzyTime, Timezone
 
 from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
 
+REMINDERS_VERSION_KEY = 'reminders:version'
+REMINDERS_MEMBER_VERSIONS_KEY = 'reminders:versions'
+REMINDERS_TRIGGER_INDEX = 'reminders:idx:trigger'
+
 
 @dataclass
 class Reminder(RedisEntry):
@@ -72,8 +83,9 @@ class Reminder(RedisEntry):
             logger.warning(f'No timezone setting found for "{self.redis_name}". Setting to "UTC"')
             self.timezone_name = 'UTC'
 
+        # Entries stored before time-sortable IDs were added keep their "<member_id>:<trigger_ts>" name
         if not self.redis_name:
-            self.redis_name = f'{self.member_id}:{self.trigger_ts}'
+            self.redis_name = generate_id(self.created_ts or None)
 
         # TODO: This really does not need to be stored in Redis. Instead we should only store the timestamp and use the
         # timezone info from the reminder entry class
@@ -82,6 +94,174 @@ class Reminder(RedisEntry):
         if self.from_dm is None:
             self.from_dm = True if not self.channel_id or not self.channel_name else False
 
+    def _track_write(self, r_conn, deleted: bool = False, event_action: str = None) -> None:
+        """
+        Queue the version counter bumps, trigger index update and event for a store or delete of this reminder
+        """
+
+        r_conn.incr(REMINDERS_VERSION_KEY)
+        r_conn.hincrby(REMINDERS_MEMBER_VERSIONS_KEY, str(self.member_id), 1)
+
+        if deleted:
+            r_conn.zrem(REMINDERS_TRIGGER_INDEX, self.redis_name)
+        else:
+            r_conn.zadd(REMINDERS_TRIGGER_INDEX, {self.redis_name: self.trigger_ts})
+
+        event_data = {'id': self.redis_name, 'member_id': self.member_id, 'channel_id': self.channel_id or None, 'trigger_ts': self.trigger_ts,
+                      'user_notified': self.user_notified}
+        publish_event(r_conn, 'reminder', event_action or ('delete' if deleted else 'store'), event_data)
+
+    def store(self, helper: RedisentHelper, *args, event_action: str = 'store', **kwargs) -> None:
+        """
+        Store this reminder, bumping the global and per-member version counters in the same pipelined transaction
+
+        :param event_action: the action of the reminder event published for this store (i.e. "create", "update" or "fire")
+        """
+
+        with pipelined(helper, op_name=f'store("reminders", "{self.redis_name}")') as pipe_helper:
+            super().store(pipe_helper, *args, **kwargs)
+
+            with pipe_helper.wrapped_redis(f'track_write("{self.redis_name}")') as pipe:
+                self._track_write(pipe, event_action=event_action)
+
+    def delete(self, helper: RedisentHelper, *args, **kwargs) -> None:
+        """
+        Delete this reminder, bumping the global and per-member version counters in the same pipelined transaction
+        """
+
+        with pipelined(helper, op_name=f'delete("reminders", "{self.redis_name}")') as pipe_helper:
+            super().delete(pipe_helper, *args, **kwargs)
+
+            with pipe_helper.wrapped_redis(f'track_write("{self.redis_name}")') as pipe:
+                self._track_write(pipe, deleted=True)
+
+    @classmethod
+    def update(cls, helper: RedisentHelper, redis_name: str, changes: Mapping[str, Any]) -> Optional[Tuple[Reminder, bool]]:
+        """
+        Apply already coerced attribute changes (see :py:data:`REMINDER_PATCH_PLAN`) to a stored reminder
+
+        Reminders are stored as a single serialized record so the update is a read-modify-write. It runs as an optimistic
+        transaction watching the reminders hash so concurrent writes are not lost, and the record is only written (and the
+        version counters bumped) if a value actually changed.
+
+        :returns: ``None`` if no reminder named ``redis_name`` exists, otherwise the updated reminder and if it was changed
+        """
+
+        def _apply(pipe_helper: RedisentHelper) -> Optional[Tuple[Reminder, bool]]:
+            rem = cls.fetch(pipe_helper, redis_id='reminders', redis_name=redis_name)
+
+            if not rem:
+                return None
+
+            changed = {attr_name: attr_val for attr_name, attr_val in changes.items() if getattr(rem, attr_name) != attr_val}
+
+            if not changed:
+                return rem, False
+
+            prev_member_id = rem.member_id
+
+            for attr_name, attr_val in changed.items():
+                setattr(rem, attr_name, attr_val)
+
+            with pipe_helper.wrapped_redis(f'update("reminders", "{redis_name}")') as pipe:
+                pipe.multi()
+
+            rem.store(pipe_helper, event_action='update')
+
+            # Listings of the previous member also change when a reminder is moved to another member
+            if rem.member_id != prev_member_id:
+                with pipe_helper.wrapped_redis(f'update("reminders", "{redis_name}")') as pipe:
+                    pipe.hincrby(REMINDERS_MEMBER_VERSIONS_KEY, str(prev_member_id), 1)
+
+            return rem, True
+
+        return transaction(helper, _apply, 'reminders', op_name=f'update("reminders", "{redis_name}")')
+
+    @classmethod
+    def get_version(cls, helper: RedisentHelper, member_id: int = None) -> int:
+        """
+        Returns the current version of all reminders or, if ``member_id`` is provided, of the reminders for that member
+
+        Versions increase every time a matching reminder is stored or deleted.
+        """
+
+        with helper.wrapped_redis('get_version("reminders")') as r_conn:
+            if member_id:
+                version = r_conn.hget(REMINDERS_MEMBER_VERSIONS_KEY, str(member_id))
+            else:
+                version = r_conn.get(REMINDERS_VERSION_KEY)
+
+        return int(version or 0)
+
+    @classmethod
+    def build_etag(cls, helper: RedisentHelper, member_id: int = None, include_complete: bool = True) -> str:
+        """
+        Build an entity tag for a listing of reminders without fetching any of them
+
+        The tag changes whenever a matching reminder is stored or deleted. Since reminders also become complete as time
+        passes, listings excluding complete reminders also include the number of reminders whose trigger time has passed.
+
+        :param helper: the ``RedisentHelper`` to use for Redis
+        :param member_id: if provided, only track the version for reminders of this member
+        :param include_complete: set to ``False`` if the listing excludes completed reminders
+        """
+
+        with helper.wrapped_redis('build_etag("reminders")') as r_conn:
+            pipe = r_conn.pipeline(transaction=False)
+
+            if member_id:
+                pipe.hget(REMINDERS_MEMBER_VERSIONS_KEY, str(member_id))
+            else:
+                pipe.get(REMINDERS_VERSION_KEY)
+
+            if not include_complete:
+                pipe.zcount(REMINDERS_TRIGGER_INDEX, '-inf', time.time())
+
+            res = pipe.execute()
+
+        etag = f'reminders-m{member_id}-{int(res[0] or 0)}' if member_id else f'reminders-{int(res[0] or 0)}'
+
+        if not include_complete:
+            etag = f'{etag}-c{res[1]}'
+
+        return etag
+
+    @classmethod
+    def build_entry_etag(cls, helper: RedisentHelper, redis_name: str) -> Optional[str]:
+        """
+        Build an entity tag for a single reminder from a digest of its stored record
+
+        Unlike :py:meth:`build_etag`, the tag only changes when this reminder is written. The record is read without being
+        decoded. Returns ``None`` if no reminder named ``redis_name`` exists.
+        """
+
+        with helper.wrapped_redis(f'build_entry_etag("{redis_name}")') as r_conn:
+            raw = r_conn.hget('reminders', redis_name)
+
+        if raw is None:
+            return None
+
+        digest = hashlib.sha1(raw if isinstance(raw, bytes) else str(raw).encode()).hexdigest()
+        return f'reminder-{digest[:20]}'
+
+    @classmethod
+    def rebuild_indexes(cls, helper: RedisentHelper) -> int:
+        """
+        Add any reminders missing from the trigger index (i.e. those stored before it was added)
+
+        Returns the number of indexed reminders.
+        """
+
+        reminders = cls.fetch_all(helper, redis_id='reminders', check_exists=False)
+
+        if not reminders:
+            return 0
+
+        with helper.wrapped_redis('rebuild_indexes("reminders")') as r_conn:
+            r_conn.zadd(REMINDERS_TRIGGER_INDEX, {rem.redis_name: rem.trigger_ts for rem in reminders.values()})
+
+        return len(reminders)
+
     @classmethod
     def build(cls, trigger_time: Union[FuzzyTime, str], member: AnyMemberType, content: str, channel: AnyChannelType = None,
               created_at: datetime = None, use_timezone: Union[str, Timezone] = None) -> Reminder:
@@ -181,3 +361,8 @@ class Reminder(RedisEntry):
                       emb_content]
 
         return '\n'.join(out_lines)
+
+
+# Built once at import time and shared by the PATCH handlers of both the Flask and bot APIs
+REMINDER_PATCH_PLAN = CoercionPlan.build(Reminder, Reminder.get_entry_fields(include_redis_fields=False, include_internal_fields=False),
+                                         validators={'timezone_name': Timezone.is_valid_timezone})
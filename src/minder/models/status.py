@@ -1,28 +1,42 @@
 from __future__ import annotations
 
 import logging
+import pickle
 
 from dataclasses import dataclass, field
 from datetime import datetime
+from redisent.helpers import RedisentHelper
 from redisent.models import RedisEntry
-from typing import MutableMapping, Mapping, Any
+from typing import MutableMapping, Mapping, Any, List, Optional
 
+from minder.common import DateTimeType
 from minder.errors import MinderError
+from minder.models.activity import ActivityCounters
+from minder.models.events import publish_event
+from minder.models.ids import generate_id
+from minder.models.pipeline import pipelined
 
 logger = logging.getLogger(__name__)
 
+STATUS_INDEX_PREFIX = 'bot_status:idx'
+
 StatusEntryActions: Mapping[str, str] = {
     'LOGON': 'Logged on',
     'LOGOFF': 'Logged off',
     'JOIN': 'Joined',
     'PART': 'Parted',
     'DELETE': 'Message Deleted',
+    'PURGE': 'Messages Purged',
     'EDIT': 'Message Edited',
     'ERROR': 'Error',
     'DEBUG': 'Debug'
 }
 
 
+def _as_timestamp(value: DateTimeType) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
 @dataclass
 class StatusEntry(RedisEntry):
     redis_id: str = 'bot_status'
@@ -34,7 +48,9 @@ class StatusEntry(RedisEntry):
     context: Mapping[str, Any] = field(default_factory=dict)
 
     def __post_init__(self) -> None:
-        self.redis_name = str(f'{self.action}:{self.timestamp.timestamp()}')
+        # Entries stored before time-sortable IDs were added keep their "<action>:<timestamp>" name
+        if not self.redis_name:
+            self.redis_name = generate_id(self.timestamp)
 
         if self.action not in StatusEntryActions:
             if self.action.upper() not in StatusEntryActions:
@@ -42,6 +58,187 @@ class StatusEntry(RedisEntry):
 
             self.action = self.action.upper()
 
+    def _get_context_id(self, ctx_name: str, attr: str = 'id') -> Optional[int]:
+        """
+        Returns an ID from a member or channel in the entry context
+
+        Contexts store the compact mapping form of :py:class:`minder.common.DiscordMember` / :py:class:`minder.common.DiscordChannel`
+        but entries stored before that hold the dataclass instances, so both are supported.
+        """
+
+        ctx_ent = self.context.get(ctx_name, None)
+
+        if not ctx_ent:
+            return None
+
+        ent_id = ctx_ent.get(attr, None) if isinstance(ctx_ent, Mapping) else getattr(ctx_ent, attr, None)
+        return int(ent_id) if ent_id else None
+
+    @property
+    def guild_id(self) -> Optional[int]:
+        """
+        Guild ID associated with this entry (if any) based on the entry context
+        """
+
+        if self.context.get('guild_id'):
+            return int(self.context['guild_id'])
+
+        return self._get_context_id('member', attr='guild_id') or self._get_context_id('channel', attr='guild_id')
+
+    @property
+    def channel_id(self) -> Optional[int]:
+        return self._get_context_id('channel')
+
+    @property
+    def member_id(self) -> Optional[int]:
+        return self._get_context_id('member')
+
+    @classmethod
+    def index_key(cls, action: str = None, guild_id: int = None) -> str:
+        """
+        Returns the name of the time-ordered sorted set indexing entries for the provided action and/or guild
+
+        If neither ``action`` nor ``guild_id`` are provided, the index of all entries is used.
+        """
+
+        if guild_id and action:
+            return f'{STATUS_INDEX_PREFIX}:guild:{guild_id}:{action.upper()}'
+
+        if guild_id:
+            return f'{STATUS_INDEX_PREFIX}:guild:{guild_id}'
+
+        if action:
+            return f'{STATUS_INDEX_PREFIX}:action:{action.upper()}'
+
+        return f'{STATUS_INDEX_PREFIX}:all'
+
+    def get_index_keys(self) -> List[str]:
+        idx_keys = [self.index_key(), self.index_key(action=self.action)]
+        guild_id = self.guild_id
+
+        if guild_id:
+            idx_keys += [self.index_key(guild_id=guild_id), self.index_key(action=self.action, guild_id=guild_id)]
+
+        return idx_keys
+
+    def _add_to_indexes(self, r_conn) -> None:
+        score = self.timestamp.timestamp()
+
+        for idx_key in self.get_index_keys():
+            r_conn.zadd(idx_key, {self.redis_name: score})
+
+    def _record_activity(self, r_conn) -> None:
+        # Batched entries (i.e. purges) record how many events they represent under "count"
+        amount = int(self.context.get('count', 1))
+        ActivityCounters.record(r_conn, self.action, self.timestamp, guild_id=self.guild_id, channel_id=self.channel_id, member_id=self.member_id,
+                                amount=amount)
+
+    def store(self, helper: RedisentHelper, *args, **kwargs) -> None:
+        """
+        Store this entry in Redis, add it to the time-ordered action and guild indexes and bump the activity counters
+
+        The entry, index and counter updates along with the published status event are sent in a single pipelined transaction.
+        """
+
+        with pipelined(helper, op_name=f'store("bot_status", "{self.redis_name}")') as pipe_helper:
+            super().store(pipe_helper, *args, **kwargs)
+
+            with pipe_helper.wrapped_redis(f'index("{self.redis_name}")') as pipe:
+                self._add_to_indexes(pipe)
+                self._record_activity(pipe)
+
+                event_data = {'id': self.redis_name, 'guild_id': self.guild_id, 'channel_id': self.channel_id, 'member_id': self.member_id,
+                              'timestamp': _as_timestamp(self.timestamp), 'count': int(self.context.get('count', 1))}
+                publish_event(pipe, 'status', self.action, event_data)
+
+    @classmethod
+    def query(cls, helper: RedisentHelper, action: str = None, guild_id: int = None, start: DateTimeType = None, end: DateTimeType = None,
+              limit: int = 100, newest_first: bool = True) -> List[StatusEntry]:
+        """
+        Query status entries using the time-ordered action and guild indexes
+
+        Only the matching entries are fetched (with a single ``HMGET``), the ``bot_status`` hash is never scanned.
+
+        :param helper: the ``RedisentHelper`` to use for Redis
+        :param action: optionally only return entries for this action
+        :param guild_id: optionally only return entries related to this guild
+        :param start: optional earliest time (inclusive) for returned entries
+        :param end: optional latest time (inclusive) for returned entries
+        :param limit: maximum number of entries to return
+        :param newest_first: if set, entries are returned newest first. otherwise oldest first
+        """
+
+        if action and action.upper() not in StatusEntryActions:
+            raise MinderError(f'Invalid action value provided while querying status entries: {action}. Must be one of "{", ".join(StatusEntryActions)}"')
+
+        idx_key = cls.index_key(action=action, guild_id=guild_id)
+        min_score = _as_timestamp(start) if start is not None else '-inf'
+        max_score = _as_timestamp(end) if end is not None else '+inf'
+
+        with helper.wrapped_redis(f'zrangebyscore("{idx_key}", {min_score}, {max_score})') as r_conn:
+            if newest_first:
+                ent_names = r_conn.zrevrangebyscore(idx_key, max_score, min_score, start=0, num=limit)
+            else:
+                ent_names = r_conn.zrangebyscore(idx_key, min_score, max_score, start=0, num=limit)
+
+        ent_names = [ent_name.decode('utf-8') if isinstance(ent_name, bytes) else ent_name for ent_name in ent_names]
+
+        if not ent_names:
+            return []
+
+        with helper.wrapped_redis(f'hmget("bot_status", #{len(ent_names)})') as r_conn:
+            raw_entries = r_conn.hmget('bot_status', ent_names)
+
+        entries: List[StatusEntry] = []
+
+        for ent_name, raw_ent in zip(ent_names, raw_entries):
+            ent = cls._load_entry(helper, ent_name, raw_ent) if raw_ent is not None else None
+
+            if not ent:
+                logger.warning(f'Found stale status index entry for "{ent_name}" in "{idx_key}". Skipping..')
+                continue
+
+            entries.append(ent)
+
+        return entries
+
+    @classmethod
+    def _load_entry(cls, helper: RedisentHelper, ent_name: str, raw_ent: bytes) -> Optional[StatusEntry]:
+        # Records are pickled by "RedisEntry.store". Anything else is left to a regular fetch to decode
+        try:
+            ent = pickle.loads(raw_ent)
+        except Exception:
+            ent = None
+
+        if isinstance(ent, StatusEntry):
+            return ent
+
+        return cls.fetch(helper, redis_id='bot_status', redis_name=ent_name)
+
+    @classmethod
+    def rebuild_indexes(cls, helper: RedisentHelper) -> int:
+        """
+        Rebuild all status indexes from the entries found in the ``bot_status`` hash
+
+        This is only needed for entries stored before indexing was added. Returns the number of indexed entries.
+        """
+
+        entries = cls.fetch_all(helper, redis_id='bot_status', check_exists=False)
+
+        if not entries:
+            return 0
+
+        with helper.wrapped_redis('rebuild_indexes("bot_status")') as r_conn:
+            pipe = r_conn.pipeline(transaction=False)
+
+            for ent in entries.values():
+                ent._add_to_indexes(pipe)
+
+            pipe.execute()
+
+        logger.info(f'Rebuilt status indexes for #{len(entries)} entries')
+        return len(entries)
+
     def __str__(self) -> str:
         return f'(StatusEntry -- {self.action}): {self.message}'
 
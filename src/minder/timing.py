@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from redisent.helpers import RedisentHelper
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+from minder.metrics import COMMAND_ERRORS, COMMAND_LATENCY, COMMAND_PHASE_SECONDS, REDIS_OP_ERRORS, REDIS_OP_LATENCY, op_label
+
+logger = logging.getLogger(__name__)
+
+# Phases tracked for each command invocation. Any time not spent in these phases is reported as "other"
+PHASES = ['redis', 'discord', 'render']
+
+# Number of slowest invocations kept by :py:cls:`CommandStats`
+SLOWEST_SIZE = 25
+
+_current_timing: ContextVar[Optional[CommandTiming]] = ContextVar('minder_command_timing', default=None)
+
+
+@dataclass
+class CommandTiming:
+    """
+    Timing of a single command invocation, broken down by the time spent in each of :py:data:`PHASES`
+    """
+
+    command: str
+    kind: str
+    user: str = ''
+    started_at: float = field(default_factory=time.time)
+    duration: float = 0.0
+    failed: bool = False
+    phases: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def other(self) -> float:
+        return max(0.0, self.duration - sum(self.phases.values()))
+
+    def as_dict(self) -> Mapping[str, Any]:
+        return {'command': self.command, 'kind': self.kind, 'user': self.user, 'started_at': self.started_at, 'duration': self.duration,
+                'failed': self.failed, 'phases': dict(self.phases, other=self.other)}
+
+
+def current_timing() -> Optional[CommandTiming]:
+    return _current_timing.get()
+
+
+def begin_command(command: str, kind: str, user: str = '') -> CommandTiming:
+    """
+    Start timing a command invocation in the current task
+
+    Time recorded with :py:func:`record_phase` (or :py:func:`timed_phase`) from the same task is attributed to the returned
+    :py:cls:`CommandTiming` until :py:func:`finish_command` is called.
+    """
+
+    timing = CommandTiming(command=command, kind=kind, user=user)
+    _current_timing.set(timing)
+    return timing
+
+
+def finish_command(timing: CommandTiming, failed: bool = None) -> CommandTiming:
+    """
+    Stop timing ``timing`` and record its latency, error and phase metrics
+    """
+
+    timing.duration = time.perf_counter() - timing._started
+
+    if failed is not None:
+        timing.failed = failed
+
+    if _current_timing.get() is timing:
+        _current_timing.set(None)
+
+    status = 'error' if timing.failed else 'ok'
+    COMMAND_LATENCY.observe(timing.duration, command=timing.command, kind=timing.kind, status=status)
+
+    if timing.failed:
+        COMMAND_ERRORS.inc(command=timing.command, kind=timing.kind)
+
+    for phase, seconds in dict(timing.phases, other=timing.other).items():
+        COMMAND_PHASE_SECONDS.inc(seconds, command=timing.command, phase=phase)
+
+    return timing
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    """
+    Add ``seconds`` to ``phase`` of the command being timed in the current task (if any)
+    """
+
+    timing = _current_timing.get()
+
+    if timing is not None:
+        timing.phases[phase] = timing.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed_phase(phase: str) -> Iterator[None]:
+    """
+    Context manager adding the time spent inside the context to ``phase`` of the current command (if any)
+    """
+
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+
+class CommandStats:
+    """
+    Per-command call and error counts along with the slowest invocations seen since startup (or the last :py:meth:`reset`)
+    """
+
+    def __init__(self, slowest_size: int = SLOWEST_SIZE) -> None:
+        self.slowest_size = slowest_size
+
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._slowest: List[tuple] = []
+        self._commands: Dict[str, Dict[str, float]] = {}
+
+    def record(self, timing: CommandTiming) -> None:
+        with self._lock:
+            stats = self._commands.setdefault(timing.command, {'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += 1 if timing.failed else 0
+            stats['total'] += timing.duration
+            stats['max'] = max(stats['max'], timing.duration)
+
+            # Min-heap of the slowest invocations so the fastest of them is the one replaced
+            entry = (timing.duration, next(self._counter), timing)
+
+            if len(self._slowest) < self.slowest_size:
+                heapq.heappush(self._slowest, entry)
+            elif timing.duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self, limit: int = None) -> List[CommandTiming]:
+        with self._lock:
+            entries = heapq.nlargest(limit or self.slowest_size, self._slowest)
+
+        return [timing for _, _, timing in entries]
+
+    def summary(self) -> List[Mapping[str, Any]]:
+        """
+        Returns the stats of each command, slowest average first
+        """
+
+        with self._lock:
+            summary = [{'command': command, 'calls': int(stats['calls']), 'errors': int(stats['errors']), 'mean': stats['total'] / stats['calls'],
+                        'max': stats['max'], 'error_rate': stats['errors'] / stats['calls']} for command, stats in self._commands.items()]
+
+        return sorted(summary, key=lambda stats: stats['mean'], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._slowest.clear()
+            self._commands.clear()
+
+
+class InstrumentedRedisentHelper(RedisentHelper):
+    """
+    :py:cls:`RedisentHelper` recording the duration of each ``wrapped_redis`` context in ``REDIS_OP_LATENCY``
+
+    Operations are labelled by the leading identifier of their ``op_name`` (see :py:func:`minder.metrics.op_label`). Time
+    spent in Redis while running a command is also added to the "redis" phase of the command.
+    """
+
+    @contextmanager
+    def wrapped_redis(self, op_name: str = None, *args, **kwargs) -> Iterator[Any]:
+        label = op_label(op_name)
+        started = time.perf_counter()
+
+        try:
+            with super().wrapped_redis(op_name, *args, **kwargs) as r_conn:
+                yield r_conn
+        except Exception:
+            REDIS_OP_ERRORS.inc(op=label)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            REDIS_OP_LATENCY.observe(elapsed, op=label)
+            record_phase('redis', elapsed)
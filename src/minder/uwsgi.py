@@ -2,11 +2,19 @@ import logging
 
 from minder.bot import build_bot
 from minder.config import Config
-from minder.web.app import create_app
+from minder.web.app import create_app, reset_after_fork
 
 logger = logging.getLogger(__name__)
 
-app = create_app()
+# Unless "lazy-apps" is enabled, uWSGI imports this module once in the master and forks the workers and mules from it
+app = create_app(preload=True)
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    logger.warning('Unable to import "uwsgidecorators" (not running under uWSGI?). Not registering post-fork hook')
+else:
+    postfork(reset_after_fork)
 
 
 def start_bot():
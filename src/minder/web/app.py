@@ -1,27 +1,71 @@
 from __future__ import annotations
 
 import logging
+import os
 import threading
+import time
+import weakref
 
 from minder.cli import register_app_cli
 from minder.config import Config
 from minder.errors import MinderWebError
+from minder.metrics import CACHE_REQUESTS, CACHE_SIZE, CONTENT_TYPE, HTTP_REQUEST_LATENCY, REGISTRY
+from minder.timing import InstrumentedRedisentHelper
+from minder.web.cache import IdentityCache, ResponseCache
+from minder.web.compression import CompressionMiddleware
+from minder.web.encoding import init_json
 from minder.web.model import db
 
-from flask import Flask, redirect, url_for, jsonify, request
+from flask import Flask, Response, g, redirect, url_for, jsonify, request
 from flask_bootstrap import Bootstrap, WebCDN
 from flask_login import LoginManager
 from flask_moment import Moment
 from flask_pretty import Prettify
 from redisent.common import RedisType
 from redisent.helpers import RedisentHelper
-from typing import Any, Mapping, Union
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple, Union
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.exceptions import Unauthorized
 
 moment = Moment()
 logger = logging.getLogger(__name__)
 
+# Every application built in this process, used to reset per-process resources after forking
+_all_apps: weakref.WeakSet = weakref.WeakSet()
+
+
+def _cache_stats() -> Iterator[Tuple[str, Mapping[str, Any]]]:
+    """
+    Yields the name and statistics of the response and identity caches of every application in this process
+    """
+
+    for app in list(_all_apps):
+        yield 'response', app.response_cache.stats()
+        yield 'identity', app.identity_cache.stats()
+
+
+def _cache_requests() -> Mapping[Tuple[str, str], int]:
+    values: Dict[Tuple[str, str], int] = {}
+
+    for name, stats in _cache_stats():
+        values[(name, 'hit')] = values.get((name, 'hit'), 0) + stats['hits']
+        values[(name, 'miss')] = values.get((name, 'miss'), 0) + stats['misses']
+
+    return values
+
+
+def _cache_sizes() -> Mapping[Tuple[str], int]:
+    values: Dict[Tuple[str], int] = {}
+
+    for name, stats in _cache_stats():
+        values[(name,)] = values.get((name,), 0) + stats['size']
+
+    return values
+
+
+CACHE_REQUESTS.set_function(_cache_requests)
+CACHE_SIZE.set_function(_cache_sizes)
+
 
 class FlaskApp(Flask):
     """
@@ -29,13 +73,29 @@ class FlaskApp(Flask):
 
     This is a subclass of :py:cls:`flask.Flask` which automatically loads and configures the minder Flask application
 
-    An instance of :py:cls:`redisent.helpers.RedisentHelper` as "redis_helper"
+    An instance of :py:cls:`redisent.helpers.RedisentHelper` as "redis_helper". The helper (and its connection pool) is
+    created lazily, once per process, so that forked workers never share the connections of their parent
+
+    When ``preload`` is set, the application is built once in a pre-forking server master (i.e. gunicorn ``--preload`` or
+    uWSGI without ``lazy-apps``). The schema check then only runs once in the master, the CLI is not registered and no
+    database connections are left open to be inherited by the workers. Workers call :py:func:`reset_after_fork` from the
+    server post-fork hook.
+
+    API responses are cached per-worker in "response_cache" (see :py:cls:`minder.web.cache.ResponseCache`) and logged in
+    users in "identity_cache" (see :py:cls:`minder.web.cache.IdentityCache`)
+
+    Request latencies are recorded in :py:data:`minder.metrics.HTTP_REQUEST_LATENCY` and, if "METRICS_ENABLE" is set, the
+    metrics of the worker are served from "/metrics" in the Prometheus text format
     """
 
-    redis_helper: RedisentHelper
+    response_cache: ResponseCache
+    identity_cache: IdentityCache
+
+    _redis_helper: Optional[RedisentHelper] = None
+    _redis_pid: Optional[int] = None
 
     def __init__(self, import_name: str, *args, hostname: str = None, port: str = None, use_reloader: bool = None, use_https: bool = None,
-                 overrides: Mapping[str, Any] = None, use_redis: RedisType = None, **kwargs) -> None:
+                 overrides: Mapping[str, Any] = None, use_redis: RedisType = None, preload: bool = False, **kwargs) -> None:
         overrides = overrides or {}
         if use_reloader is None:
             use_reloader = Config.ENABLE_AUTORELOAD
@@ -48,6 +108,7 @@ class FlaskApp(Flask):
         kwargs['static_folder'] = 'static'
 
         super().__init__(import_name, *args, **kwargs)
+        init_json(self)
 
         self._hostname = hostname or Config.FLASK_HOST
         self._port = port or Config.FLASK_PORT
@@ -89,26 +150,149 @@ class FlaskApp(Flask):
         # Register error handler for MinderWebError errors
         self.register_error_handler(MinderWebError, self._handle_app_error)
 
-        # Register the Click CLI extensions from "minder.cli"
-        register_app_cli(self)
+        # Record the latency of every request, labelled by the matched URL rule rather than the path to bound cardinality
+        self.before_request(self._start_request_timer)
+        self.after_request(self._record_request_metrics)
+
+        if self.config['METRICS_ENABLE']:
+            self.add_url_rule('/metrics', 'metrics', self._metrics_view, methods=['GET'])
+
+        # Register the Click CLI extensions from "minder.cli" (not needed when preloading in a server master)
+        if not preload:
+            register_app_cli(self)
 
-        # Setup RedisentHelper
-        pool = RedisentHelper.build_pool(Config.REDIS_URL)
+        # Setup RedisentHelper (created on first use)
         if use_redis:
             logger.info(f'Using provided Redis instance: {use_redis}')
 
-        self.redis_helper = RedisentHelper(pool, use_redis=use_redis)
+        self._use_redis = use_redis
+        self._redis_lock = threading.Lock()
+
+        self.response_cache = ResponseCache(max_size=int(self.config['API_CACHE_SIZE']))
+        self.identity_cache = IdentityCache(max_size=int(self.config['IDENTITY_CACHE_SIZE']), ttl=float(self.config['IDENTITY_CACHE_TTL']))
 
         # Finally, setup SQLAlchemy
+        self.init_schema(dispose=preload)
+
+        self.login_manager.user_loader(self._load_user)
+        _all_apps.add(self)
+
+    @property
+    def redis_helper(self) -> RedisentHelper:
+        """
+        The :py:cls:`RedisentHelper` for this process, built on first use (and again on first use after a fork)
+        """
+
+        if self._redis_helper is None or self._redis_pid != os.getpid():
+            with self._redis_lock:
+                if self._redis_helper is None or self._redis_pid != os.getpid():
+                    pool = RedisentHelper.build_pool(Config.REDIS_URL)
+                    self._redis_helper = InstrumentedRedisentHelper(pool, use_redis=self._use_redis)
+                    self._redis_pid = os.getpid()
+
+        return self._redis_helper
+
+    def init_schema(self, dispose: bool = False) -> None:
+        """
+        Create any missing database tables and indexes
+
+        :param dispose: if set, close the engine connections afterwards so none are inherited by forked workers
+        """
+
         self.logger.info('Initalizing database tables..')
 
         with self.app_context():
             db.create_all()
+            self._create_missing_indexes()
 
-        @self.login_manager.user_loader
-        def load_user(user_id):
-            from minder.web.model import User
-            return User.query.get(int(user_id))
+            if dispose:
+                db.engine.dispose()
+
+    def post_fork(self) -> None:
+        """
+        Reset per-process resources in a newly forked worker
+
+        Pooled database connections inherited from the parent are dropped without closing them (which would also close
+        them for the parent) and the Redis helper and caches are rebuilt on first use in the worker.
+        """
+
+        # The lock may have been held by another thread of the parent when forking so it is replaced rather than acquired
+        self._redis_lock = threading.Lock()
+        self._redis_helper = None
+        self._redis_pid = None
+
+        self.response_cache.invalidate()
+        self.identity_cache.invalidate()
+
+        with self.app_context():
+            try:
+                db.engine.dispose(close=False)
+            except TypeError:
+                # SQLAlchemy before 1.4.33 does not support "close"
+                db.engine.dispose()
+
+    def _create_missing_indexes(self) -> None:
+        """
+        Create any declared indexes missing from existing tables since ``create_all`` only creates indexes for new tables
+        """
+
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    index.create(bind=db.engine, checkfirst=True)
+                except Exception as ex:
+                    logger.warning(f'Unable to create index "{index.name}" on "{table.name}": {ex}')
+
+    def _load_user(self, user_id: str):
+        """
+        User loader for the login manager which avoids querying the database on every authenticated request
+
+        Users are returned from "identity_cache" as read-only :py:class:`minder.web.model.UserIdentity` instances while the
+        users version in Redis is unchanged. If Redis cannot be reached, the user is always loaded from the database.
+        """
+
+        from minder.web.model import User, UserIdentity
+
+        user_id = int(user_id)
+
+        try:
+            version = User.get_version(self.redis_helper)
+        except Exception as ex:
+            logger.warning(f'Unable to fetch users version from Redis. Loading user ID {user_id} from database: {ex}')
+            return User.query.get(user_id)
+
+        user_data = self.identity_cache.get(user_id, version)
+
+        if user_data is not None:
+            return UserIdentity(user_data)
+
+        usr = User.query.get(user_id)
+
+        if usr:
+            self.identity_cache.put(user_id, version, usr.dump())
+
+        return usr
+
+    def _start_request_timer(self) -> None:
+        g.request_started = time.perf_counter()
+
+    def _record_request_metrics(self, response: Response) -> Response:
+        started = g.get('request_started', None)
+
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_LATENCY.observe(time.perf_counter() - started, server='web', method=request.method, route=route, status=response.status_code)
+
+        return response
+
+    def _metrics_view(self) -> Response:
+        """
+        Serve the metrics of this worker process in the Prometheus text format
+
+        Each worker process has its own registry so with multiple workers, each scrape only reflects the worker handling it.
+        """
+
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
     def _handle_app_error(self, exception: MinderWebError = None):
         """
@@ -154,7 +338,7 @@ class FlaskApp(Flask):
 
 
 def create_app(hostname: str = None, port: Union[int, str] = None, use_reloader: bool = None, use_https: bool = None,
-               overrides: Mapping[str, Any] = None, use_redis: RedisType = None, wrap_wsgi_app: bool = None) -> FlaskApp:
+               overrides: Mapping[str, Any] = None, use_redis: RedisType = None, wrap_wsgi_app: bool = None, preload: bool = False) -> FlaskApp:
     """
     Create custom Flask application using subclassed :py:cls:`FlaskApp` implementation
 
@@ -170,15 +354,32 @@ def create_app(hostname: str = None, port: Union[int, str] = None, use_reloader:
     :param use_redis: optionally override the Redis connection to provide to :py:cls:`RedisentHelper`
     :param wrap_wsgi_app: if set, wrap the :py:attr:`Flask.wsgi_app` instance with :py:meth:`ProxyApp` for automatically handling
                           redirection from HTTP to HTTPS (when enabled)
+    :param preload: set when building the application once in a pre-forking server master. Workers must then call
+                    :py:func:`reset_after_fork` after being forked (see ``minder.gunicorn_conf`` and ``minder.uwsgi``)
     """
 
     overrides = overrides or {}
     hostname = hostname or Config.FLASK_HOST
     port = str(port or Config.FLASK_PORT)
 
-    app = FlaskApp(__name__, hostname=hostname, port=port, use_reloader=use_reloader, use_https=use_https, use_redis=use_redis, overrides=overrides)
+    app = FlaskApp(__name__, hostname=hostname, port=port, use_reloader=use_reloader, use_https=use_https, use_redis=use_redis, overrides=overrides,
+                   preload=preload)
 
     if app.wsgi_app:
+        if app.config['COMPRESS_ENABLE']:
+            app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=app.config['COMPRESS_MIN_SIZE'], level=app.config['COMPRESS_LEVEL'])
+
         app.wsgi_app = ProxyFix(app.wsgi_app)
 
     return app
+
+
+def reset_after_fork() -> None:
+    """
+    Reset the per-process resources of every application in this process. Call from the post-fork hook of the server
+    """
+
+    for app in list(_all_apps):
+        app.post_fork()
+
+    logger.info(f'Reset #{len(_all_apps)} application(s) after fork in worker PID {os.getpid()}')
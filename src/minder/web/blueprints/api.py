@@ -1,17 +1,123 @@
-import dataclasses
 import logging
 import typing
 
-from flask import Blueprint, jsonify, current_app, request
+from flask import Blueprint, Response, jsonify, current_app, request
+from flask_login import current_user, login_required
 
-from minder.errors import MinderWebError
-from minder.models import Reminder
+from minder.errors import IdempotencyError, MinderError, MinderWebError
+from minder.models import ActivityCounters, IdempotencyStore, IdempotentResponse, Reminder, ReminderBatch, StatusEntry, StatusEntryActions
+from minder.models.coercion import to_bool
+from minder.models.idempotency import IDEMPOTENCY_HEADER, IDEMPOTENCY_REPLAY_HEADER
+from minder.models.reminders import REMINDER_PATCH_PLAN
 from minder.utils import FuzzyTime
 
 logger = logging.getLogger(__name__)
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 
+def _not_modified(etag: str) -> typing.Optional[Response]:
+    """
+    Returns an empty HTTP 304 response if the request "If-None-Match" header matches ``etag`` (otherwise ``None``)
+
+    Weak matches are accepted since the ETag is weakened when the response is compressed.
+    """
+
+    if not request.if_none_match.contains_weak(etag):
+        return None
+
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return resp
+
+
+def _cached_response(namespace: str, version: str, render: typing.Callable[[], Response]) -> Response:
+    """
+    Returns the response for the current request from the application response cache if it was rendered at ``version``
+
+    On a miss, ``render`` is called to build the response and successful responses are cached for later requests with the
+    same normalized query arguments.
+    """
+
+    cache = current_app.response_cache
+    cache_key = cache.build_key(namespace, request.args)
+    cached = cache.get(cache_key, version)
+
+    if cached is not None:
+        body, mimetype = cached
+        return Response(body, mimetype=mimetype)
+
+    resp = render()
+
+    if resp.status_code == 200:
+        cache.put(cache_key, version, (resp.get_data(), resp.mimetype))
+
+    return resp
+
+
+def _idempotent_response(scope: str, handler: typing.Callable[[], Response]) -> Response:
+    """
+    Handle the current request with ``handler`` unless it is a retry of a request with the same "Idempotency-Key" header
+
+    Responses for requests with the header are recorded in Redis and replayed for retries without calling ``handler`` again.
+    If ``handler`` raises or returns a server error, the key is released so the request can be retried.
+    """
+
+    idem_key = request.headers.get(IDEMPOTENCY_HEADER, None)
+
+    if not idem_key:
+        return handler()
+
+    fingerprint = IdempotencyStore.fingerprint(request.get_data())
+
+    try:
+        recorded = IdempotencyStore.begin(current_app.redis_helper, scope, idem_key, fingerprint)
+    except IdempotencyError as ex:
+        raise MinderWebError(str(ex), status_code=ex.status_code, payload={'idempotency_key': idem_key}, base_exception=ex) from ex
+
+    if recorded:
+        resp = Response(recorded.body, status=recorded.status, content_type=recorded.content_type)
+        resp.headers[IDEMPOTENCY_REPLAY_HEADER] = 'true'
+        return resp
+
+    try:
+        resp = handler()
+    except Exception:
+        IdempotencyStore.release(current_app.redis_helper, scope, idem_key)
+        raise
+
+    if resp.status_code >= 500:
+        IdempotencyStore.release(current_app.redis_helper, scope, idem_key)
+    else:
+        recorded = IdempotentResponse(status=resp.status_code, body=resp.get_data(as_text=True), content_type=resp.content_type)
+        IdempotencyStore.complete(current_app.redis_helper, scope, idem_key, fingerprint, recorded)
+
+    return resp
+
+
+def _list_reminders(exclude: typing.List[str], member_id: typing.Optional[str], channel_id: typing.Optional[str]) -> Response:
+    rems = []
+
+    for r_key in current_app.redis_helper.keys(redis_id='reminders', use_encoding='utf-8'):
+        rem = Reminder.fetch(current_app.redis_helper, redis_id='reminders', redis_name=r_key)
+
+        if 'complete' in exclude and rem.is_complete:
+            continue
+
+        if 'notified' in exclude and rem.user_notified:
+            continue
+
+        if member_id and int(member_id) != rem.member_id:
+            continue
+
+        if channel_id and int(channel_id) != rem.channel_id:
+            continue
+
+        rems.append(rem)
+
+    msg_out = 'No reminders found' if not rems else f'Found #{len(rems)} reminders'
+    return jsonify({'message': msg_out, 'count': len(rems), 'is_error': False, 'data': rems})
+
+
 @api_bp.route('/reminders', methods=['GET', 'POST', 'PUT'])
 def reminders():
     if request.method == 'GET':
@@ -19,29 +125,23 @@ def reminders():
         member_id = request.args.get('member_id', None)
         channel_id = request.args.get('channel_id', None)
 
-        rems = []
-
-        for r_key in current_app.redis_helper.keys(redis_id='reminders', use_encoding='utf-8'):
-            rem = Reminder.fetch(current_app.redis_helper, redis_id='reminders', redis_name=r_key)
-
-            if 'complete' in exclude and rem.is_complete:
-                continue
+        # Answer conditional requests from the version counters before touching the reminders hash
+        etag = Reminder.build_etag(current_app.redis_helper, member_id=int(member_id) if member_id else None,
+                                   include_complete='complete' not in exclude)
+        not_modified = _not_modified(etag)
 
-            if 'notified' in exclude and rem.user_notified:
-                continue
+        if not_modified:
+            return not_modified
 
-            if member_id and int(member_id) != rem.member_id:
-                continue
+        resp = _cached_response('reminders', etag, lambda: _list_reminders(exclude, member_id, channel_id))
+        resp.set_etag(etag)
+        return resp
 
-            if channel_id and int(channel_id) != rem.channel_id:
-                continue
-
-            rems.append(rem.as_dict())
+    # Handle POST / PUT request
+    return _idempotent_response('reminders', _create_reminder)
 
-        msg_out = 'No reminders found' if not rems else f'Found #{len(rems)} reminders'
-        return jsonify({'message': msg_out, 'count': len(rems), 'is_error': False, 'data': rems})
 
-    # Handle POST / PUT request
+def _create_reminder() -> Response:
     form_dict = request.form.to_dict()
     req_attrs = ['when', 'content', 'member_id', 'member_name']
 
@@ -79,7 +179,7 @@ def reminders():
         raise MinderWebError(f'Error building new reminder for "{when}": {ex}', status_code=500, payload=form_dict, base_exception=ex) from ex
 
     try:
-        rem.store(current_app.redis_helper)
+        rem.store(current_app.redis_helper, event_action='create')
     except Exception as ex:
         raise MinderWebError(f'Error storing new reminder for "{when}" in Redis: {ex}', status_code=500, payload=form_dict, base_exception=ex) from ex
 
@@ -87,8 +187,36 @@ def reminders():
     return jsonify({'message': msg_out, 'is_error': False, 'data': {'reminder': rem.as_dict()}})
 
 
-@api_bp.route('/reminders/<id>', methods=['GET', 'DELETE', 'PATCH'])
-def reminder_by_id(id):
+@api_bp.route('/reminders/batch', methods=['POST'])
+def reminders_batch():
+    return _idempotent_response('reminders_batch', _apply_reminder_batch)
+
+
+def _apply_reminder_batch() -> Response:
+    try:
+        batch = ReminderBatch.parse(request.get_json(silent=True))
+    except MinderError as ex:
+        raise MinderWebError(f'Invalid reminder batch: {ex}', status_code=400, base_exception=ex) from ex
+
+    try:
+        applied = batch.apply(current_app.redis_helper)
+    except Exception as ex:
+        raise MinderWebError(f'Error storing reminder batch in Redis: {ex}', status_code=500, base_exception=ex) from ex
+
+    results = batch.results()
+
+    if not applied:
+        num_errors = len([item for item in batch.items if item.error])
+        msg_out = f'Rejected reminder batch: #{num_errors} of #{len(batch.items)} operations are invalid. No changes were made'
+        resp = jsonify({'message': msg_out, 'count': len(batch.items), 'is_error': True, 'data': results})
+        resp.status_code = 400
+        return resp
+
+    logger.info(f'Applied batch of #{len(results)} reminder operations requested via API by "{request.remote_addr}"')
+    return jsonify({'message': f'Successfully applied #{len(results)} reminder operations', 'count': len(results), 'is_error': False, 'data': results})
+
+
+def _fetch_reminder(id: str) -> Reminder:
     try:
         rem = Reminder.fetch(current_app.redis_helper, redis_id='reminders', redis_name=id)
     except Exception as ex:
@@ -97,67 +225,151 @@ def reminder_by_id(id):
     if not rem:
         raise MinderWebError(f'No reminder found with ID "{id}"', status_code=404, payload={'id': id})
 
-    # Handle HTTP GET for fetching individual reminder
+    return rem
+
+
+@api_bp.route('/reminders/<id>', methods=['GET', 'DELETE', 'PATCH'])
+def reminder_by_id(id):
     if request.method == 'GET':
-        return jsonify(rem.as_dict())
+        try:
+            etag = Reminder.build_entry_etag(current_app.redis_helper, id)
+        except Exception as ex:
+            raise MinderWebError(f'Error fetching reminder ID "{id}": {ex}', status_code=500, payload={'id': id}, base_exception=ex) from ex
+
+        if not etag:
+            raise MinderWebError(f'No reminder found with ID "{id}"', status_code=404, payload={'id': id})
+
+        not_modified = _not_modified(etag)
+
+        if not_modified:
+            return not_modified
+
+        resp = _cached_response(f'reminder:{id}', etag, lambda: jsonify(_fetch_reminder(id).as_dict()))
+        resp.set_etag(etag)
+        return resp
 
     # Handle HTTP DELETE for removing a particular reminder
     if request.method == 'DELETE':
+        rem = _fetch_reminder(id)
         logger.info(f'Deleting reminder "{id}" as requested via API by "{request.remote_addr}"')
         rem.delete(current_app.redis_helper)
 
         return jsonify({'message': f'Deleted reminder "{id}" successfully', 'data': {}, 'is_error': False})
 
     # Lastly, handle HTTP PATCH for updating a particular reminder
-
     form_dict = request.form.to_dict()
-    reminder_fields = Reminder.get_entry_fields(include_redis_fields=False, include_internal_fields=False)
 
-    for attr_name, attr_val in form_dict.items():
-        if attr_name not in reminder_fields:
-            raise MinderWebError(f'Invalid attribute provided in PATCH of reminder ID {id}: Invalid attribute "{attr_name}"', payload=form_dict)
+    try:
+        changes = REMINDER_PATCH_PLAN.coerce(form_dict)
+    except MinderError as ex:
+        raise MinderWebError(f'Invalid PATCH of reminder ID {id}: {ex}', payload=form_dict, base_exception=ex) from ex
 
-        # TODO: This is already too complicated to be nested in a for loop. Break this out into a private method
-        # This is also a good chance to offer some decorator validation optoins within redisent to help with this
+    try:
+        res = Reminder.update(current_app.redis_helper, id, changes)
+    except Exception as ex:
+        raise MinderWebError(f'Error with Redis while storing updated reminder ID {id}: {ex}', payload=form_dict, base_exception=ex) from ex
 
-        fld = reminder_fields[attr_name]
-        attr_type = fld.type
-        do_cast = True
+    if not res:
+        raise MinderWebError(f'No reminder found with ID "{id}"', status_code=404, payload={'id': id})
 
-        if isinstance(attr_type, str):
-            if not fld.default_factory or fld.default_factory == dataclasses._MISSING_TYPE:
-                logger.info(f'Found field type of "{attr_type}" for "{attr_name}" and no default factory. Skipping validation.')
-                do_cast = False
-            else:
-                attr_type = fld.default_factory
+    rem, changed = res
+    msg_out = f'Successfully updated reminder ID {id} with new attributes.' if changed else f'No changes to reminder ID {id}.'
+    return jsonify({'message': msg_out, 'data': {'form': form_dict, 'new_reminder': rem.as_dict(), 'changed': changed}, 'is_error': False})
 
-        if do_cast:
-            if isinstance(attr_type, typing._GenericAlias):
-                # If using a Optional, Union, etc then all subclasses will share this root generic alias
-                # base class. If the field type is one of these, the first item in the "__args__" entry
-                # will be the actual type
-                attr_type = attr_type.__args__[0]
 
-            try:
-                logger.info(f'casting "{attr_val}" as "{attr_type}"')
-                attr_test = attr_type(attr_val)
-                attr_val = attr_test
-            except Exception as ex:
-                err_message = f'Invalid attribute value provided for "{attr_name}". Field is of the type "{attr_type}" and the validation failed with: {ex}'
-                raise MinderWebError(err_message, payload=form_dict, base_exception=ex) from ex
+@api_bp.route('/status', methods=['GET'])
+def status():
+    action = request.args.get('action', None)
+    guild_id = request.args.get('guild_id', None, type=int)
+    start = request.args.get('start', None, type=float)
+    end = request.args.get('end', None, type=float)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    newest_first = request.args.get('order', 'desc').lower() != 'asc'
 
-        setattr(rem, attr_name, attr_val)
+    if action and action.upper() not in StatusEntryActions:
+        raise MinderWebError(f'Invalid status action provided: "{action}"', status_code=400, payload=request.args.to_dict())
 
     try:
-        rem.store(current_app.redis_helper)
+        entries = StatusEntry.query(current_app.redis_helper, action=action, guild_id=guild_id, start=start, end=end, limit=limit,
+                                    newest_first=newest_first)
     except Exception as ex:
-        raise MinderWebError(f'Error with Redis while storing updated reminder ID {id}: {ex}', payload=form_dict, base_exception=ex) from ex
+        raise MinderWebError(f'Error querying status entries: {ex}', status_code=500, payload=request.args.to_dict(), base_exception=ex) from ex
+
+    msg_out = 'No status entries found' if not entries else f'Found #{len(entries)} status entries'
+    return jsonify({'message': msg_out, 'count': len(entries), 'is_error': False, 'data': entries})
 
-    msg_out = f'Successfully updated reminder ID {id} with new attributes.'
-    return jsonify({'message': msg_out, 'data': {'form': form_dict, 'new_reminder': rem.as_dict()}, 'is_error': False})
+
+@api_bp.route('/activity', methods=['GET'])
+def activity():
+    resolution = request.args.get('resolution', 'hour')
+    scope = request.args.get('scope', 'all')
+    scope_id = request.args.get('scope_id', None, type=int)
+    action = request.args.get('action', None)
+    num_buckets = min(request.args.get('buckets', 24, type=int), 1440)
+
+    if action and action.upper() not in StatusEntryActions:
+        raise MinderWebError(f'Invalid status action provided: "{action}"', status_code=400, payload=request.args.to_dict())
+
+    try:
+        buckets = ActivityCounters.read(current_app.redis_helper, resolution=resolution, scope=scope, scope_id=scope_id, action=action,
+                                        num_buckets=num_buckets)
+        totals = ActivityCounters.totals(current_app.redis_helper, StatusEntryActions, resolution=resolution, scope=scope, scope_id=scope_id,
+                                         num_buckets=num_buckets)
+    except MinderError as ex:
+        raise MinderWebError(f'Invalid activity query: {ex}', status_code=400, payload=request.args.to_dict(), base_exception=ex) from ex
+
+    data = {'resolution': resolution, 'scope': scope, 'scope_id': scope_id, 'action': action, 'totals': totals,
+            'buckets': [{'timestamp': bucket_ts, 'count': cnt} for bucket_ts, cnt in buckets]}
+
+    return jsonify({'message': f'Found #{sum(totals.values())} events across #{len(buckets)} buckets', 'is_error': False, 'data': data})
 
 
 @api_bp.route('/users', methods=['GET'])
 def users():
     from minder.web.model import User
-    return jsonify({'users': [usr.dump() for usr in User.query.all()]})
+
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    fields = [fld.strip() for fld in request.args.get('fields', '').split(',') if fld.strip()]
+    filters = {}
+
+    for attr_name in ['enabled', 'is_admin']:
+        if request.args.get(attr_name, None):
+            try:
+                filters[attr_name] = to_bool(request.args[attr_name])
+            except ValueError as ex:
+                raise MinderWebError(f'Invalid value for "{attr_name}": {ex}', status_code=400, payload=request.args.to_dict(), base_exception=ex) from ex
+
+    def _list_users() -> Response:
+        try:
+            page, next_after_id = User.get_page(after_id=after_id, limit=limit, columns=fields, **filters)
+        except MinderError as ex:
+            raise MinderWebError(f'Invalid users query: {ex}', status_code=400, payload=request.args.to_dict(), base_exception=ex) from ex
+
+        return jsonify({'users': page, 'count': len(page), 'next_after_id': next_after_id, 'has_more': next_after_id is not None})
+
+    version = f'users-{User.get_version(current_app.redis_helper)}'
+    resp = _cached_response('users', version, _list_users)
+    resp.set_etag(version)
+    return resp
+
+
+@api_bp.route('/cache', methods=['GET'])
+def response_cache():
+    data = current_app.response_cache.stats()
+    data['identities'] = current_app.identity_cache.stats()
+
+    return jsonify({'message': 'Response cache statistics for this worker', 'is_error': False, 'data': data})
+
+
+@api_bp.route('/cache', methods=['DELETE'])
+@login_required
+def clear_response_cache():
+    if not current_user.is_admin:
+        raise MinderWebError(f'User "{current_user.username}" is not allowed to clear the response cache', status_code=403)
+
+    namespace = request.args.get('namespace', None)
+    removed = current_app.response_cache.invalidate_namespace(namespace)
+
+    logger.info(f'Removed #{removed} cached responses (namespace: {namespace or "all"}) as requested by "{current_user.username}"')
+    return jsonify({'message': f'Removed #{removed} cached responses', 'is_error': False, 'data': current_app.response_cache.stats()})
@@ -1,8 +1,10 @@
 import logging
 
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app
 from flask_login import current_user, login_required, login_user, logout_user
 
+from minder.errors import MinderWebError
+from minder.models import ActivityCounters, StatusEntry, StatusEntryActions
 from minder.web.forms import LoginForm
 
 app_bp = Blueprint('app', __name__)
@@ -21,7 +23,7 @@ def login():
 
     if request.method == 'POST' and form.validate_on_submit():
         logger.debug(f'Looking up user information for "{form.username.data}"')
-        user = User.query.filter_by(username=form.username.data).first()
+        user = User.get_by('username', form.username.data)
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password', 'error')
             logger.warning(f'Received invalid login for "{form.username.data}".')
@@ -50,7 +52,27 @@ def overview():
 @app_bp.route('/report')
 @login_required
 def report():
-    return render_template('report.j2', title='User/Guild Report')
+    action = request.args.get('action', None)
+    guild_id = request.args.get('guild_id', None, type=int)
+    start = request.args.get('start', None, type=float)
+    end = request.args.get('end', None, type=float)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+
+    if action and action.upper() not in StatusEntryActions:
+        raise MinderWebError(f'Invalid status action provided: "{action}"', status_code=400, payload=request.args.to_dict())
+
+    entries = StatusEntry.query(current_app.redis_helper, action=action, guild_id=guild_id, start=start, end=end, limit=limit)
+
+    report_headers = {'timestamp': 'Time', 'action': 'Action', 'guild_id': 'Guild ID', 'message': 'Message'}
+    report_items = {ent.redis_name: {'timestamp': ent.timestamp.ctime(), 'action': ent.action, 'guild_id': ent.guild_id or '', 'message': ent.message}
+                    for ent in entries}
+
+    activity_scope = 'guild' if guild_id else 'all'
+    activity = ActivityCounters.totals(current_app.redis_helper, StatusEntryActions, resolution='hour', scope=activity_scope, scope_id=guild_id,
+                                       num_buckets=24)
+
+    return render_template('report.j2', title='User/Guild Report', report_headers=report_headers, report_items=report_items,
+                           activity=activity)
 
 
 @app_bp.route('/manage', methods=['GET'])
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class VersionedCache:
+    """
+    Per-worker LRU cache where each entry is only valid for the version it was stored with
+
+    Each entry is stored alongside the version token (i.e. a reminder entity tag or the users version counter) that was
+    current when it was built. Lookups must provide the current version token and entries with a different token are
+    treated as a miss and dropped. Since the version tokens are maintained in Redis by the writes themselves, entries are
+    invalidated as soon as the underlying data changes in any process. An optional TTL bounds how long entries are used.
+    """
+
+    max_size: int
+    ttl: Optional[float]
+
+    _entries: OrderedDict
+    _lock: threading.Lock
+
+    def __init__(self, max_size: int = 256, ttl: float = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        """
+        Returns the cached value for ``key`` if it was stored at ``version`` (otherwise ``None``)
+        """
+
+        if self.max_size <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            ent_version, expires_at, value = entry
+
+            if ent_version != version or (expires_at and expires_at < time.monotonic()):
+                self.misses += 1
+                self.stale += 1
+                del self._entries[key]
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, version: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            self._entries[key] = (version, expires_at, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, match: Callable[[Hashable], bool] = None) -> int:
+        """
+        Drop all cached entries (or only those with keys for which ``match`` returns ``True``), returning the number removed
+        """
+
+        with self._lock:
+            if match is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+
+            keys = [key for key in self._entries if match(key)]
+
+            for key in keys:
+                del self._entries[key]
+
+            return len(keys)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Mapping[str, Any]:
+        return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses, 'stale': self.stale,
+                'evictions': self.evictions, 'hit_ratio': round(self.hit_ratio, 4)}
+
+
+class ResponseCache(VersionedCache):
+    """
+    Per-worker cache of rendered API responses keyed by endpoint and normalized query arguments
+
+    Entries are not expired by TTL since the version tokens change as soon as the underlying data does.
+    """
+
+    @classmethod
+    def build_key(cls, namespace: str, args: Mapping[str, Any] = None) -> CacheKey:
+        """
+        Build a cache key for ``namespace`` from normalized request arguments
+
+        Arguments are sorted by name and the items of comma-separated values are sorted so that equivalent requests (i.e.
+        ``?exclude=notified,complete`` and ``?exclude=complete,notified``) share an entry. Names and values are otherwise kept
+        as provided (the handlers are case-sensitive and may reject values differing only in case or duplicates) and only
+        empty arguments are ignored.
+        """
+
+        norm_args = []
+
+        for arg_name, arg_val in (args or {}).items():
+            arg_val = str(arg_val) if arg_val is not None else ''
+
+            if not arg_val:
+                continue
+
+            if ',' in arg_val:
+                arg_val = ','.join(sorted(arg_val.split(',')))
+
+            norm_args.append((arg_name, arg_val))
+
+        return (namespace, tuple(sorted(norm_args)))
+
+    def invalidate_namespace(self, namespace: str = None) -> int:
+        return self.invalidate(None if namespace is None else lambda key: key[0] == namespace)
+
+
+class IdentityCache(VersionedCache):
+    """
+    Per-worker cache of the column values of logged in users for the login manager user loader
+
+    Entries are keyed by user ID and validated against the users version counter which is bumped whenever a user is
+    added, changed (including password changes) or removed, whether from the web application or the ``users`` CLI commands.
+    The TTL additionally bounds how long an identity is reused without reloading it from the database.
+    """
+
+    def __init__(self, max_size: int = 128, ttl: float = 300) -> None:
+        super().__init__(max_size=max_size, ttl=ttl)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import logging
+
+from typing import Any, Callable, Iterable, Iterator, List, MutableMapping, Tuple
+
+from minder.compression import NO_BODY_STATUS, SUPPORTED_ENCODINGS, StreamCompressor, is_compressible, negotiate_encoding, weak_etag
+
+logger = logging.getLogger(__name__)
+
+Headers = List[Tuple[str, str]]
+
+
+def _get_header(headers: Headers, name: str) -> str:
+    name = name.lower()
+    return next((value for hdr_name, value in headers if hdr_name.lower() == name), None)
+
+
+def _set_header(headers: Headers, name: str, value: str = None) -> Headers:
+    """
+    Returns ``headers`` without any ``name`` headers, plus ``name`` set to ``value`` (if provided)
+    """
+
+    new_headers = [(hdr_name, hdr_value) for hdr_name, hdr_value in headers if hdr_name.lower() != name.lower()]
+
+    if value is not None:
+        new_headers.append((name, value))
+
+    return new_headers
+
+
+def _add_vary(headers: Headers) -> Headers:
+    vary = _get_header(headers, 'Vary')
+
+    if not vary:
+        return _set_header(headers, 'Vary', 'Accept-Encoding')
+
+    if 'accept-encoding' in vary.lower() or vary.strip() == '*':
+        return headers
+
+    return _set_header(headers, 'Vary', f'{vary}, Accept-Encoding')
+
+
+class CompressionMiddleware:
+    """
+    WSGI middleware compressing responses with the best encoding accepted by the client (zstd, brotli or gzip)
+
+    Only responses with a compressible content type (see :py:data:`minder.compression.COMPRESSIBLE_TYPES`) of at least
+    ``min_size`` bytes are compressed. Responses without a "Content-Length" (i.e. streamed exports) are buffered until
+    ``min_size`` bytes are available and then compressed chunk by chunk as they are produced rather than all at once.
+
+    Responses which already have a "Content-Encoding" or a "Cache-Control: no-transform" are passed through unchanged.
+    """
+
+    def __init__(self, wsgi_app: Callable, min_size: int = 500, level: int = 6, encodings: Iterable[str] = None) -> None:
+        self.wsgi_app = wsgi_app
+        self.min_size = int(min_size)
+        self.level = int(level)
+        self.encodings = list(encodings or SUPPORTED_ENCODINGS)
+
+    def __call__(self, environ: MutableMapping[str, Any], start_response: Callable) -> Iterable[bytes]:
+        encoding = negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', None), self.encodings)
+
+        if not encoding or environ.get('REQUEST_METHOD', 'GET') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+
+        captured: MutableMapping[str, Any] = {'written': []}
+
+        def _start_response(status: str, headers: Headers, exc_info: Any = None) -> Callable[[bytes], None]:
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+            return captured['written'].append
+
+        app_iter = self.wsgi_app(environ, _start_response)
+        return self._respond(app_iter, captured, start_response, encoding)
+
+    def _should_compress(self, status: str, headers: Headers) -> bool:
+        if int(status.split(' ', 1)[0]) in NO_BODY_STATUS or _get_header(headers, 'Content-Encoding'):
+            return False
+
+        if 'no-transform' in (_get_header(headers, 'Cache-Control') or '').lower():
+            return False
+
+        content_length = _get_header(headers, 'Content-Length')
+
+        if content_length is not None and int(content_length) < self.min_size:
+            return False
+
+        return True
+
+    def _respond(self, app_iter: Iterable[bytes], captured: MutableMapping[str, Any], start_response: Callable, encoding: str) -> Iterator[bytes]:
+        chunks = iter(app_iter)
+        buffered = captured['written']
+        size = sum(len(chunk) for chunk in buffered)
+        exhausted = False
+
+        try:
+            # Headers are only available once "start_response" has been called, which may not happen until the body is iterated
+            while 'status' not in captured and not exhausted:
+                try:
+                    chunk = next(chunks)
+                    buffered.append(chunk)
+                    size += len(chunk)
+                except StopIteration:
+                    exhausted = True
+
+            status, headers = captured['status'], captured['headers']
+            compress = is_compressible(_get_header(headers, 'Content-Type')) and self._should_compress(status, headers)
+
+            if compress and _get_header(headers, 'Content-Length') is None:
+                while size < self.min_size and not exhausted:
+                    try:
+                        chunk = next(chunks)
+                        buffered.append(chunk)
+                        size += len(chunk)
+                    except StopIteration:
+                        exhausted = True
+
+                compress = size >= self.min_size
+
+            if is_compressible(_get_header(headers, 'Content-Type')):
+                headers = _add_vary(headers)
+
+            if not compress:
+                start_response(status, headers, captured['exc_info'])
+                yield from buffered
+                yield from chunks
+                return
+
+            etag = _get_header(headers, 'ETag')
+
+            if etag:
+                headers = _set_header(headers, 'ETag', weak_etag(etag))
+
+            headers = _set_header(_set_header(headers, 'Content-Length'), 'Content-Encoding', encoding)
+            start_response(status, headers, captured['exc_info'])
+
+            compressor = StreamCompressor(encoding, level=self.level)
+            data = compressor.compress(b''.join(buffered))
+
+            if data:
+                yield data
+
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+
+                if data:
+                    yield data
+
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
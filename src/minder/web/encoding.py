@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import json
+import logging
+
+from flask import Flask, Response
+from typing import Any
+
+from minder.encoding import JSON_BACKEND, default, dumps, dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    # Flask before 2.2 only supports customizing the encoder class (see "MinderJSONEncoder")
+    DefaultJSONProvider = None
+
+
+class MinderJSONEncoder(json.JSONEncoder):
+    """
+    JSON encoder for Flask before 2.2 which supports the same types as :py:func:`minder.encoding.default`
+    """
+
+    def default(self, obj: Any) -> Any:
+        return default(obj)
+
+
+if DefaultJSONProvider:
+    class MinderJSONProvider(DefaultJSONProvider):
+        """
+        Flask JSON provider which encodes using :py:mod:`minder.encoding` (orjson when installed)
+
+        Responses from ``jsonify`` are encoded straight to bytes. Keys are sorted (as with the default provider) unless
+        ``sort_keys`` is disabled and responses are pretty-printed in debug mode unless ``compact`` is set.
+        """
+
+        def dumps(self, obj: Any, **kwargs) -> str:
+            if kwargs:
+                # Options specific to the built in json module (i.e. "cls") are passed through to it
+                kwargs.setdefault('default', default)
+                return json.dumps(obj, **kwargs)
+
+            return dumps(obj, sort_keys=self.sort_keys)
+
+        def loads(self, s: Any, **kwargs) -> Any:
+            if kwargs:
+                return json.loads(s, **kwargs)
+
+            return loads(s)
+
+        def response(self, *args, **kwargs) -> Response:
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+
+            return self._app.response_class(dumps_bytes(obj, indent=indent, sort_keys=self.sort_keys), mimetype=self.mimetype)
+else:
+    MinderJSONProvider = None
+
+
+def init_json(app: Flask) -> None:
+    """
+    Use the minder JSON encoding for ``app`` (with a provider for Flask 2.2+ or an encoder class otherwise)
+    """
+
+    if MinderJSONProvider:
+        app.json = MinderJSONProvider(app)
+    else:
+        app.json_encoder = MinderJSONEncoder
+        logger.debug(f'Flask does not support JSON providers. Using built in json module rather than "{JSON_BACKEND}"')
@@ -2,9 +2,15 @@ from __future__ import annotations
 
 import logging
 
-from typing import List, Mapping, Any, Optional
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Any, Optional, Sequence, Tuple
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy, Model
 from flask_login import UserMixin
+from redisent.helpers import RedisentHelper
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from minder.errors import MinderError
@@ -12,47 +18,167 @@ from minder.errors import MinderError
 logger = logging.getLogger(__name__)
 ModelMapping = Mapping[str, Any]
 
+USERS_VERSION_KEY = 'users:version'
+
+
+@dataclass(frozen=True)
+class ColumnMetadata:
+    """
+    Column names of a model, computed once per model class
+    """
+
+    all_columns: Tuple[str, ...]
+    public_columns: Tuple[str, ...]
+    private_columns: Tuple[str, ...]
+    public_set: FrozenSet[str]
+
+
+_column_metadata: Dict[type, ColumnMetadata] = {}
+
 
 class SAModel(Model):
     @classmethod
     def get_private_columns(cls) -> List[str]:
         return []
 
+    @classmethod
+    def column_metadata(cls) -> ColumnMetadata:
+        """
+        Returns the cached column metadata for this model, building it from the SQLAlchemy class manager on first use
+        """
+
+        meta = _column_metadata.get(cls, None)
+
+        if meta is None:
+            private_columns = cls.get_private_columns()
+            all_columns = tuple([attr for attr in cls._sa_class_manager.keys() if not attr.startswith('_')])
+            public_columns = tuple([attr for attr in all_columns if attr not in private_columns])
+
+            meta = ColumnMetadata(all_columns=all_columns, public_columns=public_columns, public_set=frozenset(public_columns),
+                                  private_columns=tuple([attr for attr in all_columns if attr in private_columns]))
+            _column_metadata[cls] = meta
+
+        return meta
+
     @classmethod
     def get_column_names(cls, exclude_private: bool = True) -> List[str]:
-        excluded = cls.get_private_columns() if exclude_private else []
-        return list([attr for attr in cls._sa_class_manager.keys() if not attr.startswith('_') and attr not in excluded])
+        meta = cls.column_metadata()
+        return list(meta.public_columns if exclude_private else meta.all_columns)
 
     @classmethod
     def has_column(cls, name: str) -> bool:
-        return name in cls.get_column_names(exclude_private=True)
+        return name in cls.column_metadata().public_set
 
     def dump(self, exclude_private: bool = True) -> ModelMapping:
-        return {attr: getattr(self, attr) for attr in self.get_column_names(exclude_private=exclude_private)}
+        meta = self.column_metadata()
+        return {attr: getattr(self, attr) for attr in (meta.public_columns if exclude_private else meta.all_columns)}
+
+    @classmethod
+    def dump_many(cls, models: Iterable[SAModel], columns: Sequence[str] = None, exclude_private: bool = True) -> List[ModelMapping]:
+        """
+        Serialize many models at once, optionally only including the provided ``columns``
+
+        The column names and attribute getter are resolved once for the whole list rather than once per model.
+        """
+
+        meta = cls.column_metadata()
+
+        if columns:
+            invalid = [col for col in columns if col not in (meta.public_set if exclude_private else meta.all_columns)]
+
+            if invalid:
+                raise MinderError(f'Cannot dump "{cls.model_name()}" columns "{", ".join(invalid)}": No such column')
+
+            columns = tuple(columns)
+        else:
+            columns = meta.public_columns if exclude_private else meta.all_columns
+
+        if len(columns) == 1:
+            return [{columns[0]: getattr(model, columns[0])} for model in models]
+
+        getter = attrgetter(*columns)
+        return [dict(zip(columns, getter(model))) for model in models]
 
     @classmethod
     def model_name(cls) -> str:
-        return cls.__class__.__qualname__
+        return cls.__qualname__
 
     @classmethod
     def from_dict(cls, model_dict: ModelMapping) -> SAModel:
-        column_names = cls.get_column_names(exclude_private=True)
-        model_kwargs = {attr: val for attr, val in model_dict.items() if attr in column_names}
+        public_set = cls.column_metadata().public_set
+        model_kwargs = {attr: val for attr, val in model_dict.items() if attr in public_set}
 
         return cls(**model_kwargs)
 
     @classmethod
     def get_by(cls, attr_name: str, value: Any) -> Optional[SAModel]:
+        """
+        Fetch the model with ``value`` for the column ``attr_name`` in a single query
+
+        At most two rows are loaded in order to detect duplicates. If more than one model matches, a :py:class:`MinderError` is raised
+        rather than picking one arbitrarily.
+        """
+
         if not cls.has_column(attr_name):
             raise MinderError(f'Cannot fetch "{cls.model_name()}" by "{attr_name}": No such column')
 
-        qry = cls.query.filter_by(attr_name=value)
-        cnt = qry.count()
+        matches = cls.query.filter_by(**{attr_name: value}).limit(2).all()
+
+        if len(matches) > 1:
+            raise MinderError(f'Request to fetch "{cls.model_name()}" by "{attr_name}" found multiple results')
 
-        if cnt > 1:
-            logger.warning(f'Request to fetch "{cls.model_name()}" by "{attr_name}" found #{cnt} results. Returning first match')
+        return matches[0] if matches else None
+
+    @classmethod
+    def get_many(cls, attr_name: str, values: Iterable[Any]) -> List[SAModel]:
+        """
+        Fetch all models where the column ``attr_name`` is one of ``values`` using a single ``IN`` query
+        """
+
+        if not cls.has_column(attr_name):
+            raise MinderError(f'Cannot fetch "{cls.model_name()}" by "{attr_name}": No such column')
+
+        values = list(set(values))
+
+        if not values:
+            return []
+
+        return cls.query.filter(getattr(cls, attr_name).in_(values)).all()
+
+    @classmethod
+    def get_page(cls, after_id: int = 0, limit: int = 50, columns: Sequence[str] = None,
+                 **filters: Any) -> Tuple[List[ModelMapping], Optional[int]]:
+        """
+        Fetch and serialize a single page of models using keyset pagination on ``id``
 
-        return qry.first()
+        Only the requested columns (plus ``id``) of at most ``limit`` + 1 rows are loaded. The extra row is only used to find
+        out if there is another page.
+
+        :param after_id: only return models with an ID greater than this (i.e. the ``next_after_id`` of the previous page)
+        :param limit: maximum number of models to return
+        :param columns: optional public columns to return (default is all public columns)
+        :param filters: optional column values to filter on
+        :returns: the serialized models and the ``after_id`` for the next page (or ``None`` if this is the last page)
+        """
+
+        meta = cls.column_metadata()
+        invalid = [name for name in list(filters) + list(columns or []) if name not in meta.public_set]
+
+        if invalid:
+            raise MinderError(f'Cannot fetch "{cls.model_name()}" page by "{", ".join(invalid)}": No such column')
+
+        columns = tuple(columns) if columns else meta.public_columns
+        query_columns = columns if 'id' in columns else ('id',) + columns
+
+        qry = cls.query.with_entities(*[getattr(cls, col) for col in query_columns]).filter(cls.id > after_id)
+
+        if filters:
+            qry = qry.filter_by(**filters)
+
+        rows = qry.order_by(cls.id).limit(limit + 1).all()
+        next_after_id = rows[limit - 1].id if len(rows) > limit else None
+
+        return cls.dump_many(rows[:limit], columns=columns), next_after_id
 
     def __repr__(self) -> str:
         attrs = ', '.join([f'{attr}="{val}"' for attr, val in self.dump(exclude_private=True).items()])
@@ -66,10 +192,10 @@ class User(db.Model, UserMixin):  # type: ignore[name-defined]
     __tablename__ = 'users'
 
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String, unique=True, nullable=False)
+    username = db.Column(db.String, unique=True, index=True, nullable=False)
     password_hash = db.Column(db.String, nullable=False)
-    enabled = db.Column(db.Boolean, default=True)
-    is_admin = db.Column(db.Boolean, default=False)
+    enabled = db.Column(db.Boolean, default=True, index=True)
+    is_admin = db.Column(db.Boolean, default=False, index=True)
 
     def set_password(self, password: str) -> None:
         self.password_hash = generate_password_hash(password)
@@ -93,7 +219,88 @@ class User(db.Model, UserMixin):  # type: ignore[name-defined]
         new_pw: str = generate_password_hash(raw_password)
         return new_pw
 
+    @classmethod
+    def get_version(cls, helper: RedisentHelper) -> int:
+        """
+        Returns the current version of the users table which increases every time a user is added, updated or removed
+        """
+
+        with helper.wrapped_redis('get_version("users")') as r_conn:
+            version = r_conn.get(USERS_VERSION_KEY)
+
+        return int(version or 0)
+
+    @classmethod
+    def bump_version(cls, helper: RedisentHelper) -> int:
+        with helper.wrapped_redis('bump_version("users")') as r_conn:
+            return int(r_conn.incr(USERS_VERSION_KEY))
+
     @classmethod
     def build(cls, username: str, password: str, enabled: bool = True, is_admin: bool = False) -> User:
         pw_hash = password if password.startswith('pbkdf2:sha256:') else User.generate_password(password)
         return User(username=username, password_hash=pw_hash, enabled=enabled, is_admin=is_admin)
+
+
+class UserIdentity(UserMixin):
+    """
+    Read-only identity of a logged in user served from the identity cache (see :py:meth:`minder.web.app.FlaskApp._load_user`)
+
+    Holds the public column values of a ``User`` without a database session or the password hash. Setting attributes
+    raises an ``AttributeError``. Use :py:meth:`load` to fetch the ``User`` model for anything that changes the user.
+    """
+
+    def __init__(self, user_data: ModelMapping) -> None:
+        object.__setattr__(self, '_user_data', dict(user_data))
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.__dict__['_user_data'][name]
+        except KeyError:
+            raise AttributeError(f'"{type(self).__name__}" has no attribute "{name}"') from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'Cached identity of user "{self.username}" is read-only. Use "load()" to change the user')
+
+    def __repr__(self) -> str:
+        attrs = ', '.join([f'{attr}="{val}"' for attr, val in self._user_data.items()])
+        return f'UserIdentity({attrs})'
+
+    def load(self) -> Optional[User]:
+        """
+        Load the ``User`` model for this identity from the database
+        """
+
+        return User.query.get(self.id)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _on_user_changed(mapper, connection, target: User) -> None:
+    # Only flag the change here. The version is bumped once the change is committed so that other workers cannot reload
+    # the old values under the new version
+    session = object_session(target)
+
+    if session is not None:
+        session.info['users_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_session_commit(session: Session) -> None:
+    if not session.info.pop('users_changed', False):
+        return
+
+    # Only applications provide a Redis helper. Changes made outside of an application context (i.e. scripts using the
+    # models directly) cannot be tracked
+    if not has_app_context() or not getattr(current_app, 'redis_helper', None):
+        return
+
+    try:
+        User.bump_version(current_app.redis_helper)
+    except Exception as ex:
+        logger.warning(f'Failed to update users version after committing user changes: {ex}')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_session_rollback(session: Session) -> None:
+    session.info.pop('users_changed', None)
@@ -1,6 +1,8 @@
 import discord
 import pytest
 
+from pprint import pformat
+
 from minder.bot import build_bot
 
 
@@ -8,3 +10,343 @@ def test_start_bot():
     bot = build_bot(start_bot=False)
     with pytest.raises(discord.errors.LoginFailure):
         bot.run('asdf')
+
+
+def test_guild_snapshot():
+    from datetime import datetime
+    from types import SimpleNamespace
+    from minder.bot.state import GuildSnapshot
+
+    def _build_member(guild, member_id, name):
+        return SimpleNamespace(id=member_id, guild=guild, name=name, discriminator='1234', avatar_url=f'https://cdn/{member_id}.png',
+                               joined_at=datetime(2021, 5, 1), roles=[])
+
+    guild = SimpleNamespace(id=98765, name='pytest-server', description=None, owner_id=12345, members=[])
+    guild.members = [_build_member(guild, 12345, 'pytest'), _build_member(guild, 23456, 'pytest-two')]
+
+    snapshot = GuildSnapshot()
+    snapshot.rebuild([guild])
+    base_version = snapshot.version
+
+    assert set(snapshot.guilds_dict()[guild.id]['members']) == {12345, 23456}, 'Guild snapshot is missing members'
+    assert snapshot.changes_since(base_version) == [], 'Unexpected changes found for current snapshot version'
+
+    snapshot.set_member(_build_member(guild, 34567, 'pytest-three'))
+    snapshot.set_member(_build_member(guild, 12345, 'pytest-renamed'))
+    snapshot.remove_member(guild.id, 23456)
+
+    changes = {change['id']: change for change in snapshot.changes_since(base_version)}
+    assert changes[34567]['action'] == 'add' and changes[12345]['data']['name'] == 'pytest-renamed', f'Unexpected changes: {changes}'
+    assert changes[23456]['action'] == 'remove' and 'data' not in changes[23456], f'Unexpected change for removed member: {changes[23456]}'
+
+    assert snapshot.changes_since(base_version, epoch=snapshot.epoch + 1) is None, 'Changes returned for a different snapshot epoch'
+    assert snapshot.changes_since(base_version - 1) is None, 'Changes returned for a version older than the changelog'
+
+
+def test_member_index():
+    from types import SimpleNamespace
+    from minder.bot.state import MemberIndex
+
+    guild_one, guild_two = SimpleNamespace(id=1, members=[]), SimpleNamespace(id=2, members=[])
+    guild_one.members = [SimpleNamespace(id=member_id, name=name, guild=guild_one) for member_id, name in [(10, 'Alice'), (11, 'alfred'), (12, 'bob')]]
+    guild_two.members = [SimpleNamespace(id=10, name='Alice', guild=guild_two)]
+
+    index = MemberIndex()
+    index.rebuild([guild_one, guild_two])
+
+    assert index.get(10, guild_id=2) is guild_two.members[0], 'Member not indexed for second guild'
+    assert [mem.id for mem in index.find_prefix('AL', guild_id=1)] == [11, 10], 'Unexpected members for name prefix "AL"'
+    assert index.find_name('BOB').id == 12, 'Member not found by name'
+
+    guild_one.members[2].name = 'carol'
+    index.add(guild_one.members[2])
+    index.remove(1, 10)
+
+    assert not index.find_prefix('bob') and index.find_name('Carol').id == 12, 'Renamed member not re-indexed'
+    assert index.get(10) is guild_two.members[0] and index.get(10, guild_id=1) is None, 'Removed member still indexed'
+
+
+def test_guild_snapshot_query():
+    from datetime import datetime
+    from types import SimpleNamespace
+    from minder.bot.state import GuildSnapshot, MemberQuery
+
+    def _build_member(guild, member_id, name, role_ids=()):
+        return SimpleNamespace(id=member_id, guild=guild, name=name, discriminator='1234', avatar_url='', joined_at=datetime(2021, 5, member_id),
+                               roles=[SimpleNamespace(id=role_id) for role_id in role_ids])
+
+    guild_one, guild_two = SimpleNamespace(id=1, name='one', description=None, owner_id=1), SimpleNamespace(id=2, name='two', description=None, owner_id=1)
+    guild_one.members = [_build_member(guild_one, 1, 'alice', [7]), _build_member(guild_one, 2, 'bob'), _build_member(guild_one, 3, 'alfred', [7])]
+    guild_two.members = [_build_member(guild_two, 1, 'alice'), _build_member(guild_two, 4, 'carl')]
+
+    snapshot = GuildSnapshot()
+    snapshot.rebuild([guild_one, guild_two])
+
+    page, next_key = snapshot.query_members(MemberQuery(), limit=3)
+    assert [(mem.guild_id, mem.id) for mem in page] == [(1, 1), (1, 2), (1, 3)] and next_key == (1, 3), f'Unexpected first page: {page}'
+
+    page, next_key = snapshot.query_members(MemberQuery(), after=next_key, limit=3)
+    assert [(mem.guild_id, mem.id) for mem in page] == [(2, 1), (2, 4)] and next_key is None, f'Unexpected last page: {page}'
+
+    page, _ = snapshot.query_members(MemberQuery(prefix='AL', role_id=7))
+    assert [(mem.guild_id, mem.id) for mem in page] == [(1, 1), (1, 3)], f'Unexpected members for prefix and role: {page}'
+
+    joined_after = datetime(2021, 5, 2).timestamp()
+    page, _ = snapshot.query_members(MemberQuery(guild_ids={2}, joined_after=joined_after))
+    assert [(mem.guild_id, mem.id) for mem in page] == [(2, 4)], f'Unexpected members for guild and join time: {page}'
+
+
+def test_command_timing():
+    import time
+    from minder.metrics import COMMAND_ERRORS
+    from minder.timing import CommandStats, begin_command, current_timing, finish_command, timed_phase
+
+    stats = CommandStats(slowest_size=2)
+
+    for idx, delay in enumerate([0.01, 0.03, 0.02]):
+        timing = begin_command('pytest', 'prefix', user='pytest#1234')
+        assert current_timing() is timing, 'Command timing not set for the current task'
+
+        with timed_phase('render'):
+            time.sleep(delay)
+
+        stats.record(finish_command(timing, failed=idx == 2))
+        assert current_timing() is None, 'Command timing still set after finishing the command'
+        assert timing.phases['render'] >= delay, f'Render phase not recorded. Found: {timing.phases}'
+
+    slowest = stats.slowest()
+    assert [round(timing.duration, 2) for timing in slowest] == [0.03, 0.02], f'Unexpected slowest invocations: {slowest}'
+
+    summary = stats.summary()[0]
+    assert summary['calls'] == 3 and summary['errors'] == 1, f'Unexpected command summary: {summary}'
+    assert COMMAND_ERRORS.get(command='pytest', kind='prefix') >= 1, 'Failed command not counted in metrics'
+
+
+def test_profile_loop():
+    import asyncio
+    import marshal
+    import time
+    from minder.bot.profiling import profile_loop
+
+    def _busy_wait(seconds):
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            pass
+
+    async def _busy_worker():
+        while True:
+            _busy_wait(0.02)
+            await asyncio.sleep(0.01)
+
+    async def _run_profiles():
+        worker = asyncio.ensure_future(_busy_worker())
+
+        try:
+            return [await profile_loop(0.5, mode=mode) for mode in ['sample', 'cprofile']]
+        finally:
+            worker.cancel()
+
+    sampled, traced = asyncio.run(_run_profiles())
+
+    assert '_busy_wait' in sampled.summary, f'Busy function missing from sampled profile:\n{sampled.summary}'
+    assert sampled.filename.endswith('.folded') and b'_busy_wait' in sampled.data, 'Collapsed stacks missing busy function'
+
+    assert '_busy_wait' in traced.summary, f'Busy function missing from cProfile summary:\n{traced.summary}'
+    assert any(func[2] == '_busy_wait' for func in marshal.loads(traced.data)), 'Saved pstats data missing busy function'
+
+
+def test_loop_watchdog():
+    import asyncio
+    import time
+    from minder.bot.watchdog import LoopWatchdog
+
+    def _blocking_call(seconds):
+        time.sleep(seconds)
+
+    async def _run_watchdog():
+        watchdog = LoopWatchdog(threshold=0.1, interval=0.05)
+        watchdog.start()
+
+        try:
+            await asyncio.sleep(0.2)
+            _blocking_call(0.3)
+            await asyncio.sleep(0.2)
+        finally:
+            watchdog.stop()
+
+        return watchdog
+
+    watchdog = asyncio.run(_run_watchdog())
+    percentiles = watchdog.percentiles()
+    assert percentiles[1.0] >= 0.2, f'Blocking call not measured as loop lag. Found: {percentiles}'
+
+    sites = watchdog.top_sites()
+    assert sites and sites[0][0].startswith('_blocking_call'), f'Blocking call site not captured. Found: {sites}'
+
+
+def test_event_stream(app):
+    import asyncio
+    import json
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    from minder.bot.events import EventFeed
+    from minder.cogs.backend import routes
+    from minder.models.events import EVENTS_CHANNEL, publish_event
+
+    import minder.bot.views  # noqa: F401
+
+    feed = EventFeed(app.redis_helper)
+
+    async def _wait_for(check, timeout=5.0):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while not check():
+            assert loop.time() < deadline, 'Timed out waiting on the event feed'
+            await asyncio.sleep(0.05)
+
+    def _channel_subscribed():
+        with app.redis_helper.wrapped_redis('pubsub_numsub') as r_conn:
+            return dict(r_conn.pubsub_numsub(EVENTS_CHANNEL)).get(EVENTS_CHANNEL.encode(), 0) > 0
+
+    async def _stream_events():
+        web_app = web.Application()
+        web_app['event_feed'] = feed
+        web_app.add_routes(routes)
+
+        async with TestClient(TestServer(web_app)) as client:
+            rv = await client.get('/events?kinds=bogus')
+            assert rv.status == 400, f'Invalid event kind was not rejected: HTTP {rv.status}'
+
+            rv = await client.get('/events?kinds=reminder')
+            assert rv.headers['Content-Type'] == 'text/event-stream', f'Unexpected content type: {rv.headers["Content-Type"]}'
+            assert 'Access-Control-Allow-Origin' not in rv.headers, 'Event stream should not allow cross-origin reads'
+            assert [await rv.content.readline() for _ in range(2)] == [b': connected\n', b'\n'], 'Missing connected comment at start of event stream'
+
+            await _wait_for(_channel_subscribed)
+
+            with app.redis_helper.wrapped_redis('publish_event') as r_conn:
+                publish_event(r_conn, 'status', 'add', {'id': 'pytest'})
+                publish_event(r_conn, 'reminder', 'create', {'id': 'pytest'})
+
+            lines = [(await asyncio.wait_for(rv.content.readline(), timeout=5.0)).decode() for _ in range(2)]
+            assert lines[0] == 'event: reminder\n', f'Unexpected (or unfiltered) event: {lines}'
+
+            event = json.loads(lines[1][len('data: '):])
+            assert event['action'] == 'create' and event['data'] == {'id': 'pytest'}, f'Unexpected event data: {event}'
+
+            rv.close()
+            await _wait_for(lambda: feed.subscriber_count == 0)
+
+    try:
+        asyncio.run(_stream_events())
+    finally:
+        feed.stop()
+
+
+def test_event_feed_resubscribes(app, monkeypatch):
+    import asyncio
+    import redis.client
+    import threading
+    import minder.bot.events
+    from minder.bot.events import EventFeed
+    from minder.models.events import publish_event
+
+    monkeypatch.setattr(minder.bot.events, 'RESUBSCRIBE_DELAY', 0.05)
+
+    feed = EventFeed(app.redis_helper)
+    failures = []
+    get_message = redis.client.PubSub.get_message
+
+    def _failing_get_message(pubsub, *args, **kwargs):
+        # Only fail reading the subscription of this feed (and not any left over from other tests)
+        if not failures and threading.current_thread() is feed._thread:
+            failures.append(True)
+            raise redis.exceptions.ConnectionError('pytest connection lost')
+
+        return get_message(pubsub, *args, **kwargs)
+
+    monkeypatch.setattr(redis.client.PubSub, 'get_message', _failing_get_message)
+
+    async def _receive_after_failure():
+        sub = feed.subscribe()
+
+        try:
+            deadline = asyncio.get_running_loop().time() + 5.0
+
+            # Events published while the feed is resubscribing are lost, so keep publishing until one is received
+            while asyncio.get_running_loop().time() < deadline:
+                if failures:
+                    with app.redis_helper.wrapped_redis('publish_event') as r_conn:
+                        publish_event(r_conn, 'reminder', 'create', {'id': 'pytest-resubscribed'})
+
+                message = await sub.get(timeout=0.1)
+
+                if message:
+                    return message
+
+            return None
+        finally:
+            feed.stop()
+
+    message = asyncio.run(_receive_after_failure())
+    assert message and message[0] == 'reminder' and 'pytest-resubscribed' in message[1], f'Event not received after resubscribing: {message}'
+
+
+def test_status_message_deletes(app, fake_member, fake_text_channel):
+    import asyncio
+    from types import SimpleNamespace
+    from minder.cogs.status import StatusCog
+    from minder.models import ActivityCounters, StatusEntry
+
+    helper = app.redis_helper
+    guild_id, member_id, uncached_chan_id = 30001, 30002, 30003
+    fake_text_channel.guild.id, fake_text_channel.id, fake_member.id = guild_id, 30004, member_id
+
+    bot = SimpleNamespace(redis_helper=helper, get_channel=lambda chan_id: fake_text_channel if chan_id == fake_text_channel.id else None)
+    cog = StatusCog(bot)
+
+    def _message(msg_id: int, content: str) -> SimpleNamespace:
+        return SimpleNamespace(id=msg_id, author=fake_member, content=content)
+
+    cached_del = discord.RawMessageDeleteEvent({'id': 1001, 'channel_id': fake_text_channel.id, 'guild_id': guild_id})
+    cached_del.cached_message = _message(1001, 'pytest cached delete')
+    uncached_del = discord.RawMessageDeleteEvent({'id': 1002, 'channel_id': uncached_chan_id, 'guild_id': guild_id})
+
+    purge = discord.RawBulkMessageDeleteEvent({'ids': [1005, 1003, 1004], 'channel_id': fake_text_channel.id, 'guild_id': guild_id})
+    purge.cached_messages = [_message(1003, 'pytest purged')]
+
+    async def _delete_messages():
+        await cog.on_raw_message_delete(cached_del)
+        await cog.on_raw_message_delete(uncached_del)
+        await cog.on_raw_bulk_message_delete(purge)
+
+    asyncio.run(_delete_messages())
+
+    deletes = {ent.context['message_id']: ent for ent in StatusEntry.query(helper, action='DELETE', guild_id=guild_id)}
+    assert sorted(deletes) == [1001, 1002], f'Unexpected indexed delete entries: {pformat(deletes)}'
+
+    cached_ent, uncached_ent = deletes[1001], deletes[1002]
+    assert cached_ent.message == 'Message deleted from "pytesting" by "pytest"', f'Unexpected cached delete message: {cached_ent.message}'
+    assert cached_ent.context['content'] == 'pytest cached delete', f'Deleted content not recorded: {pformat(cached_ent.context)}'
+    assert cached_ent.member_id == member_id and cached_ent.channel_id == fake_text_channel.id, f'Unexpected IDs: {pformat(cached_ent.context)}'
+
+    assert uncached_ent.message == f'Uncached message deleted from "{uncached_chan_id}"', f'Unexpected uncached delete message: {uncached_ent.message}'
+    assert 'content' not in uncached_ent.context and uncached_ent.member_id is None, f'Unexpected uncached context: {pformat(uncached_ent.context)}'
+    assert uncached_ent.channel_id == uncached_chan_id, f'Uncached channel not recorded from the raw event: {pformat(uncached_ent.context)}'
+
+    purges = StatusEntry.query(helper, action='PURGE', guild_id=guild_id)
+    assert len(purges) == 1, f'Expected a single entry for the purge: {pformat(purges)}'
+
+    purge_ctx = purges[0].context
+    assert purge_ctx['count'] == 3 and purge_ctx['message_ids'] == [1003, 1004, 1005], f'Unexpected purge context: {pformat(purge_ctx)}'
+    assert [msg['content'] for msg in purge_ctx['messages']] == ['pytest purged'], f'Unexpected cached purge messages: {pformat(purge_ctx)}'
+
+    all_ents = StatusEntry.query(helper, guild_id=guild_id)
+    assert len(all_ents) == 3, f'Unexpected entries in the guild index: {pformat(all_ents)}'
+
+    # Two buckets so the test does not depend on running before midnight
+    for scope, scope_id, expected in [('guild', guild_id, {'DELETE': 2, 'PURGE': 3}), ('channel', fake_text_channel.id, {'DELETE': 1, 'PURGE': 3}),
+                                      ('channel', uncached_chan_id, {'DELETE': 1, 'PURGE': 0}), ('member', member_id, {'DELETE': 1, 'PURGE': 0})]:
+        totals = ActivityCounters.totals(helper, ['delete', 'purge'], resolution='day', scope=scope, scope_id=scope_id, num_buckets=2)
+        assert totals == expected, f'Unexpected activity counters for {scope} {scope_id}: {totals}'
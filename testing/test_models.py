@@ -1,3 +1,4 @@
+import discord
 import humanize
 
 from datetime import datetime
@@ -14,3 +15,168 @@ def test_build_reminder(fake_channel_reminder, fake_dm_reminder):
 
     dm_rem = fake_dm_reminder
     print(f'Build test DM reminder:\n{dm_rem.dump()}')
+
+
+def test_generate_ids():
+    from minder.models import generate_id, id_timestamp, is_legacy_id
+
+    ids = [generate_id() for _ in range(1000)]
+    assert len(set(ids)) == len(ids), 'Generated IDs are not unique'
+    assert ids == sorted(ids), 'Generated IDs are not strictly increasing'
+
+    dt_now = datetime.now()
+    older_id, newer_id = generate_id(dt_now.timestamp() - 60), generate_id(dt_now)
+    assert older_id < newer_id, f'ID for older timestamp sorts after newer ID: "{older_id}" vs "{newer_id}"'
+    assert abs(id_timestamp(newer_id) - dt_now.timestamp()) < 0.001, f'Unexpected timestamp embedded in "{newer_id}"'
+
+    assert is_legacy_id('12345:1620000000.123'), 'Legacy reminder key not recognized'
+    assert id_timestamp('EDIT:1620000000.5') == 1620000000.5, 'Unable to parse timestamp from legacy status key'
+    assert not is_legacy_id(newer_id), f'Generated ID "{newer_id}" incorrectly considered a legacy ID'
+
+
+def test_reminder_patch_plan():
+    from minder.errors import MinderError
+    from minder.models.reminders import REMINDER_PATCH_PLAN
+
+    changes = REMINDER_PATCH_PLAN.coerce({'user_notified': 'false', 'member_id': '12345', 'channel_id': '', 'trigger_ts': '1620000000.5'})
+    assert changes == {'user_notified': False, 'member_id': 12345, 'channel_id': None, 'trigger_ts': 1620000000.5}, f'Unexpected coerced values: {changes}'
+
+    for bad_values in [{'user_notified': 'maybe'}, {'member_id': 'abc'}, {'timezone_name': 'Not/AZone'}, {'no_such_field': 1}]:
+        try:
+            REMINDER_PATCH_PLAN.coerce(bad_values)
+        except MinderError:
+            continue
+
+        assert False, f'Invalid PATCH values were accepted: {bad_values}'
+
+
+def test_encode_reminder(fake_channel_reminder):
+    from minder.encoding import dumps, loads
+
+    encoded = loads(dumps({fake_channel_reminder.member_id: fake_channel_reminder}))
+    rem_data = encoded[str(fake_channel_reminder.member_id)]
+
+    assert rem_data['redis_name'] == fake_channel_reminder.redis_name, f'Unexpected encoded reminder: {rem_data}'
+    assert rem_data['trigger_time']['resolved_time'] == fake_channel_reminder.trigger_time.resolved_time.isoformat(), 'Trigger time not encoded in ISO format'
+
+
+def test_status_indexes(app):
+    from datetime import timedelta
+    from minder.models import StatusEntry, StatusEntryActions
+
+    helper = app.redis_helper
+    base_dt = datetime(2021, 5, 1, 12, 0)
+    guild_id = 26001
+
+    for idx, action in enumerate(['EDIT', 'DELETE', 'EDIT', 'EDIT']):
+        StatusEntry.build(action, f'pytest status #{idx}', context={'guild_id': guild_id}, use_timestamp=base_dt + timedelta(minutes=idx)).store(helper)
+
+    edits = StatusEntry.query(helper, action='EDIT', guild_id=guild_id)
+    assert [ent.message for ent in edits] == ['pytest status #3', 'pytest status #2', 'pytest status #0'], f'Unexpected indexed entries: {edits}'
+
+    window = StatusEntry.query(helper, guild_id=guild_id, start=base_dt + timedelta(minutes=1), end=base_dt + timedelta(minutes=2), newest_first=False)
+    assert [ent.message for ent in window] == ['pytest status #1', 'pytest status #2'], f'Unexpected entries for time window: {window}'
+
+    with helper.wrapped_redis('delete_indexes') as r_conn:
+        r_conn.delete(*[StatusEntry.index_key(action=action, guild_id=guild_id) for action in StatusEntryActions], StatusEntry.index_key(guild_id=guild_id))
+
+    assert not StatusEntry.query(helper, guild_id=guild_id), 'Entries still found after removing the guild indexes'
+    assert StatusEntry.rebuild_indexes(helper) >= 4, 'Not all stored entries were re-indexed'
+
+    edits = StatusEntry.query(helper, action='EDIT', guild_id=guild_id, limit=2)
+    assert [ent.message for ent in edits] == ['pytest status #3', 'pytest status #2'], f'Unexpected entries after rebuilding indexes: {edits}'
+
+
+def test_activity_counters(app):
+    from datetime import timedelta
+    from minder.errors import MinderError
+    from minder.models import ActivityCounters, StatusEntry
+
+    helper = app.redis_helper
+    base_dt = datetime(2021, 5, 1, 12, 30)
+    guild_id, member_id = 27001, 27002
+
+    StatusEntry.build('PURGE', 'pytest purge', context={'guild_id': guild_id, 'count': 3}, use_timestamp=base_dt).store(helper)
+    end_dt = base_dt + timedelta(hours=2)
+    StatusEntry.build('EDIT', 'pytest edit', context={'member': {'id': member_id, 'guild_id': guild_id}}, use_timestamp=end_dt).store(helper)
+
+    hour_ts = ActivityCounters.bucket_start('hour', base_dt)
+
+    purges = ActivityCounters.read(helper, resolution='hour', scope='guild', scope_id=guild_id, action='PURGE', num_buckets=3, end=end_dt)
+    assert purges == [(hour_ts, 3), (hour_ts + 3600, 0), (hour_ts + 7200, 0)], f'Unexpected hourly purge counters: {purges}'
+
+    totals = ActivityCounters.read(helper, resolution='hour', scope='guild', scope_id=guild_id, num_buckets=3, end=end_dt)
+    assert [count for _, count in totals] == [3, 0, 1], f'Unexpected hourly totals for guild: {totals}'
+
+    member_totals = ActivityCounters.totals(helper, ['edit', 'purge'], resolution='day', scope='member', scope_id=member_id, num_buckets=1, end=end_dt)
+    assert member_totals == {'EDIT': 1, 'PURGE': 0}, f'Unexpected daily totals for member: {member_totals}'
+
+    for bad_args in [{'resolution': 'week'}, {'scope': 'guild'}, {'scope': 'server', 'scope_id': guild_id}]:
+        try:
+            ActivityCounters.read(helper, **bad_args)
+        except MinderError:
+            continue
+
+        assert False, f'Invalid activity counter arguments were accepted: {bad_args}'
+
+
+def test_status_query_single_fetch(app, monkeypatch):
+    from minder.models import StatusEntry
+
+    helper = app.redis_helper
+    guild_id = 26002
+
+    for idx in range(3):
+        StatusEntry.build('JOIN', f'pytest join #{idx}', context={'guild_id': guild_id}, use_timestamp=datetime(2021, 5, 3, 12, idx)).store(helper)
+
+    def _fetch(*args, **kwargs):
+        raise AssertionError('Status entry fetched individually instead of in a single HMGET')
+
+    monkeypatch.setattr(StatusEntry, 'fetch', _fetch)
+
+    entries = StatusEntry.query(helper, guild_id=guild_id)
+    assert [ent.message for ent in entries] == ['pytest join #2', 'pytest join #1', 'pytest join #0'], f'Unexpected entries: {entries}'
+
+
+def test_discord_wire_format(fake_member, fake_text_channel, fake_dm_channel):
+    import pickle
+    from types import SimpleNamespace
+    from minder.common import DiscordChannel, DiscordMember, rehydrate_context
+    from minder.models import StatusEntry
+
+    mem = DiscordMember.from_model(fake_member)
+    chan = DiscordChannel.from_model(fake_text_channel)
+    dm_chan = DiscordChannel.from_model(fake_dm_channel)
+
+    assert mem.to_wire() == {'kind': 'member', 'id': 12345, 'name': 'pytest', 'guild_id': 98765}, f'Unexpected wire member: {mem.to_wire()}'
+    chan_wire = {'kind': 'channel', 'id': 54321, 'name': 'pytesting', 'is_dm': False, 'guild_id': 98765}
+    assert chan.to_wire() == chan_wire, f'Unexpected wire channel: {chan.to_wire()}'
+    assert dm_chan.to_wire() == {'kind': 'channel', 'id': 76543, 'name': 'pytest', 'is_dm': True, 'guild_id': None}, f'Unexpected wire DM: {dm_chan.to_wire()}'
+
+    # Live Discord references are dropped when pickled
+    for ent in [mem, chan, dm_chan]:
+        loaded = pickle.loads(pickle.dumps(ent))
+        assert loaded == ent and loaded.guild is None, f'Unexpected unpickled entry: {loaded}'
+
+    wire_context = {'member': mem.to_wire(), 'channel': dm_chan.to_wire(), 'count': 3}
+    context = rehydrate_context(wire_context)
+    assert context['member'] == mem and context['channel'] == dm_chan and context['count'] == 3, f'Unexpected rehydrated context: {context}'
+    assert context['member'].mention == 'pytest' and context['channel'].mention == 'pytest', 'Mentions without a bot should use names'
+
+    live_member = SimpleNamespace(id=12345, mention='<@12345>')
+    live_channel = discord.TextChannel.__new__(discord.TextChannel)
+    live_channel.id = 54321
+    guild = SimpleNamespace(id=98765, get_member=lambda member_id: live_member if member_id == 12345 else None)
+    bot = SimpleNamespace(get_guild=lambda guild_id: guild if guild_id == 98765 else None, get_user=lambda user_id: None,
+                          get_channel=lambda channel_id: live_channel if channel_id == 54321 else None)
+
+    context = rehydrate_context({'member': mem.to_wire(), 'channel': chan.to_wire()}, bot=bot)
+    assert context['member'].mention == '<@12345>' and context['member'].guild is guild, 'Member not resolved from the bot cache'
+    assert context['channel'].mention == '<#54321>', 'Channel not resolved from the bot cache'
+
+    # Contexts stored before the wire format hold full member / channel dicts without a "kind"
+    legacy_context = {'member': {'id': 12345, 'name': 'pytest', 'guild_id': 98765, 'guild': None}, 'channel': {'id': 54321, 'name': 'pytesting'}}
+    assert rehydrate_context(legacy_context, bot=bot) == legacy_context, 'Legacy context entries should be left as they are'
+
+    ent = StatusEntry.build('EDIT', 'pytest legacy context', context=legacy_context)
+    assert (ent.member_id, ent.channel_id, ent.guild_id) == (12345, 54321, 98765), 'IDs not read from legacy context entries'
@@ -1,6 +1,9 @@
+import gzip
+import json
 import re
 
 from pprint import pformat
+from urllib.parse import urlencode
 
 from minder.web.model import User
 
@@ -58,3 +61,360 @@ def test_api_reminders(client):
     assert rv.status_code == 200, f'Unexpected HTTP status code returned from "/api/reminders": "{rv.status_code}" (expected HTTP 200 OK)'
     assert not rv.json['is_error'], f'Received unexpected error calling "/api/reminders". Found:\n{pformat(rv.json)}'
     print(f'Got: {rv.json}')
+
+
+def test_api_response_cache(client):
+    rv = client.get('/api/reminders?exclude=notified,complete')
+    assert rv.status_code == 200, f'Unexpected HTTP status code returned from "/api/reminders": "{rv.status_code}" (expected HTTP 200 OK)'
+    etag = rv.headers['ETag']
+
+    rv = client.get('/api/reminders?exclude=complete,notified')
+    assert rv.headers['ETag'] == etag, f'Equivalent query returned different ETag: "{rv.headers["ETag"]}" (expected "{etag}")'
+
+    stats = client.get('/api/cache').json['data']
+    assert stats['hits'] >= 1, f'Equivalent query was not served from the response cache. Stats:\n{pformat(stats)}'
+
+    req_params = {'when': 'in 10 minutes', 'content': 'just pytesting', 'member_id': 12345, 'member_name': 'pytest'}
+    client.post('/api/reminders', data=req_params)
+
+    rv = client.get('/api/reminders?exclude=complete,notified')
+    assert rv.headers['ETag'] != etag, 'ETag did not change after storing new reminder'
+    assert rv.json['count'] >= 1, f'Stale cached listing returned after storing new reminder. Found:\n{pformat(rv.json)}'
+
+
+def test_api_compression(client):
+    for idx in range(5):
+        req_params = {'when': 'in 10 minutes', 'content': f'just pytesting compression #{idx}', 'member_id': 12345, 'member_name': 'pytest'}
+        client.post('/api/reminders', data=req_params)
+
+    rv = client.get('/api/reminders', headers={'Accept-Encoding': 'gzip'})
+    assert rv.headers.get('Content-Encoding') == 'gzip', f'Reminder listing was not compressed. Headers:\n{pformat(dict(rv.headers))}'
+    assert 'Accept-Encoding' in rv.headers.get('Vary', ''), 'Compressed response is missing "Vary: Accept-Encoding"'
+
+    rem_data = json.loads(gzip.decompress(rv.data))
+    assert rem_data['count'] >= 5, f'Unexpected decompressed reminder listing:\n{pformat(rem_data)}'
+
+    rv = client.get('/api/reminders', headers={'Accept-Encoding': 'gzip', 'If-None-Match': rv.headers['ETag']})
+    assert rv.status_code == 304, f'Weak ETag of compressed response not matched: HTTP {rv.status_code} (expected HTTP 304 Not Modified)'
+
+
+def test_metrics(client):
+    client.get('/api/reminders')
+    client.get('/api/reminders')
+
+    rv = client.get('/metrics')
+    assert rv.status_code == 200, f'Unexpected HTTP status code returned from "/metrics": "{rv.status_code}" (expected HTTP 200 OK)'
+    assert rv.content_type.startswith('text/plain'), f'Unexpected content type for metrics: "{rv.content_type}"'
+
+    body = rv.get_data(as_text=True)
+    assert '# TYPE minder_http_request_duration_seconds histogram' in body, f'Request latency histogram missing from metrics:\n{body}'
+    assert 'route="/api/reminders"' in body, f'Request latency not labelled by URL rule:\n{body}'
+    assert 'minder_cache_requests_total{cache="response",result="hit"}' in body, f'Response cache hits missing from metrics:\n{body}'
+    assert 'minder_redis_op_duration_seconds_count' in body, f'Redis op latency missing from metrics:\n{body}'
+
+
+def test_api_reminder_move_member(client):
+    req_params = {'when': 'in 10 minutes', 'content': 'just pytesting moves', 'member_id': 31001, 'member_name': 'pytest-old'}
+    rem_id = client.post('/api/reminders', data=req_params).json['data']['reminder']['redis_name']
+
+    rv = client.get('/api/reminders?member_id=31001')
+    old_etag = rv.headers['ETag']
+    assert rv.json['count'] == 1, f'Unexpected listing for original member:\n{pformat(rv.json)}'
+
+    rv = client.patch(f'/api/reminders/{rem_id}', data={'member_id': 31002, 'member_name': 'pytest-new'})
+    assert rv.json['data']['changed'], f'Reminder was not moved to the new member:\n{pformat(rv.json)}'
+
+    rv = client.get('/api/reminders?member_id=31001', headers={'If-None-Match': old_etag})
+    assert rv.status_code == 200, f'Stale ETag of original member still matched after moving reminder: HTTP {rv.status_code}'
+    assert rv.headers['ETag'] != old_etag, 'ETag of original member did not change after moving reminder'
+    assert rv.json['count'] == 0, f'Cached listing of original member still includes moved reminder:\n{pformat(rv.json)}'
+
+    rv = client.get('/api/reminders?member_id=31002')
+    assert rv.json['count'] == 1, f'Moved reminder missing from listing of new member:\n{pformat(rv.json)}'
+
+
+def test_api_reminder_batch_all_or_nothing(client):
+    batch = [{'when': 'in 10 minutes', 'content': 'just pytesting batches', 'member_id': 33001, 'member_name': 'pytest'},
+             {'op': 'update', 'id': 'no-such-reminder', 'content': 'never stored'}]
+
+    rv = client.post('/api/reminders/batch', json=batch)
+    assert rv.status_code == 400, f'Batch with an invalid operation was not rejected: HTTP {rv.status_code}\n{pformat(rv.json)}'
+    assert [item['is_error'] for item in rv.json['data']] == [False, True], f'Unexpected per-item results:\n{pformat(rv.json["data"])}'
+
+    rv = client.get('/api/reminders?member_id=33001')
+    assert rv.json['count'] == 0, f'Valid operations of a rejected batch were written:\n{pformat(rv.json)}'
+
+    rv = client.post('/api/reminders/batch', json=batch[:1])
+    assert rv.status_code == 200, f'Valid batch was rejected: HTTP {rv.status_code}\n{pformat(rv.json)}'
+    assert client.get('/api/reminders?member_id=33001').json['count'] == 1, 'Reminder from valid batch was not stored'
+
+
+def test_api_reminder_batch_timezone(client):
+    batch = [{'when': 'tomorrow at 9am', 'content': 'just pytesting timezones', 'member_id': 33002, 'member_name': 'pytest',
+              'timezone': 'America/New_York'}]
+
+    created = client.post('/api/reminders/batch', json=batch).json['data'][0]['reminder']
+
+    rv = client.post('/api/reminders/batch', json=[{'op': 'update', 'id': created['redis_name'], 'when': 'tomorrow at 10am'}])
+    assert rv.status_code == 200, f'Batch update was rejected: HTTP {rv.status_code}\n{pformat(rv.json)}'
+
+    updated = rv.json['data'][0]['reminder']
+    assert updated['timezone_name'] == 'America/New_York', f'Batch update changed the reminder timezone:\n{pformat(updated)}'
+    assert updated['trigger_ts'] - created['trigger_ts'] == 3600, f'Batch update "when" was not resolved in the reminder timezone:\n{pformat(updated)}'
+
+
+def test_api_cache_clear(client, session):
+    rv = client.delete('/api/cache')
+    assert rv.status_code == 302, f'Anonymous request was allowed to clear the response cache: HTTP {rv.status_code}'
+
+    for username, is_admin in [('pytest-user', False), ('pytest-admin', True)]:
+        session.add(User(username=username, password_hash=User.generate_password('pyt3s7'), is_admin=is_admin))
+
+    session.commit()
+
+    client.post('/login', data={'username': 'pytest-user', 'password': 'pyt3s7'})
+    rv = client.delete('/api/cache')
+    assert rv.status_code == 403, f'Non-admin user was allowed to clear the response cache: HTTP {rv.status_code}'
+
+    client.get('/logout')
+    client.post('/login', data={'username': 'pytest-admin', 'password': 'pyt3s7'})
+    rv = client.delete('/api/cache')
+    assert rv.status_code == 200 and not rv.json['is_error'], f'Admin user could not clear the response cache: HTTP {rv.status_code}\n{pformat(rv.json)}'
+
+
+def test_api_reminders_etag(client):
+    rv = client.get('/api/reminders?member_id=31003')
+    etag = rv.headers['ETag']
+
+    rv = client.get('/api/reminders?member_id=31003', headers={'If-None-Match': etag})
+    assert rv.status_code == 304, f'Matching ETag did not return HTTP 304 (got HTTP {rv.status_code})'
+    assert not rv.data, f'Unexpected body for HTTP 304 response: {rv.data}'
+
+    other_params = {'when': 'in 10 minutes', 'content': 'just pytesting other members', 'member_id': 31004, 'member_name': 'pytest-other'}
+    client.post('/api/reminders', data=other_params)
+
+    rv = client.get('/api/reminders?member_id=31003', headers={'If-None-Match': etag})
+    assert rv.status_code == 304, f'ETag changed after storing a reminder for another member (got HTTP {rv.status_code})'
+
+    req_params = {'when': 'in 10 minutes', 'content': 'just pytesting etags', 'member_id': 31003, 'member_name': 'pytest'}
+    client.post('/api/reminders', data=req_params)
+
+    rv = client.get('/api/reminders?member_id=31003', headers={'If-None-Match': etag})
+    assert rv.status_code == 200, f'Stale ETag still matched after storing a reminder: HTTP {rv.status_code}'
+    assert rv.headers['ETag'] != etag and rv.json['count'] == 1, f'Listing not refreshed after storing a reminder:\n{pformat(rv.json)}'
+
+
+def test_api_reminders_idempotency(client):
+    from minder.models import IdempotencyStore
+    from minder.models.idempotency import IDEMPOTENCY_HEADER, IDEMPOTENCY_REPLAY_HEADER
+
+    req_params = {'when': 'in 10 minutes', 'content': 'just pytesting retries', 'member_id': 34001, 'member_name': 'pytest'}
+    headers = {IDEMPOTENCY_HEADER: 'pytest-replay'}
+
+    first = client.post('/api/reminders', data=req_params, headers=headers)
+    assert first.status_code == 200 and IDEMPOTENCY_REPLAY_HEADER not in first.headers, f'Unexpected first response: HTTP {first.status_code}'
+
+    retry = client.post('/api/reminders', data=req_params, headers=headers)
+    assert retry.status_code == 200 and retry.headers.get(IDEMPOTENCY_REPLAY_HEADER) == 'true', 'Retry was not replayed from the recorded response'
+    assert retry.json == first.json, f'Replayed response does not match the original:\n{pformat(retry.json)}'
+    assert client.get('/api/reminders?member_id=34001').json['count'] == 1, 'Retry with the same Idempotency-Key created another reminder'
+
+    rv = client.post('/api/reminders', data=dict(req_params, content='something else'), headers=headers)
+    assert rv.status_code == 422, f'Idempotency-Key reused for a different request was not rejected: HTTP {rv.status_code}'
+
+    # Claim the key as if the same request was still being handled by another worker
+    body = urlencode(req_params)
+    IdempotencyStore.begin(client.application.redis_helper, 'reminders', 'pytest-pending', IdempotencyStore.fingerprint(body))
+
+    rv = client.post('/api/reminders', data=body, content_type='application/x-www-form-urlencoded', headers={IDEMPOTENCY_HEADER: 'pytest-pending'})
+    assert rv.status_code == 409, f'Request with an in-progress Idempotency-Key was not rejected: HTTP {rv.status_code}'
+
+
+def test_report_escapes_messages(client, session):
+    from datetime import datetime
+    from minder.models import StatusEntry
+
+    session.add(User(username='pytest-report', password_hash=User.generate_password('pyt3s7'), is_admin=True))
+    session.commit()
+    client.post('/login', data={'username': 'pytest-report', 'password': 'pyt3s7'})
+
+    message = 'Message deleted from "pytesting" by "<script>alert(1)</script>"'
+    StatusEntry.build('DELETE', message, context={'guild_id': 26101}, use_timestamp=datetime(2021, 5, 2, 12, 0)).store(client.application.redis_helper)
+
+    rv = client.get('/report?guild_id=26101')
+    assert rv.status_code == 200, f'Unexpected HTTP status code returned from "/report": {rv.status_code}'
+
+    body = rv.get_data(as_text=True)
+    assert '<script>alert(1)</script>' not in body, 'Status entry message rendered without escaping'
+    assert '&lt;script&gt;alert(1)&lt;/script&gt;' in body, f'Escaped status entry message missing from report:\n{body}'
+
+
+def test_api_response_cache_keys(client, session):
+    from minder.web.cache import ResponseCache
+
+    assert ResponseCache.build_key('reminders', {'exclude': 'notified,complete'}) == ResponseCache.build_key('reminders', {'exclude': 'complete,notified'})
+
+    session.add(User(username='pytest-cache-keys', password_hash=User.generate_password('pyt3s7')))
+    session.commit()
+
+    rv = client.get('/api/users?fields=id,username')
+    assert rv.status_code == 200 and set(rv.json['users'][0]) == {'id', 'username'}, f'Unexpected projected users:\n{pformat(rv.json)}'
+
+    rv = client.get('/api/users?fields=ID,username')
+    assert rv.status_code == 400, f'Invalid field differing only in case was served from the response cache: HTTP {rv.status_code}'
+
+    rv = client.get('/api/users?fields=id,username,username')
+    assert rv.status_code == 200, f'Unexpected HTTP status code for duplicate fields: {rv.status_code}'
+
+    rv = client.get('/api/users?FIELDS=username')
+    assert rv.status_code == 200 and 'is_admin' in rv.json['users'][0], f'Unknown argument was served the projected response:\n{pformat(rv.json)}'
+
+
+def test_api_reminder_entry_etag(client):
+    req_params = {'when': 'in 10 minutes', 'content': 'just pytesting entries', 'member_id': 32001, 'member_name': 'pytest'}
+    rem_id, other_id = [client.post('/api/reminders', data=req_params).json['data']['reminder']['redis_name'] for _ in range(2)]
+
+    rv = client.get(f'/api/reminders/{rem_id}')
+    etag = rv.headers['ETag']
+    assert rv.status_code == 200 and rv.json['redis_name'] == rem_id, f'Unexpected reminder returned:\n{pformat(rv.json)}'
+
+    client.patch(f'/api/reminders/{other_id}', data={'content': 'other reminder changed'})
+    rv = client.get(f'/api/reminders/{rem_id}', headers={'If-None-Match': etag})
+    assert rv.status_code == 304, f'Writing another reminder changed the ETag of "{rem_id}" (got HTTP {rv.status_code})'
+
+    client.patch(f'/api/reminders/{rem_id}', data={'content': 'this reminder changed'})
+    rv = client.get(f'/api/reminders/{rem_id}', headers={'If-None-Match': etag})
+    assert rv.status_code == 200 and rv.json['content'] == 'this reminder changed', f'Stale reminder returned after writing it:\n{pformat(rv.json)}'
+
+    assert client.get('/api/reminders/no-such-reminder').status_code == 404, 'Missing reminder did not return HTTP 404'
+
+
+def test_api_status_limit(client):
+    from datetime import datetime
+    from minder.models import StatusEntry
+
+    for idx in range(3):
+        StatusEntry.build('PART', f'pytest part #{idx}', context={'guild_id': 26003},
+                          use_timestamp=datetime(2021, 5, 4, 12, idx)).store(client.application.redis_helper)
+
+    rv = client.get('/api/status?guild_id=26003&limit=-1')
+    assert rv.status_code == 200 and rv.json['count'] == 1, f'Negative limit was not clamped:\n{pformat(rv.json)}'
+
+    rv = client.get('/api/status?guild_id=26003&limit=2')
+    assert [ent['message'] for ent in rv.json['data']] == ['pytest part #2', 'pytest part #1'], f'Unexpected status entries:\n{pformat(rv.json)}'
+
+
+def test_identity_cache(app, session):
+    from minder.cli import add_user
+    from minder.web.model import UserIdentity
+
+    usr = User(username='pytest-identity', password_hash=User.generate_password('pyt3s7'))
+    session.add(usr)
+    session.commit()
+
+    hits = app.identity_cache.hits
+    assert isinstance(app._load_user(str(usr.id)), User), 'User not loaded from the database on first use'
+
+    identity = app._load_user(str(usr.id))
+    assert isinstance(identity, UserIdentity) and app.identity_cache.hits == hits + 1, 'User not served from the identity cache'
+    assert identity.username == 'pytest-identity' and identity.get_id() == str(usr.id), f'Unexpected cached identity: {identity}'
+    assert 'password_hash' not in identity.__dict__['_user_data'], 'Password hash stored in the identity cache'
+
+    try:
+        identity.is_admin = True
+    except AttributeError:
+        pass
+    else:
+        assert False, 'Cached identity allowed setting an attribute'
+
+    loaded = identity.load()
+    assert isinstance(loaded, User) and loaded.password_hash == usr.password_hash, 'Cached identity did not load the User model'
+
+    # Committing a change from the web application bumps the users version
+    loaded.is_admin = True
+    session.commit()
+
+    refreshed = app._load_user(str(usr.id))
+    assert isinstance(refreshed, User) and refreshed.is_admin, 'Stale identity served after the user was changed'
+    assert app._load_user(str(usr.id)).is_admin, 'Changed user not cached again'
+
+    # So does adding a user with the CLI
+    res_add = app.test_cli_runner().invoke(add_user, ['--username', 'pytest-identity-cli', '--password-hash', usr.password_hash])
+    assert res_add.exit_code == 0, f'Bad return code when adding "pytest-identity-cli"\n{res_add.output}'
+    assert isinstance(app._load_user(str(usr.id)), User), 'Stale identity served after a user was added with the CLI'
+
+    app._load_user(str(usr.id))
+    assert app.identity_cache.stats()['size'] >= 1, 'Identity not cached'
+
+    app.post_fork()
+    assert app.identity_cache.stats()['size'] == 0, 'Identity cache not reset after fork'
+
+
+def test_reset_after_fork(app, monkeypatch):
+    import os
+    import minder.web.app
+    from sqlalchemy.engine import Engine
+    from minder import gunicorn_conf
+    from minder.web.model import db
+
+    disposed = []
+    dispose = Engine.dispose
+
+    def _record_dispose(engine, *args, **kwargs):
+        disposed.append((engine, kwargs.get('close', args[0] if args else True)))
+        return dispose(engine, *args, **kwargs)
+
+    monkeypatch.setattr(Engine, 'dispose', _record_dispose)
+
+    with app.app_context():
+        engine = db.engine
+
+    # Preloading in the server master closes the connections used for the schema check
+    app.init_schema(dispose=True)
+    assert disposed == [(engine, True)], f'Engine pool not disposed after initializing the schema: {disposed}'
+
+    helper = app.redis_helper
+    assert app.redis_helper is helper, 'Redis helper rebuilt without a fork'
+
+    parent_pid = os.getpid()
+    monkeypatch.setattr(minder.web.app.os, 'getpid', lambda: parent_pid + 1)
+    assert app.redis_helper is not helper, 'Redis helper from the parent process used after the PID changed'
+
+    for cache in [app.response_cache, app.identity_cache]:
+        cache.put('pytest-key', 'pytest-version', 'pytest-value')
+
+    disposed.clear()
+    old_pool = engine.pool
+    gunicorn_conf.post_fork(None, None)
+
+    assert (engine, False) in disposed, f'Engine pool not dropped (without closing parent connections) after fork: {disposed}'
+    assert engine.pool is not old_pool, 'Engine pool inherited from the parent process still in use after fork'
+    assert app._redis_helper is None, 'Redis helper not reset after fork'
+    assert app.redis_helper is not helper, 'Redis helper not rebuilt after fork'
+
+    for cache in [app.response_cache, app.identity_cache]:
+        assert cache.get('pytest-key', 'pytest-version') is None, f'{type(cache).__name__} not reset after fork'
+
+
+def test_api_users_pages(client, session):
+    for idx, (is_admin, enabled) in enumerate([(True, True), (False, True), (True, False), (False, True)]):
+        session.add(User(username=f'pytest-page{idx}', password_hash=User.generate_password('pyt3s7'), is_admin=is_admin, enabled=enabled))
+
+    session.commit()
+
+    rv = client.get('/api/users?limit=3&fields=username')
+    assert rv.json['count'] == 3 and rv.json['has_more'], f'Unexpected first page of users:\n{pformat(rv.json)}'
+
+    rv = client.get(f'/api/users?limit=3&fields=username&after_id={rv.json["next_after_id"]}')
+    assert [usr['username'] for usr in rv.json['users']] == ['pytest-page3'], f'Unexpected last page of users:\n{pformat(rv.json)}'
+    assert not rv.json['has_more'] and rv.json['next_after_id'] is None, f'Next page returned for the last page:\n{pformat(rv.json)}'
+
+    rv = client.get('/api/users?limit=4')
+    assert rv.json['count'] == 4 and not rv.json['has_more'], f'Next page returned for exactly "limit" users:\n{pformat(rv.json)}'
+
+    rv = client.get('/api/users?is_admin=false&enabled=true&fields=id,username')
+    assert [usr['username'] for usr in rv.json['users']] == ['pytest-page1', 'pytest-page3'], f'Unexpected users for filters:\n{pformat(rv.json)}'
+
+    for bad_query in ['fields=password_hash', 'fields=username,nope', 'is_admin=maybe']:
+        rv = client.get(f'/api/users?{bad_query}')
+        assert rv.status_code == 400, f'Invalid users query "{bad_query}" was accepted: HTTP {rv.status_code}'
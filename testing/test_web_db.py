@@ -20,3 +20,120 @@ def test_fetch_user(session):
     print(f'Retrieved newly created user:\n{usr}')
 
     assert not fetch_usr.is_admin, f'Newly created user was incorrectly created as an admin: {usr}'
+
+
+def test_get_user_by(session):
+    for username in ['pytest', 'pytest2', 'pytest3']:
+        session.add(User(username=username, password_hash=User.generate_password('pyt3s7')))
+
+    session.commit()
+
+    usr = User.get_by('username', 'pytest2')
+    assert usr and usr.username == 'pytest2', f'Unexpected user returned fetching "pytest2" by username: {usr}'
+    assert User.get_by('username', 'nobody') is None, 'User returned when fetching non-existent username'
+
+    users = User.get_many('username', ['pytest', 'pytest3', 'nobody'])
+    assert sorted([usr.username for usr in users]) == ['pytest', 'pytest3'], f'Unexpected users returned by get_many: {users}'
+
+
+def test_get_by_multiple_matches(session):
+    from minder.errors import MinderError
+
+    for username in ['pytest', 'pytest2']:
+        session.add(User(username=username, password_hash=User.generate_password('pyt3s7'), is_admin=True))
+
+    session.commit()
+
+    try:
+        usr = User.get_by('is_admin', True)
+    except MinderError:
+        pass
+    else:
+        assert False, f'No error raised fetching a single user matching multiple rows. Found: {usr}'
+
+    for bad_attr in ['nope', 'is_admin=True']:
+        try:
+            User.get_by(bad_attr, True)
+        except MinderError:
+            continue
+
+        assert False, f'Fetching users by invalid column "{bad_attr}" was accepted'
+
+
+def test_column_metadata():
+    meta = User.column_metadata()
+
+    assert User.column_metadata() is meta, 'Column metadata rebuilt instead of cached for the model'
+    assert meta.private_columns == ('password_hash',), f'Unexpected private columns: {meta.private_columns}'
+    assert set(meta.all_columns) == set(meta.public_columns) | {'password_hash'}, f'Unexpected columns: {meta.all_columns}'
+    assert meta.public_set == frozenset(meta.public_columns), f'Public column set does not match public columns: {meta.public_set}'
+    assert meta.all_columns[0] == 'id' and 'username' in meta.public_columns, f'Unexpected public columns: {meta.public_columns}'
+
+    assert User.get_column_names() == list(meta.public_columns), 'Column names do not match the public column metadata'
+    assert User.get_column_names(exclude_private=False) == list(meta.all_columns), 'Column names do not match the column metadata'
+
+
+def test_dump_many(session):
+    from minder.errors import MinderError
+
+    for idx in range(3):
+        session.add(User(username=f'pytest{idx}', password_hash=User.generate_password('pyt3s7'), is_admin=bool(idx % 2)))
+
+    session.commit()
+    users = session.query(User).order_by(User.id).all()
+
+    for exclude_private in [True, False]:
+        dumped = User.dump_many(users, exclude_private=exclude_private)
+        expected = [usr.dump(exclude_private=exclude_private) for usr in users]
+        assert dumped == expected, f'Serialized users (exclude_private={exclude_private}) do not match dump():\n{dumped}\n{expected}'
+
+    assert 'password_hash' not in User.dump_many(users)[0], 'Private column included when serializing users'
+
+    for columns in [['username'], ['username', 'is_admin']]:
+        dumped = User.dump_many(users, columns=columns)
+        expected = [{col: usr.dump()[col] for col in columns} for usr in users]
+        assert dumped == expected, f'Unexpected users serialized with columns {columns}: {dumped}'
+
+    assert User.dump_many([]) == [], 'Unexpected result serializing no users'
+
+    for columns in [['password_hash'], ['username', 'nope']]:
+        try:
+            User.dump_many(users, columns=columns)
+        except MinderError:
+            continue
+
+        assert False, f'Invalid columns accepted serializing users: {columns}'
+
+
+def test_get_user_page(session):
+    from minder.errors import MinderError
+
+    for idx, (is_admin, enabled) in enumerate([(True, True), (False, True), (True, False), (False, False), (False, True)]):
+        session.add(User(username=f'pytest{idx}', password_hash=User.generate_password('pyt3s7'), is_admin=is_admin, enabled=enabled))
+
+    session.commit()
+
+    pages, after_id = [], 0
+
+    while after_id is not None:
+        page, after_id = User.get_page(after_id=after_id, limit=2, columns=['username'])
+        pages.append([usr['username'] for usr in page])
+
+    assert pages == [['pytest0', 'pytest1'], ['pytest2', 'pytest3'], ['pytest4']], f'Unexpected pages of users: {pages}'
+    assert all(set(usr) == {'username'} for usr in User.get_page(columns=['username'])[0]), 'Unrequested columns returned for page'
+
+    page, after_id = User.get_page(after_id=1, limit=4)
+    assert len(page) == 4 and after_id is None, f'Next page returned for a last page of exactly "limit" users: {after_id}'
+    assert 'password_hash' not in page[0] and page[0]['id'] == 2, f'Unexpected users page: {page}'
+
+    page, after_id = User.get_page(limit=1, columns=['username'], enabled=True, is_admin=False)
+    assert [usr['username'] for usr in page] == ['pytest1'] and after_id is not None, f'Unexpected page for filters: {page}'
+    assert [usr['username'] for usr in User.get_page(after_id=after_id, enabled=True, is_admin=False)[0]] == ['pytest4'], 'Unexpected second filtered page'
+
+    for bad_args in [{'columns': ['password_hash']}, {'columns': ['nope']}, {'password_hash': 'abc'}]:
+        try:
+            User.get_page(**bad_args)
+        except MinderError:
+            continue
+
+        assert False, f'Invalid users page arguments were accepted: {bad_args}'